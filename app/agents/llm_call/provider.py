@@ -6,9 +6,20 @@ Change LLM_PROVIDER in app/.env (or environment) to switch everything:
 """
 import json
 import asyncio
-from typing import AsyncGenerator, Dict, List
+import tempfile
+from typing import AsyncGenerator, Dict, List, Tuple
 
 from app.config import LLM_PROVIDER, OPENAI_API_KEY, GEMINI_API_KEY
+from app.agents.llm_call.rate_limiter import estimate_tokens, limited
+from app.agents.llm_call.resilience import call_with_retry, stream_with_retry
+from app.agents.llm_call.single_flight import SingleFlight
+from app.agents.llm_call.response_cache import (
+    build_cache,
+    cache_key,
+    decode_vector,
+    encode_vector,
+    normalize_prompt,
+)
 
 # ---------------------------------------------------------------------------
 # Model config — override via env if needed
@@ -23,84 +34,379 @@ EMBED_DIMENSIONS      = int(os.getenv("EMBED_DIMENSIONS",  "384"))
 GEMINI_CHAT_MODEL  = os.getenv("GEMINI_CHAT_MODEL",  "gemini-2.5-flash-lite")
 GEMINI_EMBED_MODEL = "models/gemini-embedding-001"
 
+# Failover models, tried when the primary's circuit is open (see resilience.py).
+# Embeddings never fail over: vectors from another model live in another space.
+OPENAI_CHAT_FALLBACK_MODEL     = os.getenv("OPENAI_CHAT_FALLBACK_MODEL",     "")
+OPENAI_COMPOSER_FALLBACK_MODEL = os.getenv("OPENAI_COMPOSER_FALLBACK_MODEL", "gpt-4o-mini")
+GEMINI_FALLBACK_MODEL          = os.getenv("GEMINI_FALLBACK_MODEL",          "gemini-2.0-flash-lite")
+
+
+def _with_fallback(model: str, fallback: str) -> List[str]:
+    return [model, fallback] if fallback and fallback != model else [model]
+
+# Expected completion sizes, used only for TPM budgeting (see rate_limiter.py)
+JSON_OUTPUT_TOKENS   = 300
+STREAM_OUTPUT_TOKENS = 800
+
+# Connection pool — shared by every call to the same provider
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE   = int(os.getenv("LLM_POOL_MAX_KEEPALIVE",   "20"))
+LLM_POOL_KEEPALIVE_SECS  = float(os.getenv("LLM_POOL_KEEPALIVE_SECS", "60"))
+LLM_HTTP_TIMEOUT_SECS    = float(os.getenv("LLM_HTTP_TIMEOUT_SECS",  "60"))
+LLM_HTTP2                = os.getenv("LLM_HTTP2", "true").lower() == "true"
+
+
+# ---------------------------------------------------------------------------
+# Client registry — one long-lived, pooled client per provider
+# The SDK clients are cheap to call but expensive to build: each one owns an
+# HTTP connection pool, so building one per call means a fresh TLS handshake
+# on every hop. Clients are created lazily and closed by close_clients() from
+# the FastAPI lifespan hook (app/main.py).
+# ---------------------------------------------------------------------------
+
+_clients: Dict[str, object] = {}
+_http_clients: Dict[str, object] = {}
+
+
+def _http2_available() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401 — httpx only speaks HTTP/2 when h2 is installed
+        return True
+    except ImportError:
+        return False
+
+
+def _pooled_http_client(name: str):
+    import httpx
+    http_client = _http_clients.get(name)
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=LLM_HTTP_TIMEOUT_SECS,
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_POOL_KEEPALIVE_SECS,
+            ),
+        )
+        _http_clients[name] = http_client
+    return http_client
+
+
+def _openai_client():
+    client = _clients.get("openai")
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=_pooled_http_client("openai"))
+        _clients["openai"] = client
+    return client
+
+
+def _gemini_client():
+    client = _clients.get("gemini")
+    if client is None:
+        from google import genai
+        from google.genai import types
+        client = genai.Client(
+            api_key=GEMINI_API_KEY,
+            http_options=types.HttpOptions(httpx_async_client=_pooled_http_client("gemini")),
+        )
+        _clients["gemini"] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Close every pooled client. Safe to call more than once."""
+    clients = dict(_clients)
+    http_clients = dict(_http_clients)
+    _clients.clear()
+    _http_clients.clear()
+
+    for name, client in clients.items():
+        try:
+            if name == "openai":
+                await client.close()
+            else:
+                await client.aio.aclose()
+        except Exception as e:
+            print(f"[Provider] Error closing {name} client: {e}")
+
+    for name, http_client in http_clients.items():
+        if not http_client.is_closed:
+            await http_client.aclose()
+
 
 # ---------------------------------------------------------------------------
 # generate_json — structured single-shot call, returns a dict
 # Used by: signal_detector, intent_detector, clarification_generator
+# Always temperature 0, so answers are cached by provider + model + prompt
+# (see response_cache.py). Only successful parses from the primary model are
+# stored — a failover model's answer is served but never cached under the
+# primary's key. Identical calls
+# already in flight are coalesced onto one request (see single_flight.py).
 # ---------------------------------------------------------------------------
 
+_json_cache = build_cache()
+_json_flights = SingleFlight("generate_json")
+
+
 async def generate_json(prompt: str) -> Dict:
+    model = OPENAI_CHAT_MODEL if LLM_PROVIDER == "openai" else GEMINI_CHAT_MODEL
+    key = cache_key(LLM_PROVIDER, model, normalize_prompt(prompt))
+    if _json_cache is not None:
+        cached = _json_cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = await _json_flights.do(key, lambda: _generate_json_uncached(key, prompt, model))
+    # Every coalesced caller gets its own copy
+    return json.loads(json.dumps(result))
+
+
+async def _generate_json_uncached(key: str, prompt: str, model: str) -> Dict:
     if LLM_PROVIDER == "openai":
-        return await _openai_json(prompt)
-    return await _gemini_json(prompt)
-
-
-async def _openai_json(prompt: str) -> Dict:
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-    response = await client.chat.completions.create(
-        model=OPENAI_CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": "Respond with valid JSON only."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
-    return json.loads(response.choices[0].message.content)
-
-
-async def _gemini_json(prompt: str, schema: Dict | None = None) -> Dict:
-    from google import genai
-    client = genai.Client(api_key=GEMINI_API_KEY)
+        result, answered_by = await _openai_json(prompt)
+    else:
+        result, answered_by = await _gemini_json(prompt)
+
+    if _json_cache is not None and answered_by == model:
+        _json_cache.set(key, result)
+    return result
+
+
+def json_cache_stats() -> Dict:
+    return _json_cache.stats() if _json_cache is not None else {"backend": "off"}
+
+
+async def _openai_json(prompt: str) -> Tuple[Dict, str]:
+    """(parsed answer, model that gave it)."""
+    client = _openai_client()
+
+    async def call(model: str):
+        async with limited(model, estimate_tokens(prompt, JSON_OUTPUT_TOKENS)):
+            return model, await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "Respond with valid JSON only."},
+                    {"role": "user", "content": prompt},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0,
+            )
+
+    model, response = await call_with_retry(_with_fallback(OPENAI_CHAT_MODEL, OPENAI_CHAT_FALLBACK_MODEL), call)
+    return json.loads(response.choices[0].message.content), model
+
+
+async def _gemini_json(prompt: str, schema: Dict | None = None) -> Tuple[Dict, str]:
+    """(parsed answer, model that gave it)."""
+    client = _gemini_client()
     cfg = {"response_mime_type": "application/json"}
     if schema:
         cfg["response_schema"] = schema
-    response = await client.aio.models.generate_content(
-        model=GEMINI_CHAT_MODEL,
-        contents=prompt,
-        config=cfg,
-    )
-    return json.loads(response.text)
+
+    async def call(model: str):
+        async with limited(model, estimate_tokens(prompt, JSON_OUTPUT_TOKENS)):
+            return model, await client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=cfg,
+            )
+
+    model, response = await call_with_retry(_with_fallback(GEMINI_CHAT_MODEL, GEMINI_FALLBACK_MODEL), call)
+    return json.loads(response.text), model
 
 
 # ---------------------------------------------------------------------------
 # stream_text — streaming call, yields {"type": "content"|"token_usage", ...}
 # Used by: response_composer (via run_llm_agent)
+#
+# Optional hedging (LLM_HEDGE_STREAM=true): if the primary provider hasn't
+# produced a first content chunk within LLM_HEDGE_AFTER_SECS, the same prompt
+# is also sent to the other provider. Whichever streams content first wins;
+# the loser is cancelled and its usage (last reported, or estimated if it
+# never reported any) is emitted as an extra token_usage chunk tagged
+# "hedge": "cancelled". Requires keys for both providers.
 # ---------------------------------------------------------------------------
 
+LLM_HEDGE_STREAM     = os.getenv("LLM_HEDGE_STREAM", "false").lower() == "true"
+LLM_HEDGE_AFTER_SECS = float(os.getenv("LLM_HEDGE_AFTER_SECS", "1.5"))
+
+_hedge_stats = {"requests": 0, "hedged": 0, "primary_won": 0, "secondary_won": 0}
+_STREAM_DONE = object()
+
+
 async def stream_text(prompt: str, temperature: float = 0.1) -> AsyncGenerator:
-    if LLM_PROVIDER == "openai":
-        async for chunk in _openai_stream(prompt, temperature):
+    secondary = _secondary_provider() if LLM_HEDGE_STREAM else None
+    if secondary is None:
+        async for chunk in _provider_stream(LLM_PROVIDER, prompt, temperature):
             yield chunk
-    else:
-        async for chunk in _gemini_stream(prompt, temperature):
+        return
+
+    async for chunk in _hedged_stream(prompt, temperature, LLM_PROVIDER, secondary):
+        yield chunk
+
+
+def _secondary_provider() -> str | None:
+    if LLM_PROVIDER == "openai":
+        return "gemini" if GEMINI_API_KEY else None
+    return "openai" if OPENAI_API_KEY else None
+
+
+def _provider_stream(provider: str, prompt: str, temperature: float) -> AsyncGenerator:
+    if provider == "openai":
+        return _openai_stream(prompt, temperature)
+    return _gemini_stream(prompt, temperature)
+
+
+def _stream_model(provider: str) -> str:
+    return OPENAI_COMPOSER_MODEL if provider == "openai" else GEMINI_CHAT_MODEL
+
+
+async def _hedged_stream(prompt: str, temperature: float, primary: str, secondary: str) -> AsyncGenerator:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    lanes: Dict[str, asyncio.Task] = {}
+    buffered: Dict[str, List[Dict]] = {primary: [], secondary: []}
+    last_usage: Dict[str, Dict] = {}
+    ended: Dict[str, object] = {}
+
+    async def pump(provider: str) -> None:
+        try:
+            async for chunk in _provider_stream(provider, prompt, temperature):
+                queue.put_nowait((provider, chunk))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            queue.put_nowait((provider, e))
+            return
+        queue.put_nowait((provider, _STREAM_DONE))
+
+    def launch(provider: str) -> None:
+        lanes[provider] = asyncio.create_task(pump(provider))
+
+    _hedge_stats["requests"] += 1
+    launch(primary)
+    hedge_at = loop.time() + LLM_HEDGE_AFTER_SECS
+    winner = None
+
+    try:
+        # Race phase — buffer both lanes until one produces content
+        while winner is None:
+            timeout = None if secondary in lanes else max(0.0, hedge_at - loop.time())
+            try:
+                provider, item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                print(f"[Provider] No first token from {primary} after {LLM_HEDGE_AFTER_SECS}s, hedging to {secondary}")
+                _hedge_stats["hedged"] += 1
+                launch(secondary)
+                continue
+
+            if isinstance(item, Exception):
+                ended[provider] = item
+                if secondary not in lanes:
+                    print(f"[Provider] {primary} stream failed before first token ({item}), failing over to {secondary}")
+                    _hedge_stats["hedged"] += 1
+                    launch(secondary)
+                elif len(ended) == len(lanes):
+                    raise ended.get(primary, item)
+                continue
+            if item is _STREAM_DONE:
+                # Finished without content (empty reply) — still a valid answer
+                ended[provider] = item
+                winner = provider
+                break
+
+            buffered[provider].append(item)
+            if item.get("type") == "token_usage":
+                last_usage[provider] = item
+            elif item.get("type") == "content":
+                winner = provider
+
+        loser = secondary if winner == primary else primary
+        _hedge_stats["primary_won" if winner == primary else "secondary_won"] += 1
+        if loser in lanes and not lanes[loser].done():
+            lanes[loser].cancel()
+
+        for chunk in buffered[winner]:
             yield chunk
 
+        # Stream phase — forward the winner, keep only usage from the loser
+        while winner not in ended:
+            provider, item = await queue.get()
+            if provider != winner:
+                if isinstance(item, dict) and item.get("type") == "token_usage":
+                    last_usage[provider] = item
+                continue
+            if isinstance(item, Exception):
+                raise item
+            if item is _STREAM_DONE:
+                break
+            yield item
+
+        if loser in lanes:
+            yield _loser_usage(loser, prompt, buffered[loser], last_usage.get(loser))
+    finally:
+        for task in lanes.values():
+            if not task.done():
+                task.cancel()
+
+
+def _loser_usage(provider: str, prompt: str, chunks: List[Dict], reported: Dict | None) -> Dict:
+    """Usage for the cancelled hedge lane — what it reported, else an estimate."""
+    if reported is not None:
+        return {**reported, "hedge": "cancelled"}
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens("".join(c.get("content", "") for c in chunks if c.get("type") == "content"))
+    return {
+        "type": "token_usage",
+        "model": _stream_model(provider),
+        "hedge": "cancelled",
+        "estimated": True,
+        "usage": {
+            "prompt_tokens":     prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens":      prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def hedge_stats() -> Dict:
+    return dict(_hedge_stats)
+
 
 async def _openai_stream(prompt: str, temperature: float = 0.1) -> AsyncGenerator:
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-    stream = await client.chat.completions.create(
-        model=OPENAI_COMPOSER_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        stream=True,
-        temperature=temperature,
-    )
+    models = _with_fallback(OPENAI_COMPOSER_MODEL, OPENAI_COMPOSER_FALLBACK_MODEL)
+    async for chunk in stream_with_retry(models, lambda model: _openai_stream_once(model, prompt, temperature)):
+        yield chunk
+
+
+async def _openai_stream_once(model: str, prompt: str, temperature: float) -> AsyncGenerator:
+    client = _openai_client()
     prompt_tokens = 0
     completion_tokens = 0
-    async for chunk in stream:
-        delta = chunk.choices[0].delta if chunk.choices else None
-        if delta and delta.content:
-            yield {"type": "content", "content": delta.content}
-        if chunk.usage:
-            prompt_tokens     = chunk.usage.prompt_tokens or 0
-            completion_tokens = chunk.usage.completion_tokens or 0
+    async with limited(model, estimate_tokens(prompt, STREAM_OUTPUT_TOKENS)):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+            temperature=temperature,
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta if chunk.choices else None
+            if delta and delta.content:
+                yield {"type": "content", "content": delta.content}
+            if chunk.usage:
+                prompt_tokens     = chunk.usage.prompt_tokens or 0
+                completion_tokens = chunk.usage.completion_tokens or 0
 
     if prompt_tokens or completion_tokens:
         yield {
             "type": "token_usage",
-            "model": OPENAI_COMPOSER_MODEL,
+            "model": model,
             "usage": {
                 "prompt_tokens":     prompt_tokens,
                 "completion_tokens": completion_tokens,
@@ -110,76 +416,198 @@ async def _openai_stream(prompt: str, temperature: float = 0.1) -> AsyncGenerato
 
 
 async def _gemini_stream(prompt: str, temperature: float = 0.1) -> AsyncGenerator:
-    from google import genai
-    from google.genai.errors import ClientError
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    model_pool = [GEMINI_CHAT_MODEL, "gemini-2.0-flash-lite"]
-    model_index = 0
-    retries = 0
-
-    while retries <= 5:
-        try:
-            async for chunk in await client.aio.models.generate_content_stream(
-                model=model_pool[model_index], contents=prompt,
-                config={"temperature": temperature},
-            ):
-                if chunk.candidates:
-                    for candidate in chunk.candidates:
-                        if candidate.content and candidate.content.parts:
-                            for part in candidate.content.parts:
-                                if getattr(part, "thought", None):
-                                    yield {"type": "thought", "content": str(part.thought)}
-                                elif getattr(part, "text", ""):
-                                    yield {"type": "content", "content": part.text}
-                if chunk.usage_metadata:
-                    yield {
-                        "type": "token_usage",
-                        "model": model_pool[model_index],
-                        "usage": {
-                            "prompt_tokens":     chunk.usage_metadata.prompt_token_count or 0,
-                            "completion_tokens": chunk.usage_metadata.candidates_token_count or 0,
-                            "total_tokens":      chunk.usage_metadata.total_token_count or 0,
-                        },
-                    }
-            break
-        except ClientError as e:
-            err = str(e).upper()
-            if "RESOURCE_EXHAUSTED" in err or "429" in err or "NOT_FOUND" in err:
-                retries += 1
-                model_index = (model_index + 1) % len(model_pool)
-                await asyncio.sleep(2 ** retries)
-            else:
-                raise
+    models = _with_fallback(GEMINI_CHAT_MODEL, GEMINI_FALLBACK_MODEL)
+    async for chunk in stream_with_retry(models, lambda model: _gemini_stream_once(model, prompt, temperature)):
+        yield chunk
+
+
+async def _gemini_stream_once(model: str, prompt: str, temperature: float) -> AsyncGenerator:
+    client = _gemini_client()
+    async with limited(model, estimate_tokens(prompt, STREAM_OUTPUT_TOKENS)):
+        async for chunk in await client.aio.models.generate_content_stream(
+            model=model, contents=prompt,
+            config={"temperature": temperature},
+        ):
+            if chunk.candidates:
+                for candidate in chunk.candidates:
+                    if candidate.content and candidate.content.parts:
+                        for part in candidate.content.parts:
+                            if getattr(part, "thought", None):
+                                yield {"type": "thought", "content": str(part.thought)}
+                            elif getattr(part, "text", ""):
+                                yield {"type": "content", "content": part.text}
+            if chunk.usage_metadata:
+                yield {
+                    "type": "token_usage",
+                    "model": model,
+                    "usage": {
+                        "prompt_tokens":     chunk.usage_metadata.prompt_token_count or 0,
+                        "completion_tokens": chunk.usage_metadata.candidates_token_count or 0,
+                        "total_tokens":      chunk.usage_metadata.total_token_count or 0,
+                    },
+                }
 
 
 # ---------------------------------------------------------------------------
 # embed — returns a float vector
-# Used by: query_products, index_product_matrix
+# Used by: query_products
+# Vectors are cached on disk by provider + model + dimensions + exact text;
+# the sqlite reads and writes run off the event loop (ResponseCache.aget/aset).
+# Retrieval queries come from a small enumerable space (see
+# pipeline.warm_product_query_embeddings), so after warmup the chat path
+# never waits on an embedding round trip.
 # ---------------------------------------------------------------------------
 
+EMBED_CACHE_BACKEND     = os.getenv("EMBED_CACHE_BACKEND", "sqlite").lower()
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "50000"))
+EMBED_CACHE_TTL_SECS    = float(os.getenv("EMBED_CACHE_TTL_SECS", str(30 * 24 * 3600)))
+EMBED_CACHE_PATH        = os.getenv(
+    "EMBED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "concierge_embed_cache.sqlite3")
+)
+
+_embed_cache = build_cache(
+    backend=EMBED_CACHE_BACKEND,
+    ttl_secs=EMBED_CACHE_TTL_SECS,
+    max_entries=EMBED_CACHE_MAX_ENTRIES,
+    path=EMBED_CACHE_PATH,
+    table="embed_cache",
+    dumps=encode_vector,
+    loads=decode_vector,
+)
+
+
+def _embed_key(text: str) -> str:
+    model = OPENAI_EMBED_MODEL if LLM_PROVIDER == "openai" else GEMINI_EMBED_MODEL
+    return cache_key(LLM_PROVIDER, model, EMBED_DIMENSIONS, text)
+
+
+def embed_cache_stats() -> Dict:
+    return _embed_cache.stats() if _embed_cache is not None else {"backend": "off"}
+
+
+_embed_flights = SingleFlight("embed")
+
+
 async def embed(text: str) -> List[float]:
+    key = _embed_key(text)
+    if _embed_cache is not None:
+        cached = await _embed_cache.aget(key)
+        if cached is not None:
+            return cached
+
+    vector = await _embed_flights.do(key, lambda: _embed_uncached(key, text))
+    return list(vector)
+
+
+async def _embed_uncached(key: str, text: str) -> List[float]:
     if LLM_PROVIDER == "openai":
-        return await _openai_embed(text)
-    return await _gemini_embed(text)
+        vector = await _openai_embed(text)
+    else:
+        vector = await _gemini_embed(text)
+
+    if _embed_cache is not None:
+        await _embed_cache.aset(key, vector)
+    return vector
 
 
 async def _openai_embed(text: str) -> List[float]:
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-    response = await client.embeddings.create(
-        model=OPENAI_EMBED_MODEL,
-        input=text,
-        dimensions=EMBED_DIMENSIONS,
-    )
+    client = _openai_client()
+
+    async def call(model: str):
+        async with limited(model, estimate_tokens(text)):
+            return await client.embeddings.create(model=model, input=text, dimensions=EMBED_DIMENSIONS)
+
+    response = await call_with_retry([OPENAI_EMBED_MODEL], call)
     return response.data[0].embedding
 
 
 async def _gemini_embed(text: str) -> List[float]:
-    from google import genai
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    response = await client.aio.models.embed_content(
-        model=GEMINI_EMBED_MODEL,
-        contents=text,
-        config={"output_dimensionality": EMBED_DIMENSIONS},
-    )
+    client = _gemini_client()
+
+    async def call(model: str):
+        async with limited(model, estimate_tokens(text)):
+            return await client.aio.models.embed_content(
+                model=model,
+                contents=text,
+                config={"output_dimensionality": EMBED_DIMENSIONS},
+            )
+
+    response = await call_with_retry([GEMINI_EMBED_MODEL], call)
     return response.embeddings[0].values
+
+
+# ---------------------------------------------------------------------------
+# embed_many — returns one vector per input text, in input order
+# Cached texts are served from the embed cache; the rest are sent in batches
+# through the providers' list inputs, with up to EMBED_MAX_CONCURRENCY
+# batches in flight at once.
+# Used by: index_product_matrix, query_products_many
+# ---------------------------------------------------------------------------
+
+EMBED_BATCH_SIZE      = int(os.getenv("EMBED_BATCH_SIZE",      "96"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+
+async def embed_many(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    if not texts:
+        return []
+
+    vectors: List[List[float] | None] = [None] * len(texts)
+    missing: Dict[str, List[int]] = {}
+    if _embed_cache is not None:
+        cached_vectors = await _embed_cache.aget_many([_embed_key(text) for text in texts])
+    else:
+        cached_vectors = [None] * len(texts)
+    for i, (text, cached) in enumerate(zip(texts, cached_vectors)):
+        if cached is not None:
+            vectors[i] = cached
+        else:
+            missing.setdefault(text, []).append(i)
+
+    if missing:
+        embed_batch = _openai_embed_batch if LLM_PROVIDER == "openai" else _gemini_embed_batch
+        pending = list(missing)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        semaphore = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+
+        async def _run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await embed_batch(batch)
+
+        results = await asyncio.gather(*(_run(batch) for batch in batches))
+        fresh = []
+        for batch, batch_vectors in zip(batches, results):
+            for text, vector in zip(batch, batch_vectors):
+                fresh.append((_embed_key(text), vector))
+                for i in missing[text]:
+                    vectors[i] = vector
+        if _embed_cache is not None:
+            await _embed_cache.aset_many(fresh)
+
+    return vectors
+
+
+async def _openai_embed_batch(texts: List[str]) -> List[List[float]]:
+    client = _openai_client()
+
+    async def call(model: str):
+        async with limited(model, sum(estimate_tokens(t) for t in texts)):
+            return await client.embeddings.create(model=model, input=texts, dimensions=EMBED_DIMENSIONS)
+
+    response = await call_with_retry([OPENAI_EMBED_MODEL], call)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def _gemini_embed_batch(texts: List[str]) -> List[List[float]]:
+    client = _gemini_client()
+
+    async def call(model: str):
+        async with limited(model, sum(estimate_tokens(t) for t in texts)):
+            return await client.aio.models.embed_content(
+                model=model,
+                contents=texts,
+                config={"output_dimensionality": EMBED_DIMENSIONS},
+            )
+
+    response = await call_with_retry([GEMINI_EMBED_MODEL], call)
+    return [embedding.values for embedding in response.embeddings]
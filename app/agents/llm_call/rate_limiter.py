@@ -0,0 +1,230 @@
+"""
+Provider-level concurrency limiter with priority lanes.
+
+Every chat turn fans out into several LLM calls, and the daily cron and
+recommendation generation draw on the same provider quota. Rather than let
+background work push interactive users into 429s, every provider call takes
+a slot from the model's limiter first:
+
+  - a token bucket for requests per minute (RPM)
+  - a token bucket for estimated tokens per minute (TPM)
+  - a cap on concurrent in-flight calls
+
+Waiters are admitted strictly by priority (then FIFO). Lower lanes also keep
+clear of a reserved share of each budget, so a burst of cron work can never
+spend the headroom an interactive turn needs.
+
+Priority is carried in a contextvar so callers set it once at the edge
+(endpoint, background job) instead of threading it through every function:
+
+    with llm_priority(PRIORITY_BACKGROUND):
+        await generate_recommendations(...)
+
+Env:
+  LLM_RPM             default requests/minute per model   (default 500)
+  LLM_TPM             default tokens/minute per model     (default 200000)
+  LLM_MAX_CONCURRENCY default in-flight calls per model   (default 16)
+  LLM_MODEL_LIMITS    JSON per-model overrides, e.g.
+                      {"gpt-4o": {"rpm": 500, "tpm": 30000, "concurrency": 8}}
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+PRIORITY_INTERACTIVE = 0   # streamed concierge / diagnostic replies
+PRIORITY_WEB_CHAT    = 1   # web chat widget
+PRIORITY_WARMUP      = 2   # returning-user greeting on /chat/warmup
+PRIORITY_BACKGROUND  = 3   # cron, recommendations, reindexing
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_WEB_CHAT:    "web_chat",
+    PRIORITY_WARMUP:      "warmup",
+    PRIORITY_BACKGROUND:  "background",
+}
+
+# Share of each budget a lane must leave untouched for the lanes above it
+_LANE_RESERVE = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_WEB_CHAT:    0.1,
+    PRIORITY_WARMUP:      0.25,
+    PRIORITY_BACKGROUND:  0.5,
+}
+
+LLM_RPM             = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM             = float(os.getenv("LLM_TPM", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MODEL_LIMITS: Dict[str, Dict] = json.loads(os.getenv("LLM_MODEL_LIMITS", "{}") or "{}")
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run every LLM call made inside this block (and tasks it spawns) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        try:
+            _priority.reset(token)
+        except ValueError:
+            # Async generators (SSE streams) may resume in a copied context
+            _priority.set(token.old_value if token.old_value is not token.MISSING else PRIORITY_INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def estimate_tokens(text: str, expected_output: int = 0) -> int:
+    """Rough pre-call token estimate (~4 chars per token) for TPM accounting."""
+    return len(text) // 4 + expected_output
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` of capacity."""
+        self._refill()
+        amount = min(amount, self.capacity * (1 - reserve))
+        needed = amount + self.capacity * reserve - self.level
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future")
+
+    def __init__(self, priority: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+
+
+class ModelLimiter:
+    def __init__(self, model: str, rpm: float, tpm: float, max_concurrency: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._queue: List = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.queued: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_secs: Dict[str, float] = {name: 0.0 for name in PRIORITY_NAMES.values()}
+
+    async def acquire(self, priority: int, tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, loop.create_future())
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        started = time.monotonic()
+        self._dispatch()
+        lane = PRIORITY_NAMES.get(priority, str(priority))
+        if not waiter.future.done():
+            self.queued[lane] = self.queued.get(lane, 0) + 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we were cancelled — hand the slot back
+                self.release()
+            raise
+        self.wait_secs[lane] = self.wait_secs.get(lane, 0.0) + (time.monotonic() - started)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            reserve = _LANE_RESERVE.get(priority, 0.5)
+            if self.in_flight >= max(1, int(self.max_concurrency * (1 - reserve))):
+                return  # wait for release()
+
+            delay = max(
+                self.requests.wait_time(1, reserve),
+                self.tokens.wait_time(waiter.tokens, reserve),
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self.in_flight += 1
+            lane = PRIORITY_NAMES.get(priority, str(priority))
+            self.admitted[lane] = self.admitted.get(lane, 0) + 1
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": sum(1 for _, _, w in self._queue if not w.future.done()),
+            "admitted": dict(self.admitted),
+            "queued": dict(self.queued),
+            "wait_secs": {lane: round(secs, 3) for lane, secs in self.wait_secs.items()},
+        }
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        overrides = LLM_MODEL_LIMITS.get(model, {})
+        limiter = ModelLimiter(
+            model,
+            rpm=float(overrides.get("rpm", LLM_RPM)),
+            tpm=float(overrides.get("tpm", LLM_TPM)),
+            max_concurrency=int(overrides.get("concurrency", LLM_MAX_CONCURRENCY)),
+        )
+        _limiters[model] = limiter
+    return limiter
+
+
+@asynccontextmanager
+async def limited(model: str, tokens: int, priority: Optional[int] = None):
+    """Hold one of `model`'s slots for the duration of the block."""
+    limiter = get_limiter(model)
+    await limiter.acquire(current_priority() if priority is None else priority, tokens)
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    return {model: limiter.stats() for model, limiter in _limiters.items()}
@@ -0,0 +1,318 @@
+"""
+Retry + circuit breaker for provider calls.
+
+Transient provider errors (429, 5xx, connection resets, timeouts) are
+retried with full-jitter exponential backoff. The whole retry budget is
+bounded by the caller's deadline, so a chat turn with 30s left never sleeps
+past it:
+
+    with llm_deadline(30.0):
+        await diagnose_hair_concern(...)
+
+Each model has a breaker that tracks its health. After
+LLM_BREAKER_FAILURES consecutive transient failures the breaker opens and
+calls to that model fail fast with CircuitOpenError (or move straight on to
+the next model in the failover list) for LLM_BREAKER_COOLDOWN_SECS. After
+the cooldown a single half-open probe is let through; success closes the
+breaker, failure re-opens it.
+
+Client errors (400s other than 429, bad JSON, ...) are never retried and
+don't count against a model's health. The exception is a model the provider
+doesn't know (404 / NOT_FOUND, e.g. a retired or renamed model): it isn't
+retried either, but the call moves on to the next model in the failover list.
+
+Env:
+  LLM_RETRY_MAX_ATTEMPTS     attempts per model              (default 4)
+  LLM_RETRY_BASE_SECS        first backoff ceiling           (default 0.5)
+  LLM_RETRY_MAX_SECS         backoff ceiling                 (default 8)
+  LLM_RETRY_BUDGET_SECS      budget when no deadline is set  (default 45)
+  LLM_BREAKER_FAILURES       consecutive failures to open    (default 5)
+  LLM_BREAKER_COOLDOWN_SECS  open -> half-open after         (default 30)
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+LLM_RETRY_MAX_ATTEMPTS    = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS",      "4"))
+LLM_RETRY_BASE_SECS       = float(os.getenv("LLM_RETRY_BASE_SECS",       "0.5"))
+LLM_RETRY_MAX_SECS        = float(os.getenv("LLM_RETRY_MAX_SECS",        "8"))
+LLM_RETRY_BUDGET_SECS     = float(os.getenv("LLM_RETRY_BUDGET_SECS",     "45"))
+LLM_BREAKER_FAILURES      = int(os.getenv("LLM_BREAKER_FAILURES",        "5"))
+LLM_BREAKER_COOLDOWN_SECS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECS", "30"))
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half_open"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose breaker is open."""
+
+    def __init__(self, model: str, retry_in: float):
+        self.model = model
+        self.retry_in = retry_in
+        super().__init__(f"{model} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+
+@contextmanager
+def llm_deadline(seconds: float):
+    """Bound retries of every LLM call made inside this block to `seconds` from now."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            _deadline.set(current)
+
+
+def remaining_budget() -> float:
+    deadline = _deadline.get()
+    if deadline is None:
+        return LLM_RETRY_BUDGET_SECS
+    return deadline - time.monotonic()
+
+
+# ---------------------------------------------------------------------------
+# Error classification
+# ---------------------------------------------------------------------------
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for transient provider failures: 429, 5xx, timeouts, dropped connections."""
+    if isinstance(exc, (CircuitOpenError, asyncio.CancelledError)):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status == 408 or status >= 500
+
+    name = type(exc).__name__
+    if name in ("APIConnectionError", "APITimeoutError", "ServerError") or name.endswith(("TimeoutException", "NetworkError")):
+        return True
+    text = str(exc).upper()
+    return "RESOURCE_EXHAUSTED" in text or "429" in text or "UNAVAILABLE" in text
+
+
+def is_model_missing(exc: BaseException) -> bool:
+    """True when the provider doesn't serve the requested model (404 / NOT_FOUND)."""
+    if isinstance(exc, (CircuitOpenError, asyncio.CancelledError)):
+        return False
+    if _status_code(exc) == 404:
+        return True
+    return type(exc).__name__ == "NotFoundError" or "NOT_FOUND" in str(exc).upper()
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server-suggested wait from a Retry-After header, if the error carries one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: BaseException | None = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when present."""
+    suggested = retry_after(exc) if exc is not None else None
+    if suggested is not None:
+        return min(suggested, LLM_RETRY_MAX_SECS)
+    return random.uniform(0, min(LLM_RETRY_MAX_SECS, LLM_RETRY_BASE_SECS * (2 ** attempt)))
+
+
+# ---------------------------------------------------------------------------
+# Per-model circuit breaker
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    def __init__(self, model: str, failure_threshold: int, cooldown_secs: float):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown_secs - time.monotonic())
+
+    def allow(self) -> bool:
+        """May a call go out now? Moves open -> half-open once the cooldown is over."""
+        if self.state == OPEN and self.retry_in() == 0:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            print(f"[Resilience] {self.model} recovered, closing circuit")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.successes += 1
+
+    def record_failure(self, exc: BaseException) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(exc).__name__}: {str(exc)[:200]}"
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"[Resilience] {self.model} unhealthy ({self.last_error}), opening circuit for {self.cooldown_secs:.0f}s")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Half-open probe ended without a verdict (client error, cancellation)."""
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_in": round(self.retry_in(), 1) if self.state == OPEN else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = CircuitBreaker(model, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECS)
+        _breakers[model] = breaker
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    return {model: breaker.stats() for model, breaker in _breakers.items()}
+
+
+# ---------------------------------------------------------------------------
+# Call wrappers
+# ---------------------------------------------------------------------------
+
+async def _sleep_within_budget(attempt: int, exc: BaseException) -> bool:
+    """Back off before the next attempt. False if the deadline won't allow it."""
+    delay = backoff_delay(attempt, exc)
+    if delay >= remaining_budget():
+        return False
+    await asyncio.sleep(delay)
+    return True
+
+
+async def call_with_retry(models: List[str], fn: Callable[[str], Awaitable[T]]) -> T:
+    """
+    Run fn(model) against each model in turn until one succeeds. Transient
+    errors are retried on the same model while its breaker stays closed and
+    the deadline allows; then the next model is tried. A model the provider
+    doesn't serve is skipped straight away.
+    """
+    last_exc: BaseException | None = None
+    for model in models:
+        breaker = get_breaker(model)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            if not breaker.allow():
+                last_exc = CircuitOpenError(model, breaker.retry_in())
+                break
+            try:
+                result = await fn(model)
+            except BaseException as e:
+                if is_model_missing(e):
+                    breaker.release_probe()
+                    print(f"[Resilience] {model} not found, trying the next model")
+                    last_exc = e
+                    break
+                if not is_retryable(e):
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure(e)
+                last_exc = e
+                if breaker.state == OPEN or attempt + 1 >= LLM_RETRY_MAX_ATTEMPTS:
+                    break
+                if not await _sleep_within_budget(attempt, e):
+                    raise
+                continue
+            breaker.record_success()
+            return result
+    raise last_exc
+
+
+async def stream_with_retry(models: List[str], fn: Callable[[str], AsyncGenerator]) -> AsyncGenerator:
+    """
+    Streaming counterpart of call_with_retry. Only failures before the first
+    chunk are retried or failed over; once output has reached the caller a
+    failure is recorded and re-raised.
+    """
+    last_exc: BaseException | None = None
+    for model in models:
+        breaker = get_breaker(model)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            if not breaker.allow():
+                last_exc = CircuitOpenError(model, breaker.retry_in())
+                break
+            started = False
+            try:
+                async for chunk in fn(model):
+                    started = True
+                    yield chunk
+            except BaseException as e:
+                if is_model_missing(e) and not started:
+                    breaker.release_probe()
+                    print(f"[Resilience] {model} not found, trying the next model")
+                    last_exc = e
+                    break
+                if not is_retryable(e):
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure(e)
+                last_exc = e
+                if started:
+                    raise
+                if breaker.state == OPEN or attempt + 1 >= LLM_RETRY_MAX_ATTEMPTS:
+                    break
+                if not await _sleep_within_budget(attempt, e):
+                    raise
+                continue
+            breaker.record_success()
+            return
+    raise last_exc
@@ -0,0 +1,275 @@
+"""
+Content-addressed cache for deterministic LLM calls.
+
+generate_json runs at temperature 0, so the same provider + model + prompt
+always maps to the same answer. Retries, dashboard replays, warmups and the
+many users who open with the same short message would otherwise pay a full
+LLM round trip for an answer we already have.
+
+Two backends share one interface:
+  memory  — per-process OrderedDict (default)
+  sqlite  — on-disk file, survives restarts and is shared by every worker
+            on the host
+
+Both are bounded by a TTL and an LRU entry cap. Values are stored as JSON so
+callers always get a fresh copy they're free to mutate. Embedding vectors use
+a compact float32 codec instead (encode_vector / decode_vector) — a JSON
+vector is ~4x larger on disk.
+
+Async callers use aget / aset: sqlite reads and writes run on a worker thread
+so a busy file never stalls the event loop; memory lookups stay inline.
+
+Env:
+  LLM_CACHE_BACKEND      memory | sqlite | off   (default memory)
+  LLM_CACHE_TTL_SECS     default 3600
+  LLM_CACHE_MAX_ENTRIES  default 5000
+  LLM_CACHE_PATH         sqlite file (default <tmp>/concierge_llm_cache.sqlite3)
+"""
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+LLM_CACHE_BACKEND     = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_TTL_SECS    = float(os.getenv("LLM_CACHE_TTL_SECS", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_PATH        = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "concierge_llm_cache.sqlite3")
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so cosmetic differences don't split the cache."""
+    return " ".join(prompt.split())
+
+
+def cache_key(*parts: Any) -> str:
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def decode_vector(raw: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(raw))
+    return values.tolist()
+
+
+# ---------------------------------------------------------------------------
+# Backends — store JSON strings keyed by hex digest
+# ---------------------------------------------------------------------------
+
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    The entry cap is enforced every `evict_every` writes rather than on each
+    one — counting the table is O(n), and the file is shared with other
+    workers, so a per-process running count would drift. Between passes the
+    table may run over the cap by up to `evict_every` entries per worker.
+    """
+
+    def __init__(self, path: str, max_entries: int, table: str = "llm_cache", evict_every: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.evict_every = evict_every or max(1, min(256, max_entries // 20))
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "  key TEXT PRIMARY KEY,"
+            "  value TEXT NOT NULL,"
+            "  expires_at REAL NOT NULL,"
+            "  accessed_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table} (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the least recently used beyond the cap."""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"  SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?"
+                ")",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+# ---------------------------------------------------------------------------
+# ResponseCache — JSON (de)serialisation + hit/miss counters over a backend
+# ---------------------------------------------------------------------------
+
+class ResponseCache:
+    def __init__(
+        self,
+        backend,
+        ttl_secs: float,
+        dumps: Callable[[Any], str] = json.dumps,
+        loads: Callable[[str], Any] = json.loads,
+    ):
+        self.backend = backend
+        self.ttl_secs = ttl_secs
+        self.dumps = dumps
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.backend.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(key, self.dumps(value), self.ttl_secs if ttl is None else ttl)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() without blocking the event loop on a sqlite backend."""
+        if isinstance(self.backend, MemoryBackend):
+            return self.get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """set() without blocking the event loop on a sqlite backend."""
+        if isinstance(self.backend, MemoryBackend):
+            self.set(key, value, ttl)
+            return
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.set, key, value, ttl))
+
+    async def aget_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """One get() per key, in a single trip to the worker thread."""
+        if isinstance(self.backend, MemoryBackend):
+            return [self.get(key) for key in keys]
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: [self.get(key) for key in keys])
+
+    async def aset_many(self, items: List[tuple]) -> None:
+        """set() for each (key, value) pair, in a single trip to the worker thread."""
+        def write():
+            for key, value in items:
+                self.set(key, value)
+        if isinstance(self.backend, MemoryBackend):
+            write()
+            return
+        await asyncio.get_running_loop().run_in_executor(None, write)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+        }
+
+
+def build_cache(
+    backend: str = LLM_CACHE_BACKEND,
+    ttl_secs: float = LLM_CACHE_TTL_SECS,
+    max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    path: str = LLM_CACHE_PATH,
+    table: str = "llm_cache",
+    dumps: Callable[[Any], str] = json.dumps,
+    loads: Callable[[str], Any] = json.loads,
+) -> Optional[ResponseCache]:
+    """Returns None when caching is switched off (backend="off")."""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return ResponseCache(SQLiteBackend(path, max_entries, table=table), ttl_secs, dumps, loads)
+    return ResponseCache(MemoryBackend(max_entries), ttl_secs, dumps, loads)
@@ -0,0 +1,80 @@
+"""
+Single-flight coalescing for identical in-flight requests.
+
+When a client double-submits, or the dashboard and a test run the same
+scenario at once, identical generate_json / embed / query_products calls go
+out in parallel. A SingleFlight group lets concurrent callers with the same
+key await one shared task instead:
+
+    result = await _json_flights.do(key, lambda: _call_provider(prompt))
+
+Cancellation safety: each caller awaits the shared task through
+asyncio.shield, so one caller disconnecting never cancels the work the
+others are waiting on. The shared task is only cancelled once every caller
+waiting on it has gone away, and is forgotten at that moment, so a caller
+arriving while it unwinds starts a new flight.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+_groups: Dict[str, "SingleFlight"] = {}
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.executed = 0
+        self.collapsed = 0
+        _groups[name] = self
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task, key=key: self._finish(key, task))
+            self.executed += 1
+        else:
+            self.collapsed += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller has gone away — nobody needs the result. Forget
+                # the flight now: the task may take a while to unwind, and a new
+                # caller must start fresh work rather than join a cancelled one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers re-raise it themselves
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+        }
+
+
+def single_flight_stats() -> Dict[str, Dict]:
+    return {name: group.stats() for name, group in _groups.items()}
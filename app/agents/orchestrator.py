@@ -58,10 +58,10 @@ async def orchestrator(answers: OrchestratorInput):
         
         # Save user profile data to database if user_id is present
         if answers.user_id and profile_data:
-            from app.services.db_service import get_db
+            from app.services.async_db import get_async_db
             try:
-                db = get_db()
-                db.save_user_profile(answers.user_id, profile_data)
+                db = get_async_db()
+                await db.save_user_profile(answers.user_id, profile_data)
             except Exception as e:
                 print(f"[Orchestrator] Failed to save user profile: {e}")
 
@@ -118,9 +118,9 @@ async def orchestrator(answers: OrchestratorInput):
         # Save complete routine to Supabase if user_id is present
         if answers.user_id:
             try:
-                from app.services.db_service import get_db
-                db = get_db()
-                db.save_routine(answers.user_id, final_routine_for_db)
+                from app.services.async_db import get_async_db
+                db = get_async_db()
+                await db.save_routine(answers.user_id, final_routine_for_db)
                 yield json.dumps({"type": "status", "content": "Routine saved to your profile!"}) + "\n"
             except Exception as e:
                 print(f"Failed to save routine: {e}")
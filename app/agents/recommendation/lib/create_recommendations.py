@@ -1,4 +1,4 @@
-from app.agents.recommendation.lib.knowledge_base.query_products import query_products
+from app.agents.recommendation.lib.knowledge_base.query_products import query_products_many
 
 def parseRoutineStep(step: dict) -> str:
    ingredients = step.get('ingredients', [])
@@ -17,10 +17,9 @@ def parseRoutineStep(step: dict) -> str:
 async def createRecommendations(routine: dict):
     
     routine_steps = routine.get("routine", [])
+    results = await query_products_many([parseRoutineStep(step) for step in routine_steps])
     
-    for step in routine_steps:
-        step_instructions = parseRoutineStep(step)
-        products_data = await query_products(step_instructions)
+    for step, products_data in zip(routine_steps, results):
         products = products_data.get("products", [])
         usage = products_data.get("embedding_usage")
         
@@ -1,7 +1,7 @@
 """
 Re-indexes the Emerson product catalogue from the Product Matrix Excel file.
 - Source  : Summary sheet (per-product flags, metadata, usage context)
-- Embeddings : provider.embed() — respects LLM_PROVIDER setting @ 384 dims
+- Embeddings : provider.embed_many() — batched, respects LLM_PROVIDER setting @ 384 dims
 - Destination: Pinecone index (replaces all existing vectors)
 
 Run from the project root:
@@ -15,7 +15,8 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../../")))
 
 import openpyxl
-from app.agents.llm_call.provider import embed
+from app.agents.llm_call.provider import embed_many
+from app.agents.llm_call.rate_limiter import llm_priority, PRIORITY_BACKGROUND
 from app.pinecone_config import get_pinecone_index
 
 EXCEL_PATH = os.path.join(
@@ -188,10 +189,10 @@ def load_products_from_excel(path: str) -> list[dict]:
 async def embed_products(products: list[dict]) -> list[dict]:
     from app.config import LLM_PROVIDER
     print(f"[Indexer] Generating embeddings ({LLM_PROVIDER}) for {len(products)} products...")
-    for i, product in enumerate(products):
-        product["vector"] = await embed(product["content"])
-        if (i + 1) % 10 == 0:
-            print(f"[Indexer]   {i + 1}/{len(products)} embedded...")
+    with llm_priority(PRIORITY_BACKGROUND):
+        vectors = await embed_many([product["content"] for product in products])
+    for product, vector in zip(products, vectors):
+        product["vector"] = vector
     print(f"[Indexer] All embeddings generated.")
     return products
 
@@ -1,5 +1,6 @@
 # query_products.py
 
+import copy
 import sys
 import os
 
@@ -27,12 +28,21 @@ sys.path.append(project_root)
 
 
 from app.pinecone_config import get_pinecone_index
-from app.agents.llm_call.provider import embed
+from app.agents.llm_call.provider import embed, embed_many
+from app.agents.llm_call.single_flight import SingleFlight
+
+# Identical lookups already in flight (double-submits, parallel replays) share one request
+_query_flights = SingleFlight("query_products")
 
 async def query_products(query_text, top_k=5):
     """
     Query Pinecone index for top_k most relevant products.
     """
+    result = await _query_flights.do(f"{top_k}\x1f{query_text}", lambda: _query_products(query_text, top_k))
+    return copy.deepcopy(result)
+
+
+async def _query_products(query_text, top_k):
     print(f"--> Querying products for: {query_text[:50]}...")
     try:
         query_vector = await embed(query_text)
@@ -41,6 +51,27 @@ async def query_products(query_text, top_k=5):
         print(f"ERROR in embed: {str(e)}")
         raise e
 
+    return await _query_index(query_vector, top_k)
+
+
+async def query_products_many(query_texts, top_k=5):
+    """
+    Query Pinecone for several queries at once. Embeddings go out as one
+    batched call; the Pinecone lookups then run concurrently.
+    Returns one {"products": [...]} dict per query, in input order.
+    """
+    print(f"--> Querying products for {len(query_texts)} queries...")
+    try:
+        query_vectors = await embed_many(list(query_texts))
+    except Exception as e:
+        print(f"ERROR in embed_many: {str(e)}")
+        raise e
+
+    import asyncio
+    return list(await asyncio.gather(*(_query_index(vector, top_k) for vector in query_vectors)))
+
+
+async def _query_index(query_vector, top_k):
     # 2️⃣ Query Pinecone (Sync call in Thread)
     try:
         index = get_pinecone_index()
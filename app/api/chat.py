@@ -9,50 +9,59 @@ from app.api.models import (
     HairEvent,
     VitalsPayload
 )
-from app.services.db_service import get_db
 from app.services.librarian_service import get_librarian
+from app.services.async_db import get_async_db, run_db
 from app.agents.empath_diagnostic import diagnose_hair_concern
 from app.api.errors import (
     ChatValidationError,
     ChatRateLimitError,
     ChatDatabaseError,
     ChatTimeoutError,
+    ChatUnavailableError,
     ChatInternalError
 )
 from app.utils.error_logger import log_error, log_chat_event
-from collections import defaultdict
+from app.agents.llm_call.rate_limiter import llm_priority, PRIORITY_WARMUP
+from app.agents.llm_call.resilience import CircuitOpenError, llm_deadline
+from app.services.session_store import SessionStore, SESSION_MAX_MESSAGES
+from app.services.chat_message_writer import persist_chat_message, forget_pending_messages
+from app.services.recommendations.recommendation_precompute import schedule_recommendations
 from typing import Dict, List
 
-# In-memory chat history storage (session_id -> list of message dicts)
+# In-memory chat history storage (session_id -> list of message dicts), bounded by TTL/LRU
 # Each message: {"role": str, "message": str, "user_id": Optional[str]}
-_chat_history_cache: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+_chat_history_cache = SessionStore("chat_history", max_messages=SESSION_MAX_MESSAGES)
 
 # In-memory context cache (session_id -> formatted context string)
-_session_context_cache: Dict[str, str] = {}
+_session_context_cache = SessionStore("session_context")
 
-def get_history_from_cache(session_id: str, limit: int = 10) -> List[Dict[str, str]]:
+async def get_history_from_cache(session_id: str, limit: int = 10) -> List[Dict[str, str]]:
     """Retrieve chat history from in-memory cache"""
-    history = _chat_history_cache.get(session_id, [])
-    return history[-limit:] if limit else history
+    return await _chat_history_cache.ahistory(session_id, limit)
 
-def append_to_history_cache(session_id: str, role: str, message: str, user_id: str = None):
+async def append_to_history_cache(session_id: str, role: str, message: str, user_id: str = None):
     """Append a message to the in-memory chat history cache"""
-    _chat_history_cache[session_id].append({
+    await _chat_history_cache.aappend(session_id, {
         "role": role,
         "message": message,
         "user_id": user_id
     })
 
-def clear_history_cache(session_id: str):
+async def persist_message(session_id: str, role: str, message: str, user_id: str = None):
+    """Queue a message for chat_messages (write-behind) — never fails the turn"""
+    try:
+        await persist_chat_message(session_id, role, message, user_id=user_id)
+    except Exception as e:
+        log_error(e, context=f"persist_chat_message_{role}", extra_data={"session_id": session_id})
+
+async def clear_history_cache(session_id: str):
     """Remove a session's history from the cache"""
-    if session_id in _chat_history_cache:
-        del _chat_history_cache[session_id]
+    await _chat_history_cache.adelete(session_id)
 
-def clear_session_caches(session_id: str):
+async def clear_session_caches(session_id: str):
     """Clear both history and context caches for a session"""
-    clear_history_cache(session_id)
-    if session_id in _session_context_cache:
-        del _session_context_cache[session_id]
+    await clear_history_cache(session_id)
+    await _session_context_cache.adelete(session_id)
 
 router = APIRouter(tags=["chat"])
 
@@ -75,35 +84,34 @@ async def chat_endpoint(request: ChatRequest):
         if not request.message or not request.session_id:
             raise ChatValidationError("Missing message or session_id")
         
-        db = get_db()
+        db = get_async_db()
         
         # 1. Retrieve conversation history from CACHE (Fast)
         try:
-            history = get_history_from_cache(request.session_id, limit=10)
+            history = await get_history_from_cache(request.session_id, limit=10)
         except Exception as e:
             log_error(e, context="get_history_from_cache", extra_data={"session_id": request.session_id})
             # Fallback to DB if cache fails (though unlikely)
-            history = db.get_chat_history(request.session_id, limit=10)
+            history = await db.get_chat_history(request.session_id, limit=10)
             
-        # 2. Save the user's message to CACHE
+        # 2. Save the user's message to CACHE; the transcript row is written behind
         try:
-            append_to_history_cache(request.session_id, "user", request.message, user_id=request.user_id)
+            await append_to_history_cache(request.session_id, "user", request.message, user_id=request.user_id)
         except Exception as e:
             log_error(e, context="append_to_history_cache_user")
-            # Fallback to DB
-            db.append_chat_message(request.session_id, "user", request.message, user_id=request.user_id)
+        await persist_message(request.session_id, "user", request.message, user_id=request.user_id)
             
         # 3. Fetch past events from Librarian for context (with CACHE)
-        if request.session_id in _session_context_cache:
-            past_context = _session_context_cache[request.session_id]
+        past_context = await _session_context_cache.aget(request.session_id)
+        if past_context is not None:
             log_chat_event("cache_hit_context", request.session_id, "Using cached Librarian context")
         else:
             librarian = get_librarian()
             try:
-                past_events = librarian.get_recent_events(request.user_id, limit=5)
+                past_events = await run_db(librarian.get_recent_events, request.user_id, limit=5)
                 past_context = librarian.format_context_for_prompt(past_events)
                 # Store in cache
-                _session_context_cache[request.session_id] = past_context
+                await _session_context_cache.aset(request.session_id, past_context)
                 log_chat_event("cache_miss_context", request.session_id, "Fetched and cached Librarian context")
             except Exception as e:
                 log_error(e, context="librarian_fetch", extra_data={"user_id": request.user_id})
@@ -112,17 +120,21 @@ async def chat_endpoint(request: ChatRequest):
         
         # 4. Run the diagnostic agent with past context (with timeout)
         try:
-            # Set a 30 second timeout for LLM processing
-            response_message, handoff, target_vital = await asyncio.wait_for(
-                diagnose_hair_concern(
-                    history=history,
-                    current_message=request.message,
-                    past_context=past_context
-                ),
-                timeout=30.0
-            )
+            # Set a 30 second timeout for LLM processing; provider retries stay inside it
+            with llm_deadline(30.0):
+                response_message, handoff, target_vital = await asyncio.wait_for(
+                    diagnose_hair_concern(
+                        history=history,
+                        current_message=request.message,
+                        past_context=past_context
+                    ),
+                    timeout=30.0
+                )
         except asyncio.TimeoutError:
             raise ChatTimeoutError("The diagnostic engine took too long to respond. Please try again.")
+        except CircuitOpenError as e:
+            log_error(e, context="diagnose_hair_concern", extra_data={"session_id": request.session_id})
+            raise ChatUnavailableError()
         except Exception as e:
             # Check if it looks like a rate limit
             if "429" in str(e) or "quota" in str(e).lower():
@@ -141,10 +153,11 @@ async def chat_endpoint(request: ChatRequest):
                     {"role": "assistant", "message": response_message}
                 ]
                 # Summarization failure shouldn't crash the whole chat
-                summary, keywords = await asyncio.wait_for(
-                    summarize_diagnostic(full_context),
-                    timeout=15.0
-                )
+                with llm_deadline(15.0):
+                    summary, keywords = await asyncio.wait_for(
+                        summarize_diagnostic(full_context),
+                        timeout=15.0
+                    )
             except Exception as e:
                 log_error(e, context="summarization_failure")
                 # Non-critical failure, continue with empty summary
@@ -153,10 +166,10 @@ async def chat_endpoint(request: ChatRequest):
         
         # 6. Save the assistant's response to CACHE
         try:
-            append_to_history_cache(request.session_id, "assistant", response_message, user_id=request.user_id)
+            await append_to_history_cache(request.session_id, "assistant", response_message, user_id=request.user_id)
         except Exception as e:
             log_error(e, context="append_to_history_cache_assistant")
-            db.append_chat_message(request.session_id, "assistant", response_message, user_id=request.user_id)
+        await persist_message(request.session_id, "assistant", response_message, user_id=request.user_id)
         
         log_chat_event("success_cache_history", request.session_id, "Response generated with in-memory history")
         
@@ -169,7 +182,7 @@ async def chat_endpoint(request: ChatRequest):
             keywords=keywords
         )
         
-    except (ChatValidationError, ChatRateLimitError, ChatDatabaseError, ChatTimeoutError, ChatInternalError) as ce:
+    except (ChatValidationError, ChatRateLimitError, ChatDatabaseError, ChatTimeoutError, ChatUnavailableError, ChatInternalError) as ce:
         # Re-raise known chat errors (FastAPI handles status_code)
         raise HTTPException(status_code=ce.status_code, detail=ce.message)
     except Exception as e:
@@ -197,19 +210,17 @@ async def chat_stream_endpoint(request: ChatRequest):
         raise HTTPException(status_code=400, detail="Missing message or session_id")
 
     # All pre-processing is identical to /api/chat
-    db = get_db()
+    history = await get_history_from_cache(request.session_id, limit=10)
+    await append_to_history_cache(request.session_id, "user", request.message, user_id=request.user_id)
+    await persist_message(request.session_id, "user", request.message, user_id=request.user_id)
 
-    history = get_history_from_cache(request.session_id, limit=10)
-    append_to_history_cache(request.session_id, "user", request.message, user_id=request.user_id)
-
-    if request.session_id in _session_context_cache:
-        past_context = _session_context_cache[request.session_id]
-    else:
+    past_context = await _session_context_cache.aget(request.session_id)
+    if past_context is None:
         try:
             librarian = get_librarian()
-            past_events = librarian.get_recent_events(request.user_id, limit=5)
+            past_events = await run_db(librarian.get_recent_events, request.user_id, limit=5)
             past_context = librarian.format_context_for_prompt(past_events)
-            _session_context_cache[request.session_id] = past_context
+            await _session_context_cache.aset(request.session_id, past_context)
         except Exception as e:
             log_error(e, context="librarian_fetch_stream", extra_data={"user_id": request.user_id})
             past_context = ""
@@ -226,7 +237,8 @@ async def chat_stream_endpoint(request: ChatRequest):
                 elif event["type"] == "done":
                     # Save the clean (checkpoint-stripped) message to cache
                     clean = event.get("clean_message", full_message)
-                    append_to_history_cache(request.session_id, "assistant", clean, user_id=request.user_id)
+                    await append_to_history_cache(request.session_id, "assistant", clean, user_id=request.user_id)
+                    await persist_message(request.session_id, "assistant", clean, user_id=request.user_id)
                     yield f"data: {json.dumps({'type': 'done', 'handoff': event['handoff'], 'target_vital': event['target_vital'], 'session_id': request.session_id})}\n\n"
         except asyncio.TimeoutError:
             yield f"data: {json.dumps({'type': 'error', 'detail': 'Diagnostic engine timed out.'})}\n\n"
@@ -259,16 +271,18 @@ async def chat_warmup(request: ChatRequest):
 
         librarian = get_librarian()
 
-        if request.session_id not in _session_context_cache:
-            past_events = librarian.get_recent_events(request.user_id, limit=5)
+        if not await _session_context_cache.acontains(request.session_id):
+            past_events = await run_db(librarian.get_recent_events, request.user_id, limit=5)
             past_context = librarian.format_context_for_prompt(past_events)
-            _session_context_cache[request.session_id] = past_context
+            await _session_context_cache.aset(request.session_id, past_context)
             log_chat_event("warmup_success", request.session_id, "Context pre-cached")
         else:
             past_events = []  # already cached — skip re-fetch
             log_chat_event("warmup_skipped", request.session_id, "Context already cached")
 
-        greeting = await librarian.build_greeting(past_events)
+        # Greeting is nice-to-have — it yields LLM capacity to live conversations
+        with llm_priority(PRIORITY_WARMUP):
+            greeting = await librarian.build_greeting(past_events)
 
         return {
             "status": "ready",
@@ -301,7 +315,7 @@ async def save_event_endpoint(request: SaveEventRequest):
         if not request.target_vital or request.vital_value is None:
             raise ChatValidationError("Missing target_vital or vital_value")
             
-        db = get_db()
+        db = get_async_db()
         librarian = get_librarian()
         
         # Categorize the event using Librarian
@@ -333,16 +347,23 @@ async def save_event_endpoint(request: SaveEventRequest):
         
         # Save to database
         try:
-            saved_event = db.save_hair_event(event)
+            saved_event = await db.save_hair_event(event)
         except Exception as e:
             log_error(e, context="save_hair_event")
             raise ChatDatabaseError(f"Failed to save event: {str(e)}")
+
+        # New vitals make the current recommendation set stale; regenerate in the background
+        try:
+            schedule_recommendations(request.user_id, "hair_event", force=True)
+        except Exception as e:
+            log_error(e, context="schedule_recommendations")
         
         # Clean up chat session cache (graceful cleanup)
         try:
-            clear_session_caches(request.session_id)
+            await clear_session_caches(request.session_id)
+            await forget_pending_messages(request.session_id)
             # Still call DB cleanup for any legacy data or safety
-            db.delete_chat_session(request.session_id)
+            await db.delete_chat_session(request.session_id)
         except Exception as e:
             log_error(e, context="delete_chat_session")
         
@@ -373,7 +394,7 @@ async def get_vitals_summary_endpoint(user_id: str):
     """
     try:
         librarian = get_librarian()
-        summary = librarian.get_vitals_summary(user_id)
+        summary = await run_db(librarian.get_vitals_summary, user_id)
         return summary
     except Exception as e:
         log_error(e, context="get_vitals_summary_endpoint")
@@ -384,22 +405,34 @@ async def get_vitals_summary_endpoint(user_id: str):
 
 
 @router.get("/events/{user_id}")
-async def get_user_events(user_id: str):
+async def get_user_events(user_id: str, limit: int = None, cursor: str = None, per_category: int = None):
     """
     GET /api/events/{user_id}
     
-    Retrieve all diagnostic events for a specific user.
+    Retrieve a user's diagnostic events, newest first, one page at a time.
     
     Args:
         user_id: The user identifier
+        limit: Page size (default 50, max 200)
+        cursor: next_cursor from the previous page
+        per_category: Instead of a page, return the newest N events in each vital category
         
     Returns:
-        List of HairEvents for this user
+        A page of HairEvents plus next_cursor (null on the last page), or
+        events_by_category when per_category is set
     """
     try:
-        db = get_db()
-        events = db.get_events_by_user(user_id)
-        return {"user_id": user_id, "events": events, "count": len(events)}
+        if per_category:
+            librarian = get_librarian()
+            by_category = await run_db(librarian.get_latest_events_per_category, user_id, per_category=min(per_category, 50))
+            count = sum(len(events) for events in by_category.values())
+            return {"user_id": user_id, "events_by_category": by_category, "count": count}
+        
+        db = get_async_db()
+        events, next_cursor = await db.get_events_page(user_id, limit=limit, cursor=cursor)
+        return {"user_id": user_id, "events": events, "count": len(events), "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -415,11 +448,12 @@ async def clear_session(session_id: str):
     Clear a chat session and its caches (useful for testing/debugging).
     """
     try:
-        db = get_db()
+        db = get_async_db()
         # Clear in-memory caches
-        clear_session_caches(session_id)
+        await clear_session_caches(session_id)
+        await forget_pending_messages(session_id)
         # Clear database history
-        db.clear_session(session_id)
+        await db.clear_session(session_id)
         return {"message": f"Session {session_id} cleared successfully"}
     except Exception as e:
         log_error(e, context="clear_session_endpoint")
@@ -27,6 +27,11 @@ class ChatTimeoutError(ChatError):
     def __init__(self, message: str = "Request timed out."):
         super().__init__(message, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
 
+class ChatUnavailableError(ChatError):
+    """Raised when the LLM provider is known to be down (circuit open)"""
+    def __init__(self, message: str = "The assistant is temporarily unavailable. Please try again shortly."):
+        super().__init__(message, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 class ChatInternalError(ChatError):
     """Raised for unexpected internal failures"""
     def __init__(self, message: str):
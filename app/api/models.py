@@ -124,6 +124,8 @@ class RecommendationsResponse(BaseModel):
     status: str
     recommendations: List[Recommendation] = Field(default_factory=list)
     message: Optional[str] = None
+    generated_at: Optional[str] = Field(None, description="ISO timestamp the set was generated")
+    stale: bool = Field(default=False, description="Set is older than RECOMMENDATION_MAX_AGE_SECS; a refresh is queued")
 
 class RecommendationDecisionRequest(BaseModel):
     """Input schema for PATCH /api/recommendations/{recommendation_id}"""
@@ -22,9 +22,9 @@ async def get_routine_endpoint(user_id: str):
     Get the most recent routine for a user.
     """
     try:
-        from app.services.db_service import get_db
-        db = get_db()
-        routine = db.get_active_routine(user_id)
+        from app.services.async_db import get_async_db
+        db = get_async_db()
+        routine = await db.get_active_routine(user_id)
         
         if not routine:
             # Return empty object if no routine found (not 404, to simplify frontend logic)
@@ -6,8 +6,8 @@ from app.api.models import (
     Recommendation, RecommendationsResponse, RecommendationDecisionRequest,
     PushSubscriptionRequest
 )
-from app.services.db_service import get_db
-from app.services.recommendations.recommendation_agent import generate_recommendations
+from app.services.async_db import get_async_db
+from app.services.recommendations.recommendation_precompute import is_stale, schedule_recommendations
 from app.services.recommendations.push_service import store_subscription
 
 router = APIRouter(tags=["recommendations"])
@@ -17,37 +17,28 @@ router = APIRouter(tags=["recommendations"])
 async def get_recommendations(user_id: str) -> RecommendationsResponse:
     """
     Fetch recommendations for a user.
-    If no recommendations exist for today, generate new ones via LLM.
-    Returns pending recommendations only (already accepted/dismissed ones are excluded).
+    Returns the user's precomputed pending set (already accepted/dismissed ones
+    are excluded) with its freshness marker. Sets are generated in the
+    background (recommendation_precompute) — this never waits on the LLM.
+    A user with no set yet gets an empty list and is queued for generation.
     """
-    db = get_db()
+    db = get_async_db()
 
     try:
-        # Check if recommendations already exist for today
-        pending_recs = db.get_pending_recommendations(user_id)
+        pending_recs = await db.get_pending_recommendations(user_id)
 
         if not pending_recs:
-            # Generate new recommendations
-            # Fetch user context
-            user_metadata = db.get_user_metadata(user_id)
-            user_routine = db.get_active_routine(user_id)
-            user_alerts = db.get_pending_alerts(user_id, limit=3)
-            user_vitals = db.get_vitals_summary(user_id) if hasattr(db, 'get_vitals_summary') else {}
-
-            # Call recommendation agent
-            recommendations = await generate_recommendations(
-                user_id=user_id,
-                user_metadata=user_metadata or {},
-                routine=user_routine or {},
-                alerts=user_alerts,
-                vitals=user_vitals
+            schedule_recommendations(user_id, "read_miss")
+            return RecommendationsResponse(
+                status="pending",
+                recommendations=[],
+                message="Your recommendations are being prepared"
             )
 
-            # Save recommendations to DB
-            for rec in recommendations:
-                db.save_recommendation(user_id, rec)
-
-            pending_recs = recommendations
+        generated_at = pending_recs[0].get("generated_at") or pending_recs[0].get("created_at")
+        stale = is_stale(generated_at)
+        if stale:
+            schedule_recommendations(user_id, "read_miss")
 
         # Convert to response format
         rec_dicts = [
@@ -69,7 +60,9 @@ async def get_recommendations(user_id: str) -> RecommendationsResponse:
         return RecommendationsResponse(
             status="success",
             recommendations=rec_dicts,
-            message=f"Found {len(pending_recs)} recommendations for you today"
+            message=f"Found {len(pending_recs)} recommendations for you today",
+            generated_at=generated_at,
+            stale=stale
         )
 
     except Exception as e:
@@ -85,10 +78,10 @@ async def update_recommendation(recommendation_id: str, request: RecommendationD
     """
     Update a recommendation status (accept or dismiss).
     """
-    db = get_db()
+    db = get_async_db()
 
     try:
-        success = db.update_recommendation_status(recommendation_id, request.status)
+        success = await db.update_recommendation_status(recommendation_id, request.status)
 
         if not success:
             raise HTTPException(
@@ -147,10 +140,10 @@ async def unsubscribe_from_push(user_id: str):
     Unsubscribe a user from push notifications.
     Removes their subscription from the database.
     """
-    db = get_db()
+    db = get_async_db()
 
     try:
-        success = db.delete_push_subscription(user_id)
+        success = await db.delete_push_subscription(user_id)
 
         if not success:
             raise HTTPException(
@@ -1,74 +1,55 @@
-from datetime import datetime, timezone
+from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
 
-from app.services.alerts.alert_service import process_alerts
-from app.services.db_service import get_db
-from app.services.environmental_factors.weather_service import get_city_environmental_data
+from app.services.alerts.alert_cron import get_alert_cron
+from app.services.recommendations.recommendation_precompute import recommendation_precompute_stats
 
 router = APIRouter(tags=["scenarios"])
 
 
-@router.post("/run")
-async def run_scenarios(background_tasks: BackgroundTasks):
+@router.post("/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_scenarios(
+    background_tasks: BackgroundTasks,
+    cursor: Optional[str] = None,
+    resume: bool = False,
+    page_size: Optional[int] = None,
+):
     """
-    Daily cron entry point. Iterates every user, builds their context, and
-    hands off to process_alerts — the same engine the chat orchestrator uses.
-    Dedup + cooldown are owned by the alerts pipeline now; this endpoint just
-    sources the inputs.
+    Daily cron entry point. Starts a background run that iterates every user,
+    builds their context, and runs the same rules engine the chat
+    orchestrator uses. Dedup + cooldown are owned by the alerts pipeline,
+    applied a page of users at a time; the job just sources the inputs (see
+    alert_cron).
+
+    Returns immediately; poll GET /status for progress. `resume=true`
+    continues after the last checkpoint of an unfinished run, `cursor`
+    starts after an explicit user_id.
     """
-    db = get_db()
-    users = db.get_all_users()
-    current_date = datetime.now(timezone.utc)
+    job = get_alert_cron()
+    if job.running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Alert cron run {job.run_id} is already in progress",
+        )
 
-    results = []
+    start_after = cursor or (job.resume_cursor() if resume else None)
+    job.page_size = page_size
+    job.start(start_after=start_after)
+    background_tasks.add_task(job.run)
 
-    for user in users:
-        user_id = user.get("user_id")
-        if not user_id:
-            continue
+    return {"status": "started", "run_id": job.run_id, "resumed_from": start_after}
 
-        wash_logs = db.get_latest_wash_events(user_id, limit=5)
-        routine = db.get_active_routine(user_id) or {}
-
-        env_kwargs = {}
-        location = user.get("location")
-        if location:
-            env_kwargs["country"] = location
-            try:
-                weather = await get_city_environmental_data(location, attribute="all")
-                if weather:
-                    env_kwargs["temp_c"] = weather.get("peak_heat")
-                    env_kwargs["humidity"] = weather.get("peak_humidity")
-            except Exception as e:
-                print(f"[Scenarios] weather lookup failed for {user_id}: {e}")
-
-        try:
-            alerts = process_alerts(
-                user_id,
-                snapshot={},
-                wash_logs=wash_logs,
-                routine=routine,
-                user_meta=user,
-                current_date=current_date,
-                **env_kwargs,
-            )
-        except Exception as e:
-            print(f"[Scenarios] process_alerts failed for {user_id}: {e}")
-            continue
-
-        if alerts:
-            results.append({
-                "user_id": user_id,
-                "alerts": [
-                    {"alert_type": a.alert_type, "scenario": a.scenario, "prompt": a.message}
-                    for a in alerts
-                ],
-            })
 
+@router.get("/status")
+async def scenarios_status():
+    """
+    Progress of the current (or last) cron run, plus the persisted checkpoint
+    and the recommendation precompute queue the run feeds.
+    """
+    job = get_alert_cron()
     return {
-        "status": "success",
-        "processed_users": len(users),
-        "actions_generated": len(results),
-        "details": results,
+        **job.status(),
+        "checkpoint": job.load_checkpoint(),
+        "recommendations": recommendation_precompute_stats(),
     }
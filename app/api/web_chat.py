@@ -3,18 +3,17 @@ from fastapi import APIRouter, HTTPException, status
 from fastapi.responses import StreamingResponse
 from app.api.models import WebChatRequest, WebChatResponse
 from app.agents.web_chat_orchestrator import orchestrate_web_chat
-from collections import defaultdict
+from app.services.session_store import SessionStore, SESSION_MAX_MESSAGES
 from typing import Dict, List
 
-# In-memory chat history for web chat sessions (separate from diagnostic chat)
-_web_chat_history_cache: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+# In-memory chat history for web chat sessions (separate from diagnostic chat), bounded by TTL/LRU
+_web_chat_history_cache = SessionStore("web_chat_history_legacy", max_messages=SESSION_MAX_MESSAGES)
 
-def get_web_history(session_id: str, limit: int = 10) -> List[Dict[str, str]]:
-    history = _web_chat_history_cache.get(session_id, [])
-    return history[-limit:] if limit else history
+async def get_web_history(session_id: str, limit: int = 10) -> List[Dict[str, str]]:
+    return await _web_chat_history_cache.ahistory(session_id, limit)
 
-def append_web_history(session_id: str, role: str, message: str, user_id: str = None):
-    _web_chat_history_cache[session_id].append({
+async def append_web_history(session_id: str, role: str, message: str, user_id: str = None):
+    await _web_chat_history_cache.aappend(session_id, {
         "role": role,
         "message": message,
         "user_id": user_id
@@ -25,8 +24,8 @@ router = APIRouter(tags=["web_chat"])
 @router.post("/chat", response_model=WebChatResponse)
 async def web_chat_endpoint(request: WebChatRequest):
     """Sync endpoint for Web Chat."""
-    history = get_web_history(request.session_id)
-    append_web_history(request.session_id, "user", request.message, user_id=request.user_id)
+    history = await get_web_history(request.session_id)
+    await append_web_history(request.session_id, "user", request.message, user_id=request.user_id)
     
     full_message = ""
     shopify_id = None
@@ -39,7 +38,7 @@ async def web_chat_endpoint(request: WebChatRequest):
             shopify_id = event.get("shopify_id")
             msg_type = "product"
 
-    append_web_history(request.session_id, "assistant", full_message, user_id=request.user_id)
+    await append_web_history(request.session_id, "assistant", full_message, user_id=request.user_id)
     
     return WebChatResponse(
         message=full_message,
@@ -51,8 +50,8 @@ async def web_chat_endpoint(request: WebChatRequest):
 @router.post("/chat/stream")
 async def web_chat_stream_endpoint(request: WebChatRequest):
     """Streaming SSE endpoint for Web Chat."""
-    history = get_web_history(request.session_id)
-    append_web_history(request.session_id, "user", request.message, user_id=request.user_id)
+    history = await get_web_history(request.session_id)
+    await append_web_history(request.session_id, "user", request.message, user_id=request.user_id)
 
     async def event_generator():
         full_message = ""
@@ -65,7 +64,7 @@ async def web_chat_stream_endpoint(request: WebChatRequest):
                     full_message += event["content"]
             
             # Save final message to history
-            append_web_history(request.session_id, "assistant", full_message, user_id=request.user_id)
+            await append_web_history(request.session_id, "assistant", full_message, user_id=request.user_id)
             yield f"data: {json.dumps({'type': 'done', 'session_id': request.session_id})}\n\n"
             
         except Exception as e:
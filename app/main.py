@@ -1,6 +1,20 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.agents.llm_call.provider import close_clients
+from app.agents.llm_call.rate_limiter import llm_priority, PRIORITY_BACKGROUND
+from app.services.alerts.alert_cron import stop_alert_cron
+from app.services.chat_message_writer import close_chat_writer
+from app.services.async_db import close_db_pool
+from app.services.decision_state.pipeline import warm_product_query_embeddings
+from app.services.environmental_factors.weather_service import close_weather_client
+from app.services.recommendations.push_service import close_push_client, load_vapid_key
+from app.services.recommendations.recommendation_precompute import stop_recommendation_precompute
+
 from app.api.search import router as search_router
 from app.api.orchestrator import router as orchestrator_router
 from app.api.chat import router as chat_router
@@ -9,7 +23,55 @@ from app.api.user import router as user_router
 from app.api.recommendations import router as recommendations_router
 from app.web_chat_agent.router import router as web_chat_router
 
-app = FastAPI(title="Concierge API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # List all active routes in your terminal
+    print("\n--> REGISTERED ROUTES:")
+    for route in app.routes:
+        print(f"    {getattr(route, 'path', route)} [{getattr(route, 'methods', None)}]")
+    print("----------------------\n")
+
+    # Precompute product-query embeddings in the background — startup isn't blocked
+    warmup = None
+    if os.getenv("PRECOMPUTE_EMBEDDINGS", "true").lower() == "true":
+        warmup = asyncio.create_task(_warm_embeddings())
+
+    # Parse the VAPID key once; push batches reuse it (and its signed headers)
+    try:
+        load_vapid_key()
+    except Exception as e:
+        print(f"[PUSH] Invalid VAPID_PRIVATE_KEY, push disabled until fixed: {e}")
+
+    yield
+
+    if warmup and not warmup.done():
+        warmup.cancel()
+
+    # Checkpoint a cron run in progress so the next one can resume it
+    await stop_alert_cron()
+
+    # Queued recommendation sets are regenerated by the next cron pass or read
+    await stop_recommendation_precompute()
+
+    # Flush queued chat transcripts before the process goes away
+    await close_chat_writer()
+    close_db_pool()
+
+    # Release pooled LLM / weather / push connections so uvicorn exits cleanly
+    await close_clients()
+    await close_weather_client()
+    await close_push_client()
+
+
+async def _warm_embeddings():
+    try:
+        with llm_priority(PRIORITY_BACKGROUND):
+            await warm_product_query_embeddings()
+    except Exception as e:
+        print(f"[Startup] Embedding warmup failed: {e}")
+
+
+app = FastAPI(title="Concierge API", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -37,11 +99,3 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "concierge-api"}
-
-# Add this startup event to list all active routes in your terminal
-@app.on_event("startup")
-async def startup_event():
-    print("\n--> REGISTERED ROUTES:")
-    for route in app.routes:
-        print(f"    {route.path} [{route.methods}]")
-    print("----------------------\n")
\ No newline at end of file
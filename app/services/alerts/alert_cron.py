@@ -0,0 +1,449 @@
+"""
+The daily alert cron as a background job.
+
+POST /api/scenarios/run used to walk every user one after another inside the
+request: wash logs, routine, a weather fetch and process_alerts per user, so
+the run took users x (several round trips) and the HTTP call blocked until the
+end. AlertCronJob runs the same per-user work on a pool of asyncio workers
+fed from the paged user iterator:
+
+    job = get_alert_cron()
+    job.start(start_after=job.resume_cursor())   # or None for a fresh run
+    await job.run()                               # usually via BackgroundTasks
+
+  - CRON_WORKERS users are in flight at once; the feed queue is bounded, so
+    memory stays flat however many users there are
+  - each user gets CRON_USER_TIMEOUT_SECS; a slow or failing user is counted
+    and listed in the status, never retried within the run
+  - progress is checkpointed to CRON_CHECKPOINT_PATH as a user_id watermark:
+    every user at or before it is finished, even though workers complete out
+    of order. A run that crashed or was cancelled resumes after it
+  - status() reports counts, throughput and recent failures for GET /status
+  - workers only evaluate rules; once every user of a page is evaluated, the
+    page's candidates are deduped against cooldowns and logged together
+    (process_alerts_many: one lookup + one insert per page), and only then
+    do those users count as finished for the checkpoint
+  - weather is resolved per city, not per user: as each page arrives its new
+    cities are looked up concurrently (CRON_ENV_CONCURRENCY at a time) and the
+    resulting CityEnvironment is shared by every user there, so environment
+    lookups scale with cities. status()["environment"] reports how many
+    lookups that saved
+  - each delivered page's users are handed to on_page_done — by default the
+    recommendation precompute queue, which regenerates their stale sets in
+    the background (recommendation_precompute)
+
+Env:
+  CRON_WORKERS            users processed concurrently         (default 8)
+  CRON_USER_TIMEOUT_SECS  budget for one user, reads + alerts  (default 30)
+  CRON_CHECKPOINT_EVERY   finished users between checkpoints   (default 100)
+  CRON_CHECKPOINT_PATH    progress file (default <tmp>/concierge_alert_cron.json)
+  CRON_ENV_CONCURRENCY    city weather lookups in flight      (default 8)
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.alerts.alert_rules import CityEnvironment, build_city_environment, evaluate
+from app.services.alerts.alert_service import process_alerts_many
+from app.services.alerts.alert_types import Alert
+from app.services.async_db import get_async_db, run_db
+from app.services.environmental_factors.weather_service import get_city_environmental_data
+from app.services.recommendations.recommendation_precompute import schedule_page_recommendations
+from app.services.user_pages import iter_user_pages
+
+CRON_WORKERS           = int(os.getenv("CRON_WORKERS",             "8"))
+CRON_USER_TIMEOUT_SECS = float(os.getenv("CRON_USER_TIMEOUT_SECS", "30"))
+CRON_CHECKPOINT_EVERY  = int(os.getenv("CRON_CHECKPOINT_EVERY",    "100"))
+CRON_ENV_CONCURRENCY   = int(os.getenv("CRON_ENV_CONCURRENCY",     "8"))
+CRON_CHECKPOINT_PATH   = os.getenv(
+    "CRON_CHECKPOINT_PATH", os.path.join(tempfile.gettempdir(), "concierge_alert_cron.json")
+)
+
+_RECENT_FAILURES = 20
+
+
+async def load_city_environment(city: str) -> CityEnvironment:
+    """One weather lookup for a city, turned into everything the env rules need."""
+    weather = await get_city_environmental_data(city, attribute="all") or {}
+    return build_city_environment(city, weather.get("peak_heat"), weather.get("peak_humidity"))
+
+
+async def evaluate_user(
+    user: Dict,
+    current_date: datetime,
+    environment: Optional[CityEnvironment] = None,
+) -> List[Alert]:
+    """
+    Build one user's cron context and return the candidate alerts, before
+    cooldowns (see deliver_alerts). Raises on failure. Without a precomputed
+    `environment` the user's city is looked up here.
+    """
+    user_id = user["user_id"]
+    db = get_async_db()
+    wash_logs = await db.get_latest_wash_events(user_id, limit=5)
+    routine = await db.get_active_routine(user_id) or {}
+
+    env_kwargs = {}
+    location = user.get("location")
+    if environment is not None:
+        env_kwargs["environment"] = environment
+    elif location:
+        env_kwargs["country"] = location
+        try:
+            weather = await get_city_environmental_data(location, attribute="all")
+            if weather:
+                env_kwargs["temp_c"] = weather.get("peak_heat")
+                env_kwargs["humidity"] = weather.get("peak_humidity")
+        except Exception as e:
+            # Weather only sharpens the environmental alerts; the rest still apply
+            print(f"[AlertCron] weather lookup failed for {user_id}: {e}")
+
+    return evaluate(
+        {},
+        wash_logs=wash_logs,
+        routine=routine,
+        user_meta=user,
+        current_date=current_date,
+        **env_kwargs,
+    )
+
+
+async def deliver_alerts(user_candidates: Dict[str, List[Alert]]) -> Dict[str, List[Alert]]:
+    """Cooldown-filter and log a page's candidates in one lookup and one insert."""
+    return await run_db(process_alerts_many, user_candidates)
+
+
+class _PageBatch:
+    """A page's users between evaluation and delivery."""
+    __slots__ = ("seqs", "candidates", "remaining", "sealed")
+
+    def __init__(self):
+        self.seqs: List[int] = []
+        self.candidates: Dict[str, List[Alert]] = {}
+        self.remaining = 0
+        self.sealed = False
+
+
+class AlertCronJob:
+    """One cron run at a time: worker pool, per-user deadline, watermark checkpoint."""
+
+    def __init__(
+        self,
+        process: Callable[[Dict, datetime, Optional[CityEnvironment]], Awaitable[List[Alert]]] = evaluate_user,
+        deliver: Callable[[Dict[str, List[Alert]]], Awaitable[Dict[str, List[Alert]]]] = deliver_alerts,
+        load_environment: Callable[[str], Awaitable[CityEnvironment]] = load_city_environment,
+        on_page_done: Callable[[List[str]], None] = schedule_page_recommendations,
+        workers: int = CRON_WORKERS,
+        user_timeout: float = CRON_USER_TIMEOUT_SECS,
+        checkpoint_path: str = CRON_CHECKPOINT_PATH,
+        checkpoint_every: int = CRON_CHECKPOINT_EVERY,
+        page_size: Optional[int] = None,
+        env_concurrency: int = CRON_ENV_CONCURRENCY,
+    ):
+        self.process = process
+        self.deliver = deliver
+        self.load_environment = load_environment
+        self.on_page_done = on_page_done
+        self.env_concurrency = env_concurrency
+        self.workers = workers
+        self.user_timeout = user_timeout
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.page_size = page_size
+
+        self.state = "idle"
+        self.run_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._finished: Optional[asyncio.Event] = None
+        self._reset(None)
+
+    def _reset(self, start_after: Optional[str]) -> None:
+        self.resumed_from = start_after
+        self.cursor = start_after
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._counts = {"processed": 0, "succeeded": 0, "failed": 0, "timed_out": 0, "alerts": 0, "batches": 0}
+        self._user_ms = 0.0
+        self._in_flight = 0
+        self._failures: deque = deque(maxlen=_RECENT_FAILURES)
+        # Watermark bookkeeping: users get a sequence number as they are queued
+        self._next_seq = 0
+        self._low_seq = 0
+        self._queued_ids: Dict[int, str] = {}
+        self._done_seqs: set = set()
+        self._since_checkpoint = 0
+        # city -> CityEnvironment for this run; bounded by distinct cities
+        self._environments: Dict[str, CityEnvironment] = {}
+        self._env_counts = {"cities": 0, "cities_without_weather": 0, "users_with_location": 0}
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+    def start(self, start_after: Optional[str] = None) -> None:
+        """Claim the job for a new run; call run() next. Raises if one is in progress."""
+        if self.running:
+            raise RuntimeError(f"alert cron run {self.run_id} is already in progress")
+        self._reset(start_after)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.state = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+
+    async def run(self) -> Dict:
+        """Process every user after the start cursor. Returns the final status."""
+        if self._task is not None:
+            raise RuntimeError(f"alert cron run {self.run_id} is already in progress")
+        if not self.running:
+            self.start()
+        self._task = asyncio.current_task()
+        self._finished = asyncio.Event()
+        current_date = datetime.now(timezone.utc)
+        print(f"[AlertCron] run {self.run_id} started after {self.resumed_from!r} with {self.workers} workers")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self._worker(queue, current_date)) for _ in range(self.workers)]
+        try:
+            async for users, _ in iter_user_pages(page_size=self.page_size, start_after=self.resumed_from):
+                await self._prepare_environments(users)
+                batch = _PageBatch()
+                for user in users:
+                    if not user.get("user_id"):
+                        continue
+                    self._queued_ids[self._next_seq] = user["user_id"]
+                    batch.remaining += 1
+                    await queue.put((self._next_seq, user, batch))
+                    self._next_seq += 1
+                batch.sealed = True
+                if batch.remaining == 0:
+                    await self._deliver(batch)
+            await queue.join()
+            self.state = "completed"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            # A user page read failed: finish the users already queued, then
+            # stop with the checkpoint where the run can resume
+            await queue.join()
+            self.state = "failed"
+            self.error = str(e)
+            print(f"[AlertCron ERROR] run {self.run_id} stopped after {self.cursor!r}: {e}")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.finished_at = datetime.now(timezone.utc)
+            self._elapsed = time.perf_counter() - self._started
+            self._save_checkpoint()
+            self._task = None
+            self._finished.set()
+            print(
+                f"[AlertCron] run {self.run_id} {self.state}: {self._counts['processed']} users, "
+                f"{self._counts['failed'] + self._counts['timed_out']} failed, "
+                f"{self._counts['alerts']} alerts in {self._elapsed:.1f}s"
+            )
+        return self.status()
+
+    async def _worker(self, queue: asyncio.Queue, current_date: datetime) -> None:
+        while True:
+            seq, user, batch = await queue.get()
+            try:
+                alerts = await self._process_one(user, current_date)
+                # Not reached when cancelled: that user stays after the watermark
+                if alerts is not None:
+                    batch.candidates[user["user_id"]] = alerts
+                batch.seqs.append(seq)
+                batch.remaining -= 1
+                if batch.sealed and batch.remaining == 0:
+                    await self._deliver(batch)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, batch: _PageBatch) -> None:
+        """Dedup + log a finished page's alerts, then release its users to the watermark."""
+        candidates = {user_id: alerts for user_id, alerts in batch.candidates.items() if alerts}
+        if candidates:
+            try:
+                delivered = await self.deliver(candidates)
+                self._counts["alerts"] += sum(len(alerts) for alerts in delivered.values())
+                self._counts["batches"] += 1
+            except Exception as e:
+                self._counts["succeeded"] -= len(candidates)
+                self._counts["failed"] += len(candidates)
+                self._record_failure(f"{len(candidates)} users", f"alert delivery failed: {e}")
+        for seq in batch.seqs:
+            self._mark_done(seq)
+        try:
+            self.on_page_done(list(batch.candidates))
+        except Exception as e:
+            print(f"[AlertCron] page hook failed: {e}")
+
+    async def _process_one(self, user: Dict, current_date: datetime) -> Optional[List[Alert]]:
+        """The user's candidate alerts, or None if evaluation failed."""
+        user_id = user["user_id"]
+        self._in_flight += 1
+        started = time.perf_counter()
+        alerts = None
+        try:
+            environment = self._environments.get(user.get("location"))
+            alerts = await asyncio.wait_for(
+                self.process(user, current_date, environment), timeout=self.user_timeout
+            )
+            self._counts["succeeded"] += 1
+        except asyncio.TimeoutError:
+            self._counts["timed_out"] += 1
+            self._record_failure(user_id, f"timed out after {self.user_timeout:.1f}s")
+        except Exception as e:
+            self._counts["failed"] += 1
+            self._record_failure(user_id, str(e))
+        finally:
+            self._in_flight -= 1
+        self._counts["processed"] += 1
+        self._user_ms += (time.perf_counter() - started) * 1000
+        return alerts
+
+    async def _prepare_environments(self, users: List[Dict]) -> None:
+        """Resolve the page's not-yet-seen cities concurrently before its users are queued."""
+        locations = [u["location"] for u in users if u.get("user_id") and u.get("location")]
+        self._env_counts["users_with_location"] += len(locations)
+        cities = set(locations) - self._environments.keys()
+        if not cities:
+            return
+
+        semaphore = asyncio.Semaphore(self.env_concurrency)
+
+        async def resolve(city: str) -> None:
+            async with semaphore:
+                try:
+                    environment = await asyncio.wait_for(self.load_environment(city), timeout=self.user_timeout)
+                except Exception as e:
+                    # Same as a failed per-user lookup: water-hardness rules still apply
+                    print(f"[AlertCron] weather for {city} unavailable: {e or type(e).__name__}")
+                    environment = build_city_environment(city, None, None)
+            if environment.temp_c is None:
+                self._env_counts["cities_without_weather"] += 1
+            self._environments[city] = environment
+
+        await asyncio.gather(*(resolve(city) for city in cities))
+        self._env_counts["cities"] += len(cities)
+
+    def _record_failure(self, user_id: str, error: str) -> None:
+        print(f"[AlertCron] {user_id} failed: {error}")
+        self._failures.append({"user_id": user_id, "error": error, "at": datetime.now(timezone.utc).isoformat()})
+
+    def _mark_done(self, seq: int) -> None:
+        """Advance the watermark past every user finished without a gap before it."""
+        self._done_seqs.add(seq)
+        while self._low_seq in self._done_seqs:
+            self._done_seqs.discard(self._low_seq)
+            self.cursor = self._queued_ids.pop(self._low_seq)
+            self._low_seq += 1
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._save_checkpoint()
+
+    # -- checkpoint -----------------------------------------------------------
+
+    def _save_checkpoint(self) -> None:
+        self._since_checkpoint = 0
+        payload = {
+            "run_id": self.run_id,
+            "state": self.state,
+            "cursor": self.cursor,
+            "resumed_from": self.resumed_from,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **self._counts,
+        }
+        tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.checkpoint_path)
+        except Exception as e:
+            print(f"[AlertCron ERROR] Could not write checkpoint {self.checkpoint_path}: {e}")
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        """The last persisted progress record, from this process or a previous one."""
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[AlertCron ERROR] Could not read checkpoint {self.checkpoint_path}: {e}")
+            return None
+
+    def resume_cursor(self) -> Optional[str]:
+        """Where an unfinished run stopped; None when the last run completed."""
+        checkpoint = self.load_checkpoint()
+        if not checkpoint or checkpoint.get("state") == "completed":
+            return None
+        return checkpoint.get("cursor")
+
+    # -- control / reporting --------------------------------------------------
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Cancel a run in progress and wait for its final checkpoint."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await asyncio.wait_for(self._finished.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"[AlertCron] run {self.run_id} did not stop within {timeout:.1f}s")
+
+    def status(self) -> Dict:
+        elapsed = time.perf_counter() - self._started if self.running else self._elapsed
+        processed = self._counts["processed"]
+        return {
+            "run_id": self.run_id,
+            "state": self.state,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_secs": round(elapsed, 1),
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "processed_users": processed,
+            "succeeded": self._counts["succeeded"],
+            "failed": self._counts["failed"],
+            "timed_out": self._counts["timed_out"],
+            "alerts_generated": self._counts["alerts"],
+            "alert_batches": self._counts["batches"],
+            "users_per_sec": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+            "avg_user_ms": round(self._user_ms / processed, 1) if processed else 0.0,
+            "resumed_from": self.resumed_from,
+            "cursor": self.cursor,
+            "environment": {
+                **self._env_counts,
+                "lookups": self._env_counts["cities"],
+                "lookups_avoided": self._env_counts["users_with_location"] - self._env_counts["cities"],
+            },
+            "recent_failures": list(self._failures),
+            "error": self.error,
+        }
+
+
+_job: Optional[AlertCronJob] = None
+
+
+def get_alert_cron() -> AlertCronJob:
+    global _job
+    if _job is None:
+        _job = AlertCronJob()
+    return _job
+
+
+async def stop_alert_cron() -> None:
+    if _job is not None:
+        await _job.stop()
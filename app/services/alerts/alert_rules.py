@@ -1,6 +1,7 @@
 import json
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from app.services.alerts.alert_types import (
     Alert,
@@ -165,6 +166,37 @@ def _environmental_alerts(
     return alerts
 
 
+@dataclass(frozen=True)
+class CityEnvironment:
+    """
+    The environmental inputs and alerts for one city, assuming no AC and no
+    filtration — the cron's view of every user there. Built once per city per
+    run by build_city_environment and shared by all its users.
+    """
+    country: Optional[str]
+    temp_c: Optional[float]
+    humidity: Optional[float]
+    dew_point: Optional[float]
+    sweat_level: Optional[str]
+    alerts: Tuple[Alert, ...]
+
+
+def build_city_environment(
+    country: Optional[str],
+    temp_c: Optional[float],
+    humidity: Optional[float],
+) -> CityEnvironment:
+    has_weather = temp_c is not None and humidity is not None
+    return CityEnvironment(
+        country=country,
+        temp_c=temp_c,
+        humidity=humidity,
+        dew_point=calculate_dew_point(temp_c, humidity) if has_weather else None,
+        sweat_level=get_sweat_level(temp_c, humidity) if has_weather else None,
+        alerts=tuple(_environmental_alerts(temp_c, humidity, False, country, False)),
+    )
+
+
 def _days_since(ts_iso: str, current_date: datetime) -> Optional[int]:
     try:
         ts = datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
@@ -268,11 +300,19 @@ def evaluate(
     routine: Optional[Dict] = None,
     user_meta: Optional[Dict] = None,
     current_date: Optional[datetime] = None,
+    environment: Optional[CityEnvironment] = None,
 ) -> List[Alert]:
-    alerts = (
-        _session_signal_alerts(snapshot)
-        + _environmental_alerts(temp_c, humidity, in_ac, country, has_filtration)
-    )
+    """
+    All candidate alerts for one user. A precomputed `environment` replaces
+    temp_c / humidity / in_ac / country / has_filtration.
+    """
+    if environment is not None:
+        humidity = environment.humidity
+        env_alerts = list(environment.alerts)
+    else:
+        env_alerts = _environmental_alerts(temp_c, humidity, in_ac, country, has_filtration)
+
+    alerts = _session_signal_alerts(snapshot) + env_alerts
     if wash_logs is not None or routine is not None or user_meta is not None:
         alerts += _cron_alerts(
             wash_logs=wash_logs or [],
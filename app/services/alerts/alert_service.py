@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from app.services.alerts.alert_rules import evaluate
-from app.services.alerts.alert_state import filter_unsent, log_sent
+from app.services.alerts.alert_rules import CityEnvironment, evaluate
+from app.services.alerts.alert_state import filter_unsent, filter_unsent_many, log_sent, log_sent_many
 from app.services.alerts.alert_types import Alert
 
 
@@ -19,6 +19,7 @@ def process_alerts(
     routine: Optional[Dict] = None,
     user_meta: Optional[Dict] = None,
     current_date: Optional[datetime] = None,
+    environment: Optional[CityEnvironment] = None,
     persist: bool = True,
 ) -> List[Alert]:
     candidates = evaluate(
@@ -32,6 +33,7 @@ def process_alerts(
         routine=routine,
         user_meta=user_meta,
         current_date=current_date,
+        environment=environment,
     )
     new_alerts = filter_unsent(user_id, candidates)
 
@@ -40,3 +42,17 @@ def process_alerts(
             log_sent(user_id, alert)
 
     return new_alerts
+
+
+def process_alerts_many(
+    user_candidates: Dict[str, List[Alert]],
+    persist: bool = True,
+) -> Dict[str, List[Alert]]:
+    """
+    process_alerts' dedup + logging for many users' already-evaluated
+    candidates: one cooldown lookup and one insert for the whole set.
+    """
+    new_alerts = filter_unsent_many(user_candidates)
+    if persist:
+        log_sent_many(new_alerts)
+    return new_alerts
@@ -1,30 +1,227 @@
+"""
+alert_log access: cooldown dedup for new alerts and the banner inbox.
+
+Cooldown checks only need the last send of each candidate alert_type, so
+filter_unsent asks the alert_last_sent RPC (sql/alert_cooldowns.sql) for
+exactly those types — one index probe each — instead of reading the user's
+whole history. Answers, including "never sent", are kept in a write-through
+per-user cache: log_sent records every send in it (cached user or not, and
+ahead of any lookup still in flight), so a user checked again in the same
+chat session or cron pass costs no round trip.
+
+The cache is per process. A send made by another worker (a chat on one, the
+cron on another) is invisible here until the entry expires, so for up to
+ALERT_COOLDOWN_CACHE_TTL_SECS the same alert can go out once more from this
+worker. Keep the TTL short; it only has to cover one chat session's or one
+cron page's repeat checks.
+
+The cron works a page of users at a time: filter_unsent_many resolves every
+cache miss on the page with one alert_last_sent_many call and log_sent_many
+writes all of the page's new alerts in one multi-row insert.
+
+Env:
+  ALERT_COOLDOWN_CACHE_TTL_SECS   default 60
+  ALERT_COOLDOWN_CACHE_MAX_USERS  default 10000
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from app.services.supabase_service import get_supabase
 from app.services.alerts.alert_types import Alert
 
 TABLE = "alert_log"
 
+ALERT_COOLDOWN_CACHE_TTL_SECS  = float(os.getenv("ALERT_COOLDOWN_CACHE_TTL_SECS", "60"))
+ALERT_COOLDOWN_CACHE_MAX_USERS = int(os.getenv("ALERT_COOLDOWN_CACHE_MAX_USERS",  "10000"))
 
-def _latest_sent_at_by_type(user_id: str) -> Dict[str, datetime]:
-    """Most recent sent_at per alert_type for this user. Used by cooldown checks."""
+# user_id -> (loaded_at, {alert_type: last sent_at, or None if never sent})
+_cooldowns: "OrderedDict[str, tuple]" = OrderedDict()
+_cooldowns_lock = threading.Lock()
+_cooldown_stats = {"hits": 0, "misses": 0, "lookups": 0}
+_cooldown_rpc = True       # cleared if sql/alert_cooldowns.sql isn't applied
+_cooldown_many_rpc = True
+
+# Users per alert_log read when alert_last_sent_many is unavailable (URL length)
+_FALLBACK_CHUNK_USERS = 100
+
+# PostgREST's default max-rows: a read that returns this many rows may have
+# been cut short, so what it didn't find can't be taken as "never sent"
+_MAX_ROWS = 1000
+
+
+def _parse_sent_at(raw: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(raw.replace("Z", "+00:00")) if raw else None
+
+
+def _fetch_last_sent(user_id: str, alert_types: List[str]) -> Dict[str, Optional[datetime]]:
+    """One round trip: last sent_at for each of alert_types (None = never sent)."""
+    global _cooldown_rpc
     supabase = get_supabase()
-    response = (
+    _cooldown_stats["lookups"] += 1
+    if _cooldown_rpc:
+        try:
+            response = supabase.rpc("alert_last_sent", {
+                "p_user_id": user_id,
+                "p_alert_types": alert_types,
+            }).execute()
+            latest = {t: None for t in alert_types}
+            for row in response.data or []:
+                latest[row["alert_type"]] = _parse_sent_at(row["last_sent_at"])
+            return latest
+        except Exception as e:
+            if "PGRST202" in str(e) or "Could not find the function" in str(e):
+                _cooldown_rpc = False
+            print(f"[alert_state] alert_last_sent RPC unavailable, reading alert_log: {e}")
+
+    latest = {user_id: {t: None for t in alert_types}}
+    _read_latest_sends(supabase, [user_id], alert_types, latest)
+    return latest[user_id]
+
+
+def _fetch_last_sent_many(wanted_by_user: Dict[str, List[str]]) -> Dict[str, Dict[str, Optional[datetime]]]:
+    """One round trip for many users: user_id -> {alert_type: last sent_at}."""
+    global _cooldown_many_rpc
+    user_ids = list(wanted_by_user)
+    alert_types = sorted({t for types in wanted_by_user.values() for t in types})
+    latest = {user_id: {t: None for t in alert_types} for user_id in user_ids}
+    supabase = get_supabase()
+    _cooldown_stats["lookups"] += 1
+    if _cooldown_many_rpc:
+        try:
+            response = supabase.rpc("alert_last_sent_many", {
+                "p_user_ids": user_ids,
+                "p_alert_types": alert_types,
+            }).execute()
+            for row in response.data or []:
+                for alert_type, sent_at in (row["last_sent"] or {}).items():
+                    latest[row["user_id"]][alert_type] = _parse_sent_at(sent_at)
+            return latest
+        except Exception as e:
+            if "PGRST202" in str(e) or "Could not find the function" in str(e):
+                _cooldown_many_rpc = False
+            print(f"[alert_state] alert_last_sent_many RPC unavailable, reading alert_log: {e}")
+
+    for i in range(0, len(user_ids), _FALLBACK_CHUNK_USERS):
+        _read_latest_sends(supabase, user_ids[i:i + _FALLBACK_CHUNK_USERS], alert_types, latest)
+    return latest
+
+
+def _read_latest_sends(
+    supabase, user_ids: List[str], alert_types: List[str], latest: Dict[str, Dict[str, Optional[datetime]]]
+) -> None:
+    """
+    Fallback without the RPCs: fill `latest` from these users' sends of these
+    types, newest first. Rows are newest first, so whatever the read returns
+    is exact; if it fills the row cap, every (user, type) it didn't reach is
+    probed on its own with a one-row read instead of being taken as unsent.
+    """
+    rows = (
         supabase.table(TABLE)
-        .select("alert_type, sent_at")
-        .eq("user_id", user_id)
+        .select("user_id, alert_type, sent_at")
+        .in_("user_id", user_ids)
+        .in_("alert_type", alert_types)
         .order("sent_at", desc=True)
+        .limit(_MAX_ROWS)
         .execute()
-    )
-    latest: Dict[str, datetime] = {}
-    for row in (response.data or []):
-        alert_type = row["alert_type"]
-        if alert_type in latest:
-            continue
-        sent_at_raw = row["sent_at"]
-        latest[alert_type] = datetime.fromisoformat(sent_at_raw.replace("Z", "+00:00"))
-    return latest
+    ).data or []
+    for row in rows:
+        if latest[row["user_id"]].get(row["alert_type"]) is None:
+            latest[row["user_id"]][row["alert_type"]] = _parse_sent_at(row["sent_at"])
+    if len(rows) < _MAX_ROWS:
+        return
+
+    unresolved = [(u, t) for u in user_ids for t in alert_types if latest[u].get(t) is None]
+    print(f"[alert_state] alert_log read hit the {_MAX_ROWS}-row cap; probing {len(unresolved)} user/type pairs")
+    for user_id, alert_type in unresolved:
+        probe = (
+            supabase.table(TABLE)
+            .select("sent_at")
+            .eq("user_id", user_id)
+            .eq("alert_type", alert_type)
+            .order("sent_at", desc=True)
+            .limit(1)
+            .execute()
+        ).data or []
+        if probe:
+            latest[user_id][alert_type] = _parse_sent_at(probe[0]["sent_at"])
+
+
+def _cached_cooldowns(user_id: str, wanted: List[str]) -> Tuple[Dict[str, Optional[datetime]], List[str]]:
+    """(what the cache knows for this user, which of `wanted` it doesn't)."""
+    now = time.monotonic()
+    with _cooldowns_lock:
+        entry = _cooldowns.get(user_id)
+        if entry is not None and now - entry[0] > ALERT_COOLDOWN_CACHE_TTL_SECS:
+            del _cooldowns[user_id]
+            entry = None
+        known = dict(entry[1]) if entry is not None else {}
+        if entry is not None:
+            _cooldowns.move_to_end(user_id)
+
+    return known, [t for t in wanted if t not in known]
+
+
+def _newer(a: Optional[datetime], b: Optional[datetime]) -> Optional[datetime]:
+    return b if a is None or (b is not None and b > a) else a
+
+
+def _store_cooldowns(user_id: str, fetched: Dict[str, Optional[datetime]]) -> Dict[str, Optional[datetime]]:
+    """Merge fetched answers into the cache; returns everything known for the user."""
+    with _cooldowns_lock:
+        loaded_at, cached = _cooldowns.get(user_id, (time.monotonic(), {}))
+        for alert_type, sent_at in fetched.items():
+            # A log_sent that landed while this lookup was in flight is newer
+            # than the lookup's answer — never let "never sent" overwrite it
+            cached[alert_type] = _newer(cached.get(alert_type), sent_at)
+        _cooldowns[user_id] = (loaded_at, cached)
+        _cooldowns.move_to_end(user_id)
+        while len(_cooldowns) > ALERT_COOLDOWN_CACHE_MAX_USERS:
+            _cooldowns.popitem(last=False)
+        return dict(cached)
+
+
+def _latest_sent_at_by_type(user_id: str, alert_types: Iterable[str]) -> Dict[str, Optional[datetime]]:
+    """Most recent sent_at per alert_type for this user. Used by cooldown checks."""
+    known, missing = _cached_cooldowns(user_id, list(dict.fromkeys(alert_types)))
+    if not missing:
+        _cooldown_stats["hits"] += 1
+        return known
+    _cooldown_stats["misses"] += 1
+    return _store_cooldowns(user_id, _fetch_last_sent(user_id, missing))
+
+
+def _remember_sent(user_id: str, alert_type: str, sent_at: datetime) -> None:
+    """
+    Write-through from log_sent. Uncached users get an entry too, holding just
+    this type: a lookup for the user that is already in flight then merges
+    into it instead of caching its older "never sent".
+    """
+    with _cooldowns_lock:
+        entry = _cooldowns.get(user_id)
+        if entry is None:
+            _cooldowns[user_id] = (time.monotonic(), {alert_type: sent_at})
+            while len(_cooldowns) > ALERT_COOLDOWN_CACHE_MAX_USERS:
+                _cooldowns.popitem(last=False)
+        else:
+            entry[1][alert_type] = _newer(entry[1].get(alert_type), sent_at)
+
+
+def clear_cooldown_cache() -> None:
+    with _cooldowns_lock:
+        _cooldowns.clear()
+
+
+def alert_cooldown_stats() -> Dict:
+    return {
+        "users_cached": len(_cooldowns),
+        "rpc": _cooldown_rpc,
+        "many_rpc": _cooldown_many_rpc,
+        **_cooldown_stats,
+    }
 
 
 def _is_on_cooldown(last_sent: Optional[datetime], cooldown_days: Optional[int]) -> bool:
@@ -37,16 +234,45 @@ def _is_on_cooldown(last_sent: Optional[datetime], cooldown_days: Optional[int])
 
 def filter_unsent(user_id: str, alerts: List[Alert]) -> List[Alert]:
     """Drop alerts whose cooldown window hasn't elapsed since the last send."""
-    latest = _latest_sent_at_by_type(user_id)
+    if not alerts:
+        return []
+    latest = _latest_sent_at_by_type(user_id, (a.alert_type for a in alerts))
     return [
         a for a in alerts
         if not _is_on_cooldown(latest.get(a.alert_type), a.cooldown_days)
     ]
 
 
-def log_sent(user_id: str, alert: Alert) -> None:
-    supabase = get_supabase()
-    supabase.table(TABLE).insert({
+def filter_unsent_many(user_alerts: Dict[str, List[Alert]]) -> Dict[str, List[Alert]]:
+    """filter_unsent for many users, with one lookup for every cache miss among them."""
+    latest_by_user: Dict[str, Dict[str, Optional[datetime]]] = {}
+    missing_by_user: Dict[str, List[str]] = {}
+    for user_id, alerts in user_alerts.items():
+        if not alerts:
+            continue
+        known, missing = _cached_cooldowns(user_id, list(dict.fromkeys(a.alert_type for a in alerts)))
+        latest_by_user[user_id] = known
+        if missing:
+            missing_by_user[user_id] = missing
+            _cooldown_stats["misses"] += 1
+        else:
+            _cooldown_stats["hits"] += 1
+
+    if missing_by_user:
+        for user_id, fetched in _fetch_last_sent_many(missing_by_user).items():
+            latest_by_user[user_id] = _store_cooldowns(user_id, fetched)
+
+    return {
+        user_id: [
+            a for a in alerts
+            if not _is_on_cooldown(latest_by_user.get(user_id, {}).get(a.alert_type), a.cooldown_days)
+        ]
+        for user_id, alerts in user_alerts.items()
+    }
+
+
+def _alert_row(user_id: str, alert: Alert, sent_at: datetime) -> Dict:
+    return {
         "user_id": user_id,
         "source_type": alert.source_type,
         "source_id": alert.source_id,
@@ -54,8 +280,28 @@ def log_sent(user_id: str, alert: Alert) -> None:
         "scenario": alert.scenario or alert.alert_type,
         "prompt": alert.message,
         "is_read": False,
-        "sent_at": datetime.now(timezone.utc).isoformat(),
-    }).execute()
+        "sent_at": sent_at.isoformat(),
+    }
+
+
+def log_sent(user_id: str, alert: Alert) -> None:
+    supabase = get_supabase()
+    sent_at = datetime.now(timezone.utc)
+    supabase.table(TABLE).insert(_alert_row(user_id, alert, sent_at)).execute()
+    _remember_sent(user_id, alert.alert_type, sent_at)
+
+
+def log_sent_many(user_alerts: Dict[str, List[Alert]]) -> int:
+    """Record every alert in one multi-row insert. Returns the number of rows written."""
+    sent_at = datetime.now(timezone.utc)
+    rows = [_alert_row(user_id, alert, sent_at) for user_id, alerts in user_alerts.items() for alert in alerts]
+    if not rows:
+        return 0
+    get_supabase().table(TABLE).insert(rows).execute()
+    for user_id, alerts in user_alerts.items():
+        for alert in alerts:
+            _remember_sent(user_id, alert.alert_type, sent_at)
+    return len(rows)
 
 
 def get_unread_alerts(user_id: str, limit: int = 3) -> List[Dict]:
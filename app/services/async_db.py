@@ -0,0 +1,134 @@
+"""
+Async access to the Supabase-backed services.
+
+supabase-py's client is synchronous: every .execute() holds the calling
+thread for the whole HTTP round trip. Called straight from an async endpoint
+that thread is the event loop, so one slow query stalls every other request
+and SSE stream in the process. run_db() moves the call onto a bounded
+thread pool and gives the awaiting caller a deadline:
+
+    states = await run_db(get_session_decision_states, session_id)
+
+AsyncService wraps a service object such as DatabaseService with the same
+method names, each returning an awaitable (async methods pass straight
+through):
+
+    db = get_async_db()
+    routine = await db.get_active_routine(user_id)
+
+Every pool thread shares the one supabase client and its keep-alive
+connection pool, whose HTTP timeout is SUPABASE_HTTP_TIMEOUT_SECS (see
+supabase_service). A call that outlives DB_CALL_TIMEOUT_SECS raises
+DBTimeoutError in the caller; its thread finishes in the background, bounded
+by that HTTP timeout, so a stuck query can't pin a pool slot for long.
+
+Env:
+  DB_POOL_SIZE          threads running DB calls          (default 16)
+  DB_CALL_TIMEOUT_SECS  per-call deadline for the caller  (default 10)
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DB_POOL_SIZE         = int(os.getenv("DB_POOL_SIZE",           "16"))
+DB_CALL_TIMEOUT_SECS = float(os.getenv("DB_CALL_TIMEOUT_SECS", "10"))
+
+_USE_DEFAULT = object()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_stats = {"calls": 0, "timeouts": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0, "total_ms": 0.0}
+
+
+class DBTimeoutError(TimeoutError):
+    """A DB call didn't finish within its deadline."""
+
+    def __init__(self, label: str, timeout: float):
+        self.label = label
+        self.timeout = timeout
+        super().__init__(f"{label} did not complete within {timeout:.1f}s")
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+    return _executor
+
+
+async def run_db(fn: Callable[..., T], *args, timeout: Any = _USE_DEFAULT, **kwargs) -> T:
+    """
+    Run a blocking DB call on the pool. `timeout=None` waits indefinitely —
+    for writers that must know whether the insert landed.
+    """
+    if timeout is _USE_DEFAULT:
+        timeout = DB_CALL_TIMEOUT_SECS
+    label = getattr(fn, "__qualname__", repr(fn))
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+    _stats["calls"] += 1
+    _stats["in_flight"] += 1
+    _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        print(f"[DB] {label} timed out after {timeout:.1f}s")
+        raise DBTimeoutError(label, timeout)
+    except Exception:
+        _stats["errors"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+        _stats["total_ms"] += (time.perf_counter() - started) * 1000
+
+
+class AsyncService:
+    """Awaitable view of a sync service: same method names, run on the DB pool."""
+
+    def __init__(self, service: Any, timeout: Any = _USE_DEFAULT):
+        self.sync = service
+        self._timeout = timeout
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync, name)
+        if not callable(attr) or asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await run_db(attr, *args, timeout=self._timeout, **kwargs)
+
+        call.__name__ = name
+        return call
+
+
+def get_async_db() -> AsyncService:
+    from app.services.db_service import get_db
+    return AsyncService(get_db())
+
+
+def db_pool_stats() -> Dict:
+    calls = _stats["calls"]
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "calls": calls,
+        "timeouts": _stats["timeouts"],
+        "errors": _stats["errors"],
+        "in_flight": _stats["in_flight"],
+        "max_in_flight": _stats["max_in_flight"],
+        "avg_ms": round(_stats["total_ms"] / calls, 1) if calls else 0.0,
+    }
+
+
+def close_db_pool() -> None:
+    """Stop accepting DB calls; threads still running finish in the background."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,405 @@
+"""
+Write-behind persistence for chat_messages.
+
+The chat endpoints keep live history in the session store, so a turn never
+waits on Supabase. Transcripts still need to land in chat_messages, though,
+and one synchronous insert per message would put DB latency back on every
+turn. A ChatMessageWriter acknowledges immediately and writes in the
+background:
+
+    await get_chat_writer().submit(session_id, "user", text, user_id=user_id)
+
+  - rows are flushed as one multi-row insert once CHAT_WRITE_BATCH_SIZE rows
+    are queued or CHAT_WRITE_FLUSH_SECS after the oldest one, whichever is first
+  - a single flusher writes batches in submission order, and every row carries
+    the created_at of its submission, so a session's messages read back in
+    the order they were said even if a batch is retried
+  - the queue is bounded: submit() waits for room (backpressure) for up to
+    CHAT_WRITE_ENQUEUE_TIMEOUT_SECS, then spools the row instead of dropping it
+  - a batch that still fails after CHAT_WRITE_MAX_ATTEMPTS goes to a JSONL
+    spool file, replayed at startup and after the next successful flush
+    (created_at keeps replayed rows in their original place in the session)
+  - close() drains the queue on shutdown; whatever can't be written in time
+    is spooled
+  - forget_session() drops everything still pending for a session (queued,
+    batching or spooled) before its transcript is deleted
+
+Env:
+  CHAT_WRITE_BEHIND               false writes each message inline   (default true)
+  CHAT_WRITE_BATCH_SIZE           rows per insert                    (default 50)
+  CHAT_WRITE_FLUSH_SECS           max time a row waits to be flushed (default 0.5)
+  CHAT_WRITE_MAX_QUEUE            queued rows before submit() waits  (default 5000)
+  CHAT_WRITE_ENQUEUE_TIMEOUT_SECS wait for queue room before spooling (default 1)
+  CHAT_WRITE_MAX_ATTEMPTS         insert attempts per batch          (default 3)
+  CHAT_WRITE_DRAIN_SECS           shutdown drain budget              (default 10)
+  CHAT_WRITE_SPOOL_PATH           retry spool (default <tmp>/concierge_chat_spool.jsonl)
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from app.services.async_db import run_db
+
+CHAT_WRITE_BEHIND               = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"
+CHAT_WRITE_BATCH_SIZE           = int(os.getenv("CHAT_WRITE_BATCH_SIZE",             "50"))
+CHAT_WRITE_FLUSH_SECS           = float(os.getenv("CHAT_WRITE_FLUSH_SECS",           "0.5"))
+CHAT_WRITE_MAX_QUEUE            = int(os.getenv("CHAT_WRITE_MAX_QUEUE",              "5000"))
+CHAT_WRITE_ENQUEUE_TIMEOUT_SECS = float(os.getenv("CHAT_WRITE_ENQUEUE_TIMEOUT_SECS", "1"))
+CHAT_WRITE_MAX_ATTEMPTS         = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS",           "3"))
+CHAT_WRITE_DRAIN_SECS           = float(os.getenv("CHAT_WRITE_DRAIN_SECS",           "10"))
+CHAT_WRITE_SPOOL_PATH           = os.getenv(
+    "CHAT_WRITE_SPOOL_PATH", os.path.join(tempfile.gettempdir(), "concierge_chat_spool.jsonl")
+)
+
+_RETRY_BASE_SECS = 0.2
+# How long a forgotten session's cutoff is kept. Rows submitted before it can
+# only surface later from the backpressure wait or a spool replay.
+_FORGET_TTL_SECS = 600
+
+
+def chat_message_row(session_id: str, role: str, message: str, user_id: str = None) -> Dict:
+    """A chat_messages row, stamped now so batched inserts keep conversation order."""
+    row = {
+        "session_id": session_id,
+        "role": role,
+        "content": message,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if user_id:
+        row["user_id"] = user_id
+    return row
+
+
+class ChatMessageWriter:
+    def __init__(
+        self,
+        insert_rows: Callable[[List[Dict]], None],
+        batch_size: int = CHAT_WRITE_BATCH_SIZE,
+        flush_secs: float = CHAT_WRITE_FLUSH_SECS,
+        max_queue: int = CHAT_WRITE_MAX_QUEUE,
+        enqueue_timeout: float = CHAT_WRITE_ENQUEUE_TIMEOUT_SECS,
+        max_attempts: int = CHAT_WRITE_MAX_ATTEMPTS,
+        spool_path: str = CHAT_WRITE_SPOOL_PATH,
+    ):
+        self.insert_rows = insert_rows   # blocking multi-row insert, run on the DB pool
+        self.batch_size = batch_size
+        self.flush_secs = flush_secs
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.spool_path = spool_path
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._in_flight: List[Dict] = []
+        self._write_lock = asyncio.Lock()   # held while a batch is being inserted
+        self._drain_started: Optional[asyncio.Future] = None
+        self._closing = False
+        self._forgotten: Dict[str, tuple] = {}   # session_id -> (created_at cutoff, monotonic time)
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.discarded = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_queue)
+            self._drain_started = self._drain_started or asyncio.get_running_loop().create_future()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def submit(self, session_id: str, role: str, message: str, user_id: str = None) -> None:
+        """Queue a message for persistence. Returns as soon as it's queued (or spooled)."""
+        await self.submit_row(chat_message_row(session_id, role, message, user_id))
+
+    async def submit_row(self, row: Dict) -> None:
+        self.submitted += 1
+        if self._closing:
+            self._spool([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+        try:
+            await asyncio.wait_for(self._queue.put(row), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            print(f"[ChatWriter] Queue full ({self.max_queue} rows), spooling message for session {row['session_id']}")
+            self._spool([row])
+
+    def discard(self, session_id: str) -> int:
+        """Drop queued rows for a session whose transcript is being deleted."""
+        if self._queue is None or self._queue.empty():
+            return 0
+        kept, removed = [], 0
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row["session_id"] == session_id:
+                removed += 1
+            else:
+                kept.append(row)
+        for _ in range(len(kept) + removed):
+            self._queue.task_done()
+        for row in kept:
+            self._queue.put_nowait(row)
+        self.discarded += removed
+        return removed
+
+    async def forget_session(self, session_id: str) -> int:
+        """
+        Drop every row submitted so far for a session — queued, in a batch
+        still being collected, or spooled — and wait out any insert already
+        running, so a delete issued afterwards can't be overtaken by the writer.
+        """
+        now = time.monotonic()
+        self._forgotten = {
+            sid: entry for sid, entry in self._forgotten.items() if now - entry[1] < _FORGET_TTL_SECS
+        }
+        self._forgotten[session_id] = (datetime.now(timezone.utc).isoformat(), now)
+        removed = self.discard(session_id) + self._discard_spooled(session_id)
+        if self._write_lock.locked():
+            async with self._write_lock:
+                pass
+        return removed
+
+    def _is_forgotten(self, row: Dict) -> bool:
+        entry = self._forgotten.get(row["session_id"])
+        return entry is not None and row.get("created_at", "") <= entry[0]
+
+    def _drop_forgotten(self, rows: List[Dict]) -> List[Dict]:
+        if not self._forgotten:
+            return rows
+        kept = [row for row in rows if not self._is_forgotten(row)]
+        self.discarded += len(rows) - len(kept)
+        return kept
+
+    # ------------------------------------------------------------------
+    # Flusher
+    # ------------------------------------------------------------------
+
+    async def _next_batch(self) -> List[Dict]:
+        """Wait for the first row, then collect until the batch is full or flush_secs pass."""
+        batch = self._in_flight  # filled in place so close() sees rows taken off the queue
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_secs
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closing:
+                break
+            # Wake on the next row, the flush deadline, or close() starting a drain
+            getter = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait({getter, self._drain_started}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                batch.append(getter.result())
+            else:
+                getter.cancel()
+        return batch
+
+    async def _run(self) -> None:
+        await self._replay_spool()
+        while True:
+            batch = await self._next_batch()
+            taken = len(batch)
+            async with self._write_lock:
+                # A session forgotten while this batch was being collected
+                batch[:] = self._drop_forgotten(batch)
+                written = await self._write(batch) if batch else True
+            if not written:
+                self._spool(batch)
+            self._in_flight = []
+            for _ in range(taken):
+                self._queue.task_done()
+            if written and not self._closing:
+                await self._replay_spool()
+
+    async def _write(self, batch: List[Dict]) -> bool:
+        for attempt in range(self.max_attempts):
+            try:
+                # No deadline: a timed-out insert may still land, and retrying it would duplicate rows
+                await run_db(self.insert_rows, batch, timeout=None)
+                self.written += len(batch)
+                self.batches += 1
+                return True
+            except Exception as e:
+                print(f"[ChatWriter] Insert of {len(batch)} rows failed (attempt {attempt + 1}/{self.max_attempts}): {e}")
+                if attempt + 1 < self.max_attempts:
+                    self.retries += 1
+                    await asyncio.sleep(_RETRY_BASE_SECS * (2 ** attempt))
+        return False
+
+    # ------------------------------------------------------------------
+    # Spool
+    # ------------------------------------------------------------------
+
+    def _spool(self, rows: List[Dict]) -> None:
+        rows = self._drop_forgotten(rows)
+        if not rows:
+            return
+        if self._append_spool(rows):
+            self.spooled += len(rows)
+        else:
+            self.dropped += len(rows)
+
+    def _append_spool(self, rows: List[Dict]) -> bool:
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+            return True
+        except OSError as e:
+            print(f"[ChatWriter ERROR] Could not spool {len(rows)} rows, dropping them: {e}")
+            return False
+
+    def _discard_spooled(self, session_id: str) -> int:
+        rows = self._take_spool()
+        if not rows:
+            return 0
+        kept = [row for row in rows if row["session_id"] != session_id]
+        if kept and not self._append_spool(kept):
+            self.dropped += len(kept)
+        removed = len(rows) - len(kept)
+        self.discarded += removed
+        return removed
+
+    def _take_spool(self) -> List[Dict]:
+        if not os.path.exists(self.spool_path):
+            return []
+        claimed = f"{self.spool_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spool_path, claimed)  # another worker may be appending
+            with open(claimed, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            os.remove(claimed)
+            return rows
+        except (OSError, ValueError) as e:
+            print(f"[ChatWriter ERROR] Could not read spool {self.spool_path}: {e}")
+            return []
+
+    async def _replay_spool(self) -> None:
+        rows = self._take_spool()
+        if not rows:
+            return
+        print(f"[ChatWriter] Replaying {len(rows)} spooled rows")
+        start = 0
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                async with self._write_lock:
+                    batch = self._drop_forgotten(rows[start:start + self.batch_size])
+                    if not batch or await self._write(batch):
+                        self.replayed += len(batch)
+                        continue
+                    # Isolate rows the table will never accept so they don't block the rest
+                    for offset, row in enumerate(batch):
+                        try:
+                            await run_db(self.insert_rows, [row], timeout=None)
+                            self.written += 1
+                            self.replayed += 1
+                        except Exception as e:
+                            if not _is_rejected(e):
+                                self._spool(batch[offset:] + rows[start + self.batch_size:])
+                                return
+                            self.dropped += 1
+                            print(f"[ChatWriter ERROR] Dropping row rejected by the database: {e}")
+        except asyncio.CancelledError:
+            self._spool(rows[start:])
+            raise
+
+    # ------------------------------------------------------------------
+    # Shutdown
+    # ------------------------------------------------------------------
+
+    async def close(self, timeout: float = CHAT_WRITE_DRAIN_SECS) -> None:
+        """Flush everything queued; spool what can't be written within `timeout`."""
+        self._closing = True
+        if self._flusher is None:
+            return
+        if not self._drain_started.done():
+            self._drain_started.set_result(None)
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"[ChatWriter] Drain timed out after {timeout:.0f}s, spooling the rest")
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+
+        leftover = list(self._in_flight)
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        if leftover:
+            self._spool(leftover)
+        print(f"[ChatWriter] Drained: {self.written} rows written, {self.spooled} spooled")
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "discarded": self.discarded,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+def _is_rejected(exc: BaseException) -> bool:
+    """A constraint / validation error — retrying the same row won't help."""
+    code = str(getattr(exc, "code", "") or "")
+    return code.startswith(("22", "23")) or "violates" in str(exc)
+
+
+_writer: Optional[ChatMessageWriter] = None
+
+
+def get_chat_writer() -> ChatMessageWriter:
+    global _writer
+    if _writer is None:
+        from app.services.db_service import get_db
+        _writer = ChatMessageWriter(get_db().append_chat_messages)
+    return _writer
+
+
+async def persist_chat_message(session_id: str, role: str, message: str, user_id: str = None) -> None:
+    """Persist a chat message — queued when write-behind is on, inline otherwise."""
+    if CHAT_WRITE_BEHIND:
+        await get_chat_writer().submit(session_id, role, message, user_id=user_id)
+    else:
+        from app.services.db_service import get_db
+        await run_db(get_db().append_chat_message, session_id, role, message, user_id)
+
+
+async def forget_pending_messages(session_id: str) -> int:
+    """Call before deleting a session's chat_messages rows."""
+    return await _writer.forget_session(session_id) if _writer is not None else 0
+
+
+async def close_chat_writer() -> None:
+    if _writer is not None:
+        await _writer.close()
+
+
+def chat_writer_stats() -> Dict:
+    return _writer.stats() if _writer is not None else {}
@@ -3,16 +3,83 @@ Database Service for Empath Diagnostic Engine
 Provides Supabase-backed storage for chat sessions and hair events
 """
 
-from typing import List, Dict, Optional
-from app.api.models import HairEvent
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from uuid import UUID
+from app.api.models import HairEvent, VitalsPayload
 from app.services.supabase_service import get_supabase
 
+EVENTS_PAGE_SIZE     = int(os.getenv("EVENTS_PAGE_SIZE",     "50"))
+EVENTS_MAX_PAGE_SIZE = int(os.getenv("EVENTS_MAX_PAGE_SIZE", "200"))
+USERS_PAGE_SIZE      = int(os.getenv("USERS_PAGE_SIZE",      "500"))
+USERS_MAX_PAGE_SIZE  = 1000  # PostgREST's default max-rows
+
+# What the daily cron needs per user (alert_rules reads primary_goal)
+CRON_USER_COLUMNS = "user_id, location, primary_goal"
+
+# Columns a HairEvent is rebuilt from — never select("*") on hair_events
+HAIR_EVENT_COLUMNS = "id, user_id, primary_label, summary, vital_score, metadata, created_at"
+
+
+def encode_event_cursor(row: Dict) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a hair_events row."""
+    raw = json.dumps([row["created_at"], str(row["id"])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_event_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Inverse of encode_event_cursor. Raises ValueError on a malformed cursor.
+
+    The values end up inside a PostgREST or_() filter, so they are parsed and
+    re-serialised (an ISO timestamp, an integer or UUID id) rather than
+    trusted — a crafted cursor can't add filter clauses.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, event_id = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = datetime.fromisoformat(str(created_at).replace("Z", "+00:00")).isoformat()
+        event_id = str(event_id)
+        event_id = str(int(event_id)) if event_id.isdigit() else str(UUID(event_id))
+        return created_at, event_id
+    except Exception as e:
+        raise ValueError(f"Invalid events cursor: {cursor!r}") from e
+
+
+def _row_to_event(row: Dict) -> HairEvent:
+    """Rebuild a HairEvent from a hair_events row (HAIR_EVENT_COLUMNS)."""
+    # Reconstruct VitalsPayload from vital_score and primary_label
+    vitals = VitalsPayload()
+    if row["primary_label"] and row["vital_score"]:
+        setattr(vitals, row["primary_label"].lower(), row["vital_score"])
+    
+    # Extract metadata fields
+    metadata = row.get("metadata") or {}
+    
+    return HairEvent(
+        id=str(row["id"]),
+        user_id=row["user_id"],
+        session_id=metadata.get("session_id", ""),
+        wash_day_number=metadata.get("wash_day_number"),
+        day_in_cycle=metadata.get("day_in_cycle"),
+        vitals_payload=vitals,
+        conversation_summary=row["summary"] or "",
+        keywords=metadata.get("keywords", []),
+        created_at=row["created_at"]
+    )
+
+
 class DatabaseService:
     """
     Supabase-backed database service for persistent storage.
     Replaces in-memory storage with production-ready Supabase tables.
     """
     
+    _recommendation_set_columns = True  # cleared if sql/recommendation_sets.sql isn't applied
+
     def __init__(self):
         self.supabase = get_supabase()
         print("[DB] DatabaseService initialized with Supabase backend")
@@ -80,6 +147,24 @@ class DatabaseService:
         except Exception as e:
             print(f"[DB ERROR] Failed to save message: {str(e)}")
             raise e
+
+    def append_chat_messages(self, rows: List[Dict]) -> None:
+        """
+        Insert several chat_messages rows in one round trip.
+        Used by the write-behind ChatMessageWriter; rows carry their own created_at.
+        
+        Args:
+            rows: chat_messages rows (session_id, role, content, created_at, optional user_id)
+        """
+        if not rows:
+            return
+        try:
+            self.supabase.table("chat_messages").insert(rows).execute()
+            print(f"[DB] Saved {len(rows)} chat messages in one batch")
+            
+        except Exception as e:
+            print(f"[DB ERROR] Failed to save {len(rows)} chat messages: {str(e)}")
+            raise e
     
     def save_hair_event(self, event: HairEvent) -> HairEvent:
         """
@@ -147,54 +232,82 @@ class DatabaseService:
             print(f"[DB ERROR] Failed to delete chat session: {str(e)}")
             # Don't raise - this is a cleanup operation, not critical
     
-    def get_events_by_user(self, user_id: str) -> List[HairEvent]:
+    def get_events_by_user(self, user_id: str, limit: int = None, cursor: str = None) -> List[HairEvent]:
+        """
+        Retrieve one page of a user's events, newest first.
+        
+        Args:
+            user_id: The user identifier
+            limit: Page size (default EVENTS_PAGE_SIZE, capped at EVENTS_MAX_PAGE_SIZE)
+            cursor: next_cursor from a previous page, to continue after it
+            
+        Returns:
+            List of HairEvents for this user (see get_events_page for the cursor)
         """
-        Retrieve all events for a specific user.
+        events, _ = self.get_events_page(user_id, limit=limit, cursor=cursor)
+        return events
+    
+    def get_events_page(
+        self,
+        user_id: str,
+        limit: int = None,
+        cursor: str = None,
+        columns: str = HAIR_EVENT_COLUMNS,
+        as_models: bool = True,
+        raise_errors: bool = False,
+    ) -> Tuple[List, Optional[str]]:
+        """
+        Keyset-paginated read of hair_events on (user_id, created_at DESC, id DESC).
+        Cost scales with the page size, not with how many events the user has.
         
         Args:
             user_id: The user identifier
+            limit: Page size (default EVENTS_PAGE_SIZE, capped at EVENTS_MAX_PAGE_SIZE)
+            cursor: next_cursor from a previous page
+            columns: Projection; must include created_at and id for the cursor
+            as_models: Build HairEvents (needs HAIR_EVENT_COLUMNS), or return raw rows
+            raise_errors: Raise DB errors instead of returning an empty page — for
+                callers that would misread a failed read as "no events"
             
         Returns:
-            List of HairEvents for this user
+            (events, next_cursor) — next_cursor is None on the last page
         """
+        limit = max(1, min(limit or EVENTS_PAGE_SIZE, EVENTS_MAX_PAGE_SIZE))
         try:
-            response = self.supabase.table("hair_events") \
-                .select("*") \
-                .eq("user_id", user_id) \
+            query = self.supabase.table("hair_events") \
+                .select(columns) \
+                .eq("user_id", user_id)
+            
+            if cursor:
+                created_at, event_id = decode_event_cursor(cursor)
+                # Rows strictly after the cursor in (created_at DESC, id DESC) order
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{event_id})'
+                )
+            
+            # One extra row tells us whether there is another page
+            response = query \
                 .order("created_at", desc=True) \
+                .order("id", desc=True) \
+                .limit(limit + 1) \
                 .execute()
             
-            # Convert Supabase rows back to HairEvent objects
-            events = []
-            for row in response.data:
-                # Reconstruct VitalsPayload from vital_score and primary_label
-                from app.api.models import VitalsPayload
-                vitals = VitalsPayload()
-                if row["primary_label"] and row["vital_score"]:
-                    setattr(vitals, row["primary_label"].lower(), row["vital_score"])
-                
-                # Extract metadata fields
-                metadata = row.get("metadata", {})
-                
-                event = HairEvent(
-                    id=str(row["id"]),
-                    user_id=row["user_id"],
-                    session_id=metadata.get("session_id", ""),
-                    wash_day_number=metadata.get("wash_day_number"),
-                    day_in_cycle=metadata.get("day_in_cycle"),
-                    vitals_payload=vitals,
-                    conversation_summary=row["summary"] or "",
-                    keywords=metadata.get("keywords", []),
-                    created_at=row["created_at"]
-                )
-                events.append(event)
+            rows = response.data or []
+            next_cursor = encode_event_cursor(rows[limit - 1]) if len(rows) > limit else None
+            rows = rows[:limit]
             
-            print(f"[DB] Retrieved {len(events)} events for user {user_id}")
-            return events
+            events = [_row_to_event(row) for row in rows] if as_models else rows
+            print(f"[DB] Retrieved {len(events)} events for user {user_id}" + (" (more available)" if next_cursor else ""))
+            return events, next_cursor
             
+        except ValueError:
+            raise
         except Exception as e:
             print(f"[DB ERROR] Failed to retrieve events: {str(e)}")
-            return []
+            if raise_errors:
+                raise
+            return [], None
     
     def get_event_by_id(self, event_id: str) -> Optional[HairEvent]:
         """
@@ -208,7 +321,7 @@ class DatabaseService:
         """
         try:
             response = self.supabase.table("hair_events") \
-                .select("*") \
+                .select(HAIR_EVENT_COLUMNS) \
                 .eq("id", event_id) \
                 .single() \
                 .execute()
@@ -216,27 +329,7 @@ class DatabaseService:
             if not response.data:
                 return None
             
-            row = response.data
-            from app.api.models import VitalsPayload
-            vitals = VitalsPayload()
-            if row["primary_label"] and row["vital_score"]:
-                setattr(vitals, row["primary_label"].lower(), row["vital_score"])
-            
-            metadata = row.get("metadata", {})
-            
-            event = HairEvent(
-                id=str(row["id"]),
-                user_id=row["user_id"],
-                session_id=metadata.get("session_id", ""),
-                wash_day_number=metadata.get("wash_day_number"),
-                day_in_cycle=metadata.get("day_in_cycle"),
-                vitals_payload=vitals,
-                conversation_summary=row["summary"] or "",
-                keywords=metadata.get("keywords", []),
-                created_at=row["created_at"]
-            )
-            
-            return event
+            return _row_to_event(response.data)
             
         except Exception as e:
             print(f"[DB ERROR] Failed to retrieve event: {str(e)}")
@@ -327,6 +420,37 @@ class DatabaseService:
             print(f"[DB ERROR] Failed to retrieve users: {str(e)}")
             return []
 
+    def get_users_page(
+        self,
+        limit: int = None,
+        after_user_id: str = None,
+        columns: str = CRON_USER_COLUMNS,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Keyset-paginated read of user_metadata ordered by user_id.
+        
+        Unlike the other reads this raises on failure: a swallowed error would
+        look like the end of the table and end a cron run early.
+        
+        Args:
+            limit: Page size (default USERS_PAGE_SIZE, capped at USERS_MAX_PAGE_SIZE)
+            after_user_id: Return users strictly after this id (a previous next_cursor)
+            columns: Projection; must include user_id for the cursor
+            
+        Returns:
+            (users, next_cursor) — next_cursor is None on the last page
+        """
+        limit = max(1, min(limit or USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE))
+        query = self.supabase.table("user_metadata").select(columns)
+        if after_user_id:
+            query = query.gt("user_id", after_user_id)
+        
+        # One extra row tells us whether there is another page
+        response = query.order("user_id").limit(limit + 1).execute()
+        rows = response.data or []
+        next_cursor = rows[limit - 1]["user_id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
     def get_user_metadata(self, user_id: str) -> Optional[Dict]:
         """Fetch a single user's metadata row (location, goals, etc.)."""
         try:
@@ -438,6 +562,7 @@ class DatabaseService:
     def get_pending_recommendations(self, user_id: str) -> List[Dict]:
         """
         Fetch pending (not yet accepted/dismissed) recommendations for a user.
+        Served by idx_recommendations_user_pending (sql/recommendation_sets.sql).
 
         Args:
             user_id: The user identifier
@@ -490,6 +615,82 @@ class DatabaseService:
             print(f"[DB ERROR] Failed to save recommendation: {str(e)}")
             return False
 
+    def save_recommendation_set(self, user_id: str, recommendations: List[Dict], generated_by: str) -> Optional[str]:
+        """
+        Save a freshly generated set in one insert and supersede the user's
+        older pending recommendations, so reads only ever see the newest set.
+
+        Args:
+            user_id: The user identifier
+            recommendations: Recommendation dicts from generate_recommendations
+            generated_by: What triggered the set (cron | hair_event | read_miss)
+
+        Returns:
+            The set's generated_at (ISO), or None if nothing was saved
+        """
+        from datetime import datetime, timezone
+        from uuid import uuid4
+
+        if not recommendations:
+            return None
+        generated_at = datetime.now(timezone.utc).isoformat()
+        set_id = str(uuid4())
+        rows = [
+            {
+                "user_id": user_id,
+                "title": rec.get("title"),
+                "message": rec.get("message"),
+                "reasoning": rec.get("reasoning"),
+                "routine_step_ref": rec.get("routine_step_ref"),
+                "recommendation_type": rec.get("recommendation_type"),
+                "status": "pending",
+                "created_at": generated_at,
+            }
+            for rec in recommendations
+        ]
+        set_columns = {"set_id": set_id, "generated_at": generated_at, "generated_by": generated_by}
+
+        try:
+            table = self.supabase.table("routine_recommendations")
+            if self._recommendation_set_columns:
+                try:
+                    table.insert([{**row, **set_columns} for row in rows]).execute()
+                except Exception as e:
+                    if "PGRST204" not in str(e) and "Could not find the" not in str(e):
+                        raise
+                    # sql/recommendation_sets.sql not applied yet: created_at is the marker
+                    self._recommendation_set_columns = False
+                    print(f"[DB] Recommendation set columns missing, saving without them: {e}")
+                    table.insert(rows).execute()
+            else:
+                table.insert(rows).execute()
+
+            self.supabase.table("routine_recommendations") \
+                .update({"status": "superseded"}) \
+                .eq("user_id", user_id) \
+                .eq("status", "pending") \
+                .lt("created_at", generated_at) \
+                .execute()
+
+            print(f"[DB] Saved {len(rows)} recommendations for {user_id} ({generated_by})")
+            return generated_at
+
+        except Exception as e:
+            print(f"[DB ERROR] Failed to save recommendation set: {str(e)}")
+            return None
+
+    def get_recommendations_generated_at(self, user_id: str) -> Optional[str]:
+        """When the user's current pending set was generated (ISO), or None if there is none."""
+        response = self.supabase.table("routine_recommendations") \
+            .select("created_at") \
+            .eq("user_id", user_id) \
+            .eq("status", "pending") \
+            .order("created_at", desc=True) \
+            .limit(1) \
+            .execute()
+        rows = response.data or []
+        return rows[0]["created_at"] if rows else None
+
     def update_recommendation_status(self, recommendation_id: str, status: str) -> bool:
         """
         Update a recommendation's status (accepted/dismissed).
@@ -1,22 +1,28 @@
 import asyncio
 import json
+import os
+from itertools import combinations
 from typing import AsyncGenerator, Dict, List
 
 from app.services.decision_state.models import (
     ProfileState,
     EnvironmentalContext,
+    ProductFilters,
     ResponseComposerInput,
 )
-from app.services.session_signal.session_signal_service import process_session_signals
-from app.services.session_intent.session_intent_service import process_session_intent
+from app.services.session_classification.session_classification_service import process_session_classification
 from app.services.decision_state.decision_engine import build_strategy_payload
 from app.services.decision_state.decision_state_history import (
     get_session_decision_states,
     log_decision_state,
 )
 from app.services.decision_state.jte import resolve_delivery_plan
+from app.services.async_db import run_db
+from app.services.resilience import safe_call_async
 from app.services.decision_state.response_composer import compose_response
 from app.agents.recommendation.lib.knowledge_base.query_products import query_products
+from app.agents.llm_call.provider import embed_many
+from app.services.decision_state.texture_modifiers import resolve_texture_modifiers
 from app.services.clarification.clarification_generator import generate_clarification
 from app.services.session_signal.signal_detector import SIGNAL_NAMES
 
@@ -98,6 +104,45 @@ def _build_product_query(decision_state: str, active_signals: list, filters) ->
     return " ".join(parts)
 
 
+# Product queries are drawn from a closed vocabulary: decision state × active
+# signals × porosity × texture (modifier terms follow from texture), where a
+# profile may have no porosity or no texture at all (None). Embedding
+# every combination up front keeps provider.embed off the chat hot path —
+# query_products then only ever hits the embed cache. Signal combinations are
+# capped at PRECOMPUTE_MAX_SIGNALS active at once; rarer, larger combinations
+# are embedded on first use and cached from then on.
+PRECOMPUTE_MAX_SIGNALS = int(os.getenv("PRECOMPUTE_MAX_SIGNALS", "3"))
+
+
+def enumerate_product_queries(max_signals: int = PRECOMPUTE_MAX_SIGNALS) -> List[str]:
+    signal_sets = [
+        list(combo)
+        for size in range(max_signals + 1)
+        for combo in combinations(SIGNAL_NAMES, size)
+    ]
+    queries = set()
+    for decision_state in _DECISION_STATE_TERMS:
+        for porosity in [None, *_POROSITY_TERMS]:
+            for texture in [None, *_TEXTURE_TERMS]:
+                filters = ProductFilters(
+                    porosity_match=porosity,
+                    texture_match=texture,
+                    texture_modifiers=resolve_texture_modifiers(texture),
+                )
+                for active_signals in signal_sets:
+                    queries.add(_build_product_query(decision_state, active_signals, filters))
+    return sorted(queries)
+
+
+async def warm_product_query_embeddings(max_signals: int = PRECOMPUTE_MAX_SIGNALS) -> int:
+    """Embeds every enumerable product query. Already-cached queries cost nothing."""
+    queries = enumerate_product_queries(max_signals)
+    print(f"[Pipeline] Warming embed cache with {len(queries)} product queries...")
+    await embed_many(queries)
+    print("[Pipeline] Product query embeddings ready.")
+    return len(queries)
+
+
 # Keep for dashboard backwards compatibility
 _PRODUCT_QUERY_TEMPLATES = _DECISION_STATE_TERMS
 _POROSITY_CONTEXT = _POROSITY_TERMS
@@ -192,10 +237,8 @@ async def run_concierge_pipeline(
     # --- Phase 1: Run all input services in parallel ---
     yield json.dumps({"type": "status", "content": "Analysing your situation..."}) + "\n"
 
-    signal_task = process_session_signals(user_id, session_id, messages)
-    intent_task = process_session_intent(messages)
-
-    signal_snapshot, session_intent = await asyncio.gather(signal_task, intent_task)
+    # Signals + intent: two parallel calls, or one fused call (SESSION_CLASSIFIER_MODE)
+    signal_snapshot, session_intent = await process_session_classification(user_id, session_id, messages)
 
     print(f"[Pipeline] signal={signal_snapshot} | intent={session_intent}")
 
@@ -219,9 +262,19 @@ async def run_concierge_pipeline(
         if k in signal_snapshot
     })
 
-    delivered_states = get_session_decision_states(session_id)
+    delivered_states = await safe_call_async(
+        lambda: run_db(get_session_decision_states, session_id),
+        fallback=set(),
+        source="pipeline.get_session_decision_states",
+        detail=f"Timed out reading prior decision states for session={session_id!r}.",
+    )
     strategy_payload = build_strategy_payload(profile, session_signal, env, session_intent, frozenset(delivered_states))
-    log_decision_state(user_id, session_id, strategy_payload.decision_state)
+    await safe_call_async(
+        lambda: run_db(log_decision_state, user_id, session_id, strategy_payload.decision_state),
+        fallback=None,
+        source="pipeline.log_decision_state",
+        detail=f"Timed out persisting decision_state for session={session_id!r}.",
+    )
     yield json.dumps({
         "type": "strategy",
         "content": strategy_payload.model_dump(),
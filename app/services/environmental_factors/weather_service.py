@@ -1,12 +1,232 @@
+"""
+OpenWeather lookups for the alert engine and web chat.
+
+Every call used to open its own httpx client and make two round trips
+(geocode, then the 5-day forecast), once per user in the cron and once per
+turn in web chat — though users cluster in a few cities and the forecast only
+moves every 3 hours. Lookups now go through two cache tiers on one pooled
+client:
+
+  - geocode: city -> (lat, lon) is effectively permanent, so it is cached on
+    disk (sqlite) and survives restarts. Unknown cities are remembered for a
+    day so a typo'd location doesn't re-query on every turn. Hits are served
+    from an in-memory front; the sqlite file is only read on a front miss,
+    and read and written on a worker thread, never on the event loop
+  - forecast: the next-24h peaks per location, held in memory until the next
+    WEATHER_FORECAST_INTERVAL_SECS boundary, when OpenWeather publishes a
+    new 3-hourly step
+  - concurrent lookups for the same city/location share one request
+    (single_flight), so a cron wave over one city costs one round trip
+  - once a snapshot expires, the refresh gets WEATHER_STALE_WAIT_SECS; if
+    upstream is slower (or failing) the previous snapshot is served for up to
+    WEATHER_STALE_MAX_SECS while the refresh finishes in the background
+
+Env:
+  WEATHER_HTTP_TIMEOUT_SECS         upstream request timeout            (default 10)
+  WEATHER_FORECAST_INTERVAL_SECS    forecast step, aligns the TTL        (default 10800)
+  WEATHER_STALE_WAIT_SECS           wait on a refresh before serving stale (default 1.5)
+  WEATHER_STALE_MAX_SECS            oldest snapshot still served stale   (default 21600)
+  WEATHER_FORECAST_MAX_ENTRIES      forecast snapshots kept in memory    (default 2000)
+  WEATHER_GEOCODE_CACHE_BACKEND     sqlite | memory | off                (default sqlite)
+  WEATHER_GEOCODE_CACHE_PATH        sqlite file (default <tmp>/concierge_weather_cache.sqlite3)
+"""
+import asyncio
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
 import httpx
-from typing import Any, Optional, Union
+
+from app.agents.llm_call.response_cache import build_cache, cache_key
+from app.agents.llm_call.single_flight import SingleFlight
 from app.config import WEATHER_API_KEY
 from app.services.environmental_factors.sweat_service import get_sweat_level
 
+WEATHER_HTTP_TIMEOUT_SECS      = float(os.getenv("WEATHER_HTTP_TIMEOUT_SECS",      "10"))
+WEATHER_FORECAST_INTERVAL_SECS = float(os.getenv("WEATHER_FORECAST_INTERVAL_SECS", "10800"))
+WEATHER_STALE_WAIT_SECS        = float(os.getenv("WEATHER_STALE_WAIT_SECS",        "1.5"))
+WEATHER_STALE_MAX_SECS         = float(os.getenv("WEATHER_STALE_MAX_SECS",         "21600"))
+WEATHER_FORECAST_MAX_ENTRIES   = int(os.getenv("WEATHER_FORECAST_MAX_ENTRIES",     "2000"))
+WEATHER_GEOCODE_CACHE_BACKEND  = os.getenv("WEATHER_GEOCODE_CACHE_BACKEND", "sqlite").lower()
+WEATHER_GEOCODE_CACHE_PATH     = os.getenv(
+    "WEATHER_GEOCODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "concierge_weather_cache.sqlite3")
+)
+
+GEO_URL      = "http://api.openweathermap.org/geo/1.0/direct"
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+
+_GEOCODE_TTL_SECS      = 10 * 365 * 24 * 3600  # cities don't move
+_GEOCODE_MISS_TTL_SECS = 24 * 3600
+_GEOCODE_FRONT_ENTRIES = 5000
+_NO_READING = -100.0
+
+_geocode_cache = build_cache(
+    backend=WEATHER_GEOCODE_CACHE_BACKEND,
+    ttl_secs=_GEOCODE_TTL_SECS,
+    max_entries=100000,
+    path=WEATHER_GEOCODE_CACHE_PATH,
+    table="geocode_cache",
+)
+# The sqlite tier is shared across workers and restarts; hot cities stay in memory
+_geocode_front = (
+    build_cache(backend="memory", ttl_secs=_GEOCODE_TTL_SECS, max_entries=_GEOCODE_FRONT_ENTRIES)
+    if WEATHER_GEOCODE_CACHE_BACKEND == "sqlite" else _geocode_cache
+)
+_geocode_flights = SingleFlight("weather_geocode")
+_forecast_flights = SingleFlight("weather_forecast")
+
+# location key -> {"peaks": {...}, "fetched_at": float, "expires_at": float}
+_forecasts: "OrderedDict[str, Dict]" = OrderedDict()
+_stats = {"fresh": 0, "misses": 0, "refreshed": 0, "stale_served": 0, "upstream_errors": 0}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=WEATHER_HTTP_TIMEOUT_SECS,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http_client
+
+
+async def close_weather_client() -> None:
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+# ---------------------------------------------------------------------------
+# Geocode tier — permanent
+# ---------------------------------------------------------------------------
+
+def _geocode_ttl(entry: Dict) -> Optional[float]:
+    return None if entry["coords"] else _GEOCODE_MISS_TTL_SECS
+
+
+async def _geocode(city_name: str) -> Optional[Tuple[float, float]]:
+    key = cache_key("geocode", " ".join(city_name.lower().split()))
+    cached = _geocode_front.get(key) if _geocode_front is not None else None
+    if cached is not None:
+        return tuple(cached["coords"]) if cached["coords"] else None
+    return await _geocode_flights.do(key, lambda: _geocode_uncached(key, city_name))
+
+
+async def _geocode_uncached(key: str, city_name: str) -> Optional[Tuple[float, float]]:
+    # Inside the flight, so a burst for a city nobody has looked up reads the file once
+    entry = await _geocode_cache.aget(key) if _geocode_cache is not None else None
+    if entry is None:
+        res = await _get_http_client().get(GEO_URL, params={"q": city_name, "limit": 1, "appid": WEATHER_API_KEY})
+        res.raise_for_status()
+        geo_data = res.json()
+        entry = {"coords": [geo_data[0]["lat"], geo_data[0]["lon"]] if geo_data else None}
+        if _geocode_cache is not None:
+            await _geocode_cache.aset(key, entry, ttl=_geocode_ttl(entry))
+    if _geocode_front is not None:
+        _geocode_front.set(key, entry, ttl=_geocode_ttl(entry))
+    return tuple(entry["coords"]) if entry["coords"] else None
+
+
+# ---------------------------------------------------------------------------
+# Forecast tier — TTL to the next forecast step, stale-while-revalidate
+# ---------------------------------------------------------------------------
+
+def _forecast_key(lat: float, lon: float) -> str:
+    return f"{lat:.2f},{lon:.2f}"
+
+
+async def _forecast_peaks(lat: float, lon: float) -> Optional[Dict]:
+    """Peak temp/humidity over the next 24h (8 x 3h steps) at this location."""
+    key = _forecast_key(lat, lon)
+    snapshot = _forecasts.get(key)
+    now = _now()
+
+    if snapshot is not None and now < snapshot["expires_at"]:
+        _stats["fresh"] += 1
+        _forecasts.move_to_end(key)
+        return snapshot["peaks"]
+
+    if snapshot is None or now - snapshot["fetched_at"] > WEATHER_STALE_MAX_SECS:
+        _stats["misses"] += 1
+        return await _forecast_flights.do(key, lambda: _fetch_forecast(key, lat, lon))
+
+    # Expired but recent: give the refresh a short window, else serve stale.
+    # The refresh is its own task, so it still lands in the cache if we stop waiting.
+    refresh = asyncio.ensure_future(_forecast_flights.do(key, lambda: _fetch_forecast(key, lat, lon)))
+    refresh.add_done_callback(_log_refresh_failure)
+    done, _ = await asyncio.wait({refresh}, timeout=WEATHER_STALE_WAIT_SECS)
+    if refresh in done and not refresh.cancelled() and refresh.exception() is None and refresh.result():
+        _stats["refreshed"] += 1
+        return refresh.result()
+
+    _stats["stale_served"] += 1
+    print(f"[WeatherService] Serving {now - snapshot['fetched_at']:.0f}s-old forecast for {key}")
+    return snapshot["peaks"]
+
+
+def _log_refresh_failure(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        error = task.exception()
+        if isinstance(error, httpx.HTTPStatusError):
+            error = f"upstream returned {error.response.status_code}"
+        print(f"[WeatherService] Background forecast refresh failed: {error}")
+
+
+async def _fetch_forecast(key: str, lat: float, lon: float) -> Optional[Dict]:
+    try:
+        res = await _get_http_client().get(
+            FORECAST_URL, params={"lat": lat, "lon": lon, "appid": WEATHER_API_KEY, "units": "metric"}
+        )
+        res.raise_for_status()
+        forecast_data = res.json()
+    except Exception:
+        _stats["upstream_errors"] += 1
+        raise
+
+    # Identify Peak Conditions in the next 24 hours (first 8 intervals of 3 hours)
+    forecast_list = forecast_data.get("list", [])[:8]
+    if not forecast_list:
+        return None
+
+    max_temp = _NO_READING
+    max_humidity = 0
+    for item in forecast_list:
+        main = item.get("main", {})
+        max_temp = max(max_temp, main.get("temp", _NO_READING))
+        max_humidity = max(max_humidity, main.get("humidity", 0))
+
+    peaks = {"peak_heat": max_temp, "peak_humidity": max_humidity}
+    now = _now()
+    step = WEATHER_FORECAST_INTERVAL_SECS
+    _forecasts[key] = {"peaks": peaks, "fetched_at": now, "expires_at": (now // step + 1) * step}
+    _forecasts.move_to_end(key)
+    while len(_forecasts) > WEATHER_FORECAST_MAX_ENTRIES:
+        _forecasts.popitem(last=False)
+    return peaks
+
+
+def weather_cache_stats() -> Dict:
+    return {
+        "forecast": {"entries": len(_forecasts), **_stats},
+        "geocode": _geocode_cache.stats() if _geocode_cache is not None else {"backend": "off"},
+        "geocode_front": _geocode_front.stats() if _geocode_front is not None else {"backend": "off"},
+        "flights": {"geocode": _geocode_flights.stats(), "forecast": _forecast_flights.stats()},
+    }
+
+
 async def get_city_environmental_data(city_name: str, attribute: str = "all", in_ac: bool = False) -> Any:
     """
     Unified function to get environmental data for a city from OpenWeather.
-    
+
     Args:
         city_name: Name of the city.
         attribute: The specific data needed ('heat', 'humidity', 'coords', or 'all').
@@ -22,78 +242,56 @@ async def get_city_environmental_data(city_name: str, attribute: str = "all", in
         return None
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # 1. Geocoding Call (Always needed to get lat/lon)
-            geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name}&limit=1&appid={WEATHER_API_KEY}"
-            geo_res = await client.get(geo_url)
-            geo_res.raise_for_status()
-            geo_data = geo_res.json()
-            
-            if not geo_data or len(geo_data) == 0:
-                print(f"[WeatherService] No coordinates found for: {city_name}")
-                return None
-            
-            lat, lon = geo_data[0]["lat"], geo_data[0]["lon"]
-            
-            # If the user only wanted coordinates, we can stop here
-            if attribute == "coords":
-                return lat, lon
-
-            # 2. Weather Forecast Call (Needed for heat/humidity prediction)
-            # Fetching 5-day/3-hour forecast
-            forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={WEATHER_API_KEY}&units=metric"
-            forecast_res = await client.get(forecast_url)
-            forecast_res.raise_for_status()
-            forecast_data = forecast_res.json()
-            
-            # Identify Peak Conditions in the next 24 hours (first 8 intervals of 3 hours)
-            forecast_list = forecast_data.get("list", [])[:8]
-            
-            if not forecast_list:
-                print(f"[WeatherService] No forecast data available for {city_name}")
-                return None
-                
-            max_temp = -100.0
-            max_humidity = 0
-            
-            for item in forecast_list:
-                main = item.get("main", {})
-                temp = main.get("temp", -100.0)
-                hum = main.get("humidity", 0)
-                
-                if temp > max_temp:
-                    max_temp = temp
-                if hum > max_humidity:
-                    max_humidity = hum
-
-            heat = max_temp
-            humidity = max_humidity
-            
-            # Calculate Sweat Level based on predicted peaks
-            sweat_level = None
-            if heat != -100.0:
-                sweat_level = get_sweat_level(heat, humidity, in_ac=in_ac)
-
-            # 3. Return requested attribute
-            if attribute == "heat":
-                return heat
-            elif attribute == "humidity":
-                return humidity
-            elif attribute == "sweat":
-                return sweat_level
-            elif attribute == "all":
-                return {
-                    "city": city_name,
-                    "lat": lat,
-                    "lon": lon,
-                    "peak_heat": heat,
-                    "peak_humidity": humidity,
-                    "predicted_sweat_level": sweat_level
-                }
-            else:
-                print(f"[WeatherService] Unknown attribute requested: {attribute}")
-                return None
+        # 1. Geocoding (cached permanently)
+        coords = await _geocode(city_name)
+        if coords is None:
+            print(f"[WeatherService] No coordinates found for: {city_name}")
+            return None
+
+        lat, lon = coords
 
+        # If the user only wanted coordinates, we can stop here
+        if attribute == "coords":
+            return lat, lon
+
+        # 2. Forecast peaks (cached until the next 3-hour step)
+        peaks = await _forecast_peaks(lat, lon)
+        if not peaks:
+            print(f"[WeatherService] No forecast data available for {city_name}")
+            return None
+
+        heat = peaks["peak_heat"]
+        humidity = peaks["peak_humidity"]
+
+        # Calculate Sweat Level based on predicted peaks
+        sweat_level = None
+        if heat != _NO_READING:
+            sweat_level = get_sweat_level(heat, humidity, in_ac=in_ac)
+
+        # 3. Return requested attribute
+        if attribute == "heat":
+            return heat
+        elif attribute == "humidity":
+            return humidity
+        elif attribute == "sweat":
+            return sweat_level
+        elif attribute == "all":
+            return {
+                "city": city_name,
+                "lat": lat,
+                "lon": lon,
+                "peak_heat": heat,
+                "peak_humidity": humidity,
+                "predicted_sweat_level": sweat_level
+            }
+        else:
+            print(f"[WeatherService] Unknown attribute requested: {attribute}")
+            return None
+
+    except httpx.HTTPStatusError as e:
+        # str(e) would echo the request URL, appid included
+        print(f"[WeatherService] Upstream returned {e.response.status_code} for {city_name}")
+        return None
     except Exception as e:
         print(f"[WeatherService] Error fetching data for {city_name}: {e}")
         return None
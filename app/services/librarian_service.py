@@ -8,6 +8,7 @@ The Librarian retrieves relevant historical events and formats them for LLM inje
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from app.services.supabase_service import get_supabase
+from app.services.vitals_rollup import rollup_from_events, user_events
 
 class LibrarianService:
     """
@@ -20,6 +21,8 @@ class LibrarianService:
     
     def __init__(self):
         self.supabase = get_supabase()
+        self._per_category_rpc = True  # cleared if sql/hair_events_keyset.sql isn't applied
+        self._vitals_rollup = True     # cleared if sql/create_user_vitals_latest.sql isn't applied
         print("[LIBRARIAN] LibrarianService initialized")
     
     def get_recent_events(self, user_id: str, limit: int = 5) -> List[Dict]:
@@ -78,6 +81,60 @@ class LibrarianService:
             print(f"[LIBRARIAN ERROR] Failed to retrieve events by category: {str(e)}")
             return []
     
+    def get_latest_events_per_category(
+        self,
+        user_id: str,
+        per_category: int = 5,
+        categories: List[str] = None,
+        columns: str = "primary_label, vital_score, created_at",
+    ) -> Dict[str, List[Dict]]:
+        """
+        The newest `per_category` events in each category, in one round trip.
+        Reads at most len(categories) * per_category rows however long the
+        user's history is.
+        
+        Args:
+            user_id: Firebase user ID
+            per_category: Events to keep per category
+            categories: Categories to fetch (default CORE_CATEGORIES)
+            columns: Projection for the per-category fallback queries
+            
+        Returns:
+            Dict mapping each category to its events, newest first
+        """
+        categories = [c.upper() for c in (categories or self.CORE_CATEGORIES)]
+        latest: Dict[str, List[Dict]] = {c: [] for c in categories}
+        
+        if self._per_category_rpc:
+            try:
+                response = self.supabase.rpc("latest_hair_events_per_category", {
+                    "p_user_id": user_id,
+                    "p_categories": categories,
+                    "p_per_category": per_category,
+                }).execute()
+                for row in response.data or []:
+                    latest.setdefault(row["primary_label"], []).append(row)
+                return latest
+            except Exception as e:
+                if "PGRST202" in str(e) or "Could not find the function" in str(e):
+                    self._per_category_rpc = False
+                print(f"[LIBRARIAN] latest_hair_events_per_category RPC unavailable, querying per category: {str(e)}")
+        
+        # Fallback: one indexed, limited query per category
+        for category in categories:
+            try:
+                response = self.supabase.table("hair_events") \
+                    .select(columns) \
+                    .eq("user_id", user_id) \
+                    .eq("primary_label", category) \
+                    .order("created_at", desc=True) \
+                    .limit(per_category) \
+                    .execute()
+                latest[category] = response.data or []
+            except Exception as e:
+                print(f"[LIBRARIAN ERROR] Failed to retrieve latest {category} events: {str(e)}")
+        return latest
+    
     def format_context_for_prompt(self, events: List[Dict]) -> str:
         """
         Format past events into a readable context string for LLM injection.
@@ -227,6 +284,9 @@ Maximum 3 sentences. Warm, expert tone. No markdown."""
     def get_vitals_summary(self, user_id: str) -> Dict[str, Dict]:
         """
         Retrieve a summary of latest, average, and historical trends for all core vitals.
+        Served from the user_vitals_latest rollup — one indexed read of at most
+        one row per category. "average" is the lifetime average of the
+        category's scores on this path and on the raw-events fallback alike.
         
         Args:
             user_id: Firebase user ID
@@ -234,46 +294,57 @@ Maximum 3 sentences. Warm, expert tone. No markdown."""
         Returns:
             Dict mapping each category (lowercase) to its latest, average, and history data.
         """
+        empty = {cat.lower(): {"latest": None, "average": None, "history": []} for cat in self.CORE_CATEGORIES}
+        if not self._vitals_rollup:
+            return self._vitals_summary_from_events(user_id)
         try:
-            # Get all events for user to calculate averages and history
-            response = self.supabase.table("hair_events") \
-                .select("primary_label, vital_score, created_at") \
+            response = self.supabase.table("user_vitals_latest") \
+                .select("category, latest_score, history, score_sum, score_count") \
                 .eq("user_id", user_id) \
-                .order("created_at", desc=True) \
+                .in_("category", self.CORE_CATEGORIES) \
                 .execute()
             
-            data = response.data if response.data else []
-            
-            summary = {}
-            for category in self.CORE_CATEGORIES:
-                # Filter events for this category
-                cat_events = [e for e in data if e.get('primary_label') == category]
-                
-                if not cat_events:
-                    summary[category.lower()] = {
-                        "latest": None,
-                        "average": None,
-                        "history": []
-                    }
-                    continue
-                
-                # Extract scores (filtering out any potential Nones)
-                scores = [e['vital_score'] for e in cat_events if e.get('vital_score') is not None]
-                
-                summary[category.lower()] = {
-                    "latest": scores[0] if scores else None,
-                    "average": round(sum(scores) / len(scores), 1) if scores else None,
-                    "history": scores[:5] # Last 5 scores for trend visualization (already DESC)
-                }
+            summary = empty
+            for row in response.data or []:
+                summary[row["category"].lower()] = _vitals_entry(row)
             
             print(f"[LIBRARIAN] Generated vitals summary for user {user_id}")
             return summary
             
+        except Exception as e:
+            # Only a missing table turns the rollup off for good; a timeout or RLS
+            # error that merely names it falls back for this call alone
+            if "PGRST205" in str(e) or "42P01" in str(e) or "Could not find the table" in str(e):
+                self._vitals_rollup = False
+            print(f"[LIBRARIAN ERROR] Vitals rollup unavailable, summarising raw events: {str(e)}")
+            return self._vitals_summary_from_events(user_id)
+    
+    def _vitals_summary_from_events(self, user_id: str) -> Dict[str, Dict]:
+        """
+        Fallback for databases without the rollup: the rollup's figures,
+        recomputed from every scored event. Reads the user's whole history,
+        so it only stands in until the migration is applied.
+        """
+        try:
+            rollup = rollup_from_events(user_events(user_id))
+            return {cat.lower(): _vitals_entry(rollup.get(cat)) for cat in self.CORE_CATEGORIES}
+            
         except Exception as e:
             print(f"[LIBRARIAN ERROR] Failed to calculate vitals summary: {str(e)}")
             return {cat.lower(): {"latest": None, "average": None, "history": []} for cat in self.CORE_CATEGORIES}
 
 
+def _vitals_entry(row: Optional[Dict]) -> Dict:
+    """One category of the /vitals summary from a rollup row (latest_score, history, score_sum, score_count)."""
+    if not row or not row["score_count"]:
+        return {"latest": None, "average": None, "history": []}
+    return {
+        "latest": row["latest_score"],
+        "average": round(row["score_sum"] / row["score_count"], 1),
+        "history": list(row["history"] or [])
+    }
+
+
 # Singleton instance
 _librarian_instance = None
 
@@ -1,11 +1,84 @@
 """
 Push Notification Service: Manages Web Push subscriptions and sending notifications.
+
+Sending used to call the synchronous pywebpush.webpush once per subscription
+inside an async function, blocking the event loop for every round trip, and
+subscriptions the push service had dropped (404/410) were retried forever.
+send_push_batch now fans a batch of notifications out over one pooled httpx
+client:
+
+  - every user's subscriptions are read in one query per 100 users
+  - PUSH_CONCURRENCY workers deliver at once; each request gets
+    PUSH_TIMEOUT_SECS end to end
+  - endpoints answering 404/410 are expired and deleted after the batch
+  - the returned report counts delivered / expired / failed / timed-out
+    sends per batch; send_push_notification is the one-user wrapper
+  - VAPID_PRIVATE_KEY is parsed once (load_vapid_key, at startup) and the
+    signed VAPID header is reused per push-service origin until
+    PUSH_VAPID_REFRESH_SECS before its 12h expiry — the claims only differ
+    by origin, and there are a handful of origins (FCM, Mozilla, Apple...),
+    so a batch signs a few JWTs instead of one per subscription. Only the
+    payload encryption remains per subscription
+
+tests/fake_push_endpoint.py is a local push service for tests and benchmarks.
+
+Env:
+  PUSH_CONCURRENCY         sends in flight per batch                      (default 32)
+  PUSH_TIMEOUT_SECS        per-send deadline                              (default 10)
+  PUSH_TTL_SECS            how long the push service holds an undelivered message (default 0)
+  PUSH_VAPID_REFRESH_SECS  re-sign a cached VAPID header this early before expiry (default 600)
 """
 
+import asyncio
+import json
 import os
-from typing import Optional, List, Dict
-from pywebpush import webpush, WebPushException
+import time
+from typing import Optional, List, Dict, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from py_vapid import Vapid
+from pywebpush import WebPusher, WebPushException
 from app.services.supabase_service import get_supabase
+from app.services.async_db import run_db
+
+PUSH_CONCURRENCY        = int(os.getenv("PUSH_CONCURRENCY",          "32"))
+PUSH_TIMEOUT_SECS       = float(os.getenv("PUSH_TIMEOUT_SECS",       "10"))
+PUSH_TTL_SECS           = int(os.getenv("PUSH_TTL_SECS",             "0"))
+PUSH_VAPID_REFRESH_SECS = float(os.getenv("PUSH_VAPID_REFRESH_SECS", "600"))
+
+VAPID_CLAIMS_SUB = "mailto:admin@concierge.example.com"  # Change to your email
+_VAPID_EXPIRY_SECS = 12 * 3600
+
+# Users per push_subscriptions read / endpoints per delete (URL length)
+_QUERY_CHUNK = 100
+_EXPIRED_STATUSES = (404, 410)
+_MAX_REPORTED_ERRORS = 10
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+_vapid_key: Optional[Vapid] = None
+_vapid_key_source: Optional[str] = None
+# push-service origin -> (exp, signed headers)
+_vapid_headers_by_origin: Dict[str, Tuple[int, Dict[str, str]]] = {}
+_vapid_stats = {"signed": 0, "reused": 0}
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=PUSH_TIMEOUT_SECS,
+            limits=httpx.Limits(max_connections=PUSH_CONCURRENCY, max_keepalive_connections=PUSH_CONCURRENCY),
+        )
+    return _http_client
+
+
+async def close_push_client() -> None:
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
 
 
 async def store_subscription(
@@ -30,12 +103,12 @@ async def store_subscription(
 
     try:
         # Upsert into push_subscriptions table
-        supabase.table("push_subscriptions").upsert({
+        await run_db(supabase.table("push_subscriptions").upsert({
             "user_id": user_id,
             "endpoint": endpoint,
             "p256dh": p256dh,
             "auth": auth
-        }).execute()
+        }).execute)
 
         print(f"[PUSH] Stored subscription for user {user_id}")
         return True
@@ -58,10 +131,12 @@ async def get_subscriptions(user_id: str) -> List[Dict]:
     supabase = get_supabase()
 
     try:
-        response = supabase.table("push_subscriptions") \
-            .select("endpoint, p256dh, auth") \
-            .eq("user_id", user_id) \
-            .execute()
+        response = await run_db(
+            supabase.table("push_subscriptions")
+            .select("endpoint, p256dh, auth")
+            .eq("user_id", user_id)
+            .execute
+        )
 
         return response.data or []
 
@@ -70,6 +145,195 @@ async def get_subscriptions(user_id: str) -> List[Dict]:
         return []
 
 
+def load_vapid_key() -> Optional[Vapid]:
+    """
+    The parsed VAPID_PRIVATE_KEY, or None if unset. Parsed once; only a
+    changed env value is re-parsed (and drops the signed headers). Raises if
+    the key is malformed.
+    """
+    global _vapid_key, _vapid_key_source
+    private_key = os.getenv("VAPID_PRIVATE_KEY")
+    if private_key != _vapid_key_source:
+        _vapid_headers_by_origin.clear()
+        _vapid_key = Vapid.from_string(private_key=private_key) if private_key else None
+        _vapid_key_source = private_key
+    return _vapid_key
+
+
+def _origin(endpoint: str) -> str:
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+def _vapid_headers(vapid: Vapid, endpoint: str) -> Dict[str, str]:
+    """VAPID Authorization header for this endpoint's push service, signed once per origin."""
+    origin = _origin(endpoint)
+    now = time.time()
+    cached = _vapid_headers_by_origin.get(origin)
+    if cached is not None and now < cached[0] - PUSH_VAPID_REFRESH_SECS:
+        _vapid_stats["reused"] += 1
+        return cached[1]
+
+    exp = int(now) + _VAPID_EXPIRY_SECS
+    headers = vapid.sign({"sub": VAPID_CLAIMS_SUB, "aud": origin, "exp": exp})
+    _vapid_headers_by_origin[origin] = (exp, headers)
+    _vapid_stats["signed"] += 1
+    return headers
+
+
+def vapid_cache_stats() -> Dict:
+    return {"origins": len(_vapid_headers_by_origin), "key_loaded": _vapid_key is not None, **_vapid_stats}
+
+
+def _build_request(sub: Dict, payload: bytes, vapid: Vapid) -> Tuple[bytes, Dict[str, str]]:
+    """Encrypt the payload for one subscription (aes128gcm) and sign its headers."""
+    pusher = WebPusher({"endpoint": sub["endpoint"], "keys": {"p256dh": sub["p256dh"], "auth": sub["auth"]}})
+    body = pusher.encode(payload, "aes128gcm")["body"]
+    headers = {
+        **_vapid_headers(vapid, sub["endpoint"]),
+        "content-encoding": "aes128gcm",
+        "ttl": str(PUSH_TTL_SECS),
+    }
+    return body, headers
+
+
+def _payload(title: str, body: str, data: Optional[Dict] = None) -> bytes:
+    payload = {
+        "title": title,
+        "body": body,
+        "icon": "/icons/icon-192x192.png",
+        "badge": "/icons/icon-192x192.png",
+    }
+    if data:
+        payload.update(data)
+    return json.dumps(payload).encode("utf-8")
+
+
+def _subscriptions_for(user_ids: List[str]) -> Dict[str, List[Dict]]:
+    """user_id -> subscriptions, for many users at once."""
+    supabase = get_supabase()
+    by_user: Dict[str, List[Dict]] = {}
+    for i in range(0, len(user_ids), _QUERY_CHUNK):
+        response = (
+            supabase.table("push_subscriptions")
+            .select("user_id, endpoint, p256dh, auth")
+            .in_("user_id", user_ids[i:i + _QUERY_CHUNK])
+            .execute()
+        )
+        for row in response.data or []:
+            by_user.setdefault(row["user_id"], []).append(row)
+    return by_user
+
+
+def _prune_subscriptions(endpoints: List[str]) -> int:
+    """Delete subscriptions whose push service reported them gone."""
+    supabase = get_supabase()
+    for i in range(0, len(endpoints), _QUERY_CHUNK):
+        supabase.table("push_subscriptions").delete().in_("endpoint", endpoints[i:i + _QUERY_CHUNK]).execute()
+    return len(endpoints)
+
+
+async def _send_one(sub: Dict, payload: bytes, vapid: Vapid) -> Tuple[str, str]:
+    """Deliver to one subscription. Returns (outcome, detail)."""
+    try:
+        body, headers = _build_request(sub, payload, vapid)
+        response = await asyncio.wait_for(
+            _get_http_client().post(sub["endpoint"], content=body, headers=headers),
+            timeout=PUSH_TIMEOUT_SECS,
+        )
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        return "timed_out", f"no response after {PUSH_TIMEOUT_SECS:.1f}s"
+    except (WebPushException, httpx.HTTPError, ValueError) as e:
+        return "failed", str(e) or type(e).__name__
+
+    if response.status_code in _EXPIRED_STATUSES:
+        return "expired", str(response.status_code)
+    if response.status_code > 202:
+        return "failed", f"{response.status_code} {response.text[:200]}"
+    return "delivered", str(response.status_code)
+
+
+async def send_push_batch(notifications: List[Dict]) -> Dict:
+    """
+    Send each notification ({"user_id", "title", "body", "data"?}) to all of
+    its user's subscriptions, PUSH_CONCURRENCY at a time, and prune the
+    subscriptions that turned out to be expired.
+
+    Returns the batch report: users, subscriptions, delivered, expired,
+    pruned, failed, timed_out, users_without_subscriptions, elapsed_ms and
+    errors (a sample, by push-service origin — endpoints are capability URLs).
+    """
+    started = time.perf_counter()
+    report = {
+        "users": len({n["user_id"] for n in notifications}),
+        "subscriptions": 0,
+        "delivered": 0,
+        "expired": 0,
+        "pruned": 0,
+        "failed": 0,
+        "timed_out": 0,
+        "users_without_subscriptions": 0,
+        "elapsed_ms": 0.0,
+        "errors": [],
+    }
+
+    try:
+        vapid = load_vapid_key()
+    except Exception as e:
+        print(f"[PUSH] Invalid VAPID_PRIVATE_KEY: {str(e)}")
+        report["errors"].append("invalid VAPID_PRIVATE_KEY")
+        return report
+    if vapid is None or not os.getenv("NEXT_PUBLIC_VAPID_PUBLIC_KEY"):
+        print("[PUSH] VAPID keys not configured")
+        report["errors"].append("VAPID keys not configured")
+        return report
+
+    try:
+        by_user = await run_db(_subscriptions_for, list(dict.fromkeys(n["user_id"] for n in notifications)))
+    except Exception as e:
+        print(f"[PUSH] Error fetching subscriptions: {str(e)}")
+        report["errors"].append(f"subscription read failed: {e}")
+        return report
+
+    sends = []
+    for notification in notifications:
+        subs = by_user.get(notification["user_id"], [])
+        payload = _payload(notification["title"], notification["body"], notification.get("data"))
+        sends.extend((sub, payload) for sub in subs)
+    report["subscriptions"] = len(sends)
+    report["users_without_subscriptions"] = report["users"] - len(by_user)
+
+    expired: List[str] = []
+    pending = iter(sends)
+
+    async def worker():
+        # Workers share one iterator, so at most PUSH_CONCURRENCY sends are in flight
+        for sub, payload in pending:
+            outcome, detail = await _send_one(sub, payload, vapid)
+            report[outcome] += 1
+            if outcome == "expired":
+                expired.append(sub["endpoint"])
+            elif outcome != "delivered" and len(report["errors"]) < _MAX_REPORTED_ERRORS:
+                report["errors"].append(f"{_origin(sub['endpoint'])}: {detail}")
+
+    await asyncio.gather(*(worker() for _ in range(min(PUSH_CONCURRENCY, len(sends)))))
+
+    if expired:
+        try:
+            report["pruned"] = await run_db(_prune_subscriptions, list(dict.fromkeys(expired)))
+        except Exception as e:
+            print(f"[PUSH] Error pruning expired subscriptions: {str(e)}")
+            report["errors"].append(f"prune failed: {e}")
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(
+        f"[PUSH] Batch: {report['delivered']}/{report['subscriptions']} delivered to {report['users']} users, "
+        f"{report['expired']} expired ({report['pruned']} pruned), {report['failed']} failed, "
+        f"{report['timed_out']} timed out in {report['elapsed_ms']:.0f}ms"
+    )
+    return report
+
+
 async def send_push_notification(
     user_id: str,
     title: str,
@@ -88,59 +352,13 @@ async def send_push_notification(
     Returns:
         True if all sends successful, False otherwise
     """
-    vapid_private_key = os.getenv("VAPID_PRIVATE_KEY")
-    vapid_public_key = os.getenv("NEXT_PUBLIC_VAPID_PUBLIC_KEY")
-    vapid_claims = {
-        "sub": "mailto:admin@concierge.example.com",  # Change to your email
-    }
+    report = await send_push_batch([{"user_id": user_id, "title": title, "body": body, "data": data}])
 
-    if not vapid_private_key or not vapid_public_key:
-        print("[PUSH] VAPID keys not configured")
-        return False
-
-    subscriptions = await get_subscriptions(user_id)
-
-    if not subscriptions:
+    if report["users_without_subscriptions"]:
         print(f"[PUSH] No subscriptions found for user {user_id}")
         return False
 
-    payload = {
-        "title": title,
-        "body": body,
-        "icon": "/icons/icon-192x192.png",
-        "badge": "/icons/icon-192x192.png",
-    }
-
-    if data:
-        payload.update(data)
-
-    all_successful = True
-
-    for sub in subscriptions:
-        try:
-            webpush(
-                subscription_info={
-                    "endpoint": sub["endpoint"],
-                    "keys": {
-                        "p256dh": sub["p256dh"],
-                        "auth": sub["auth"]
-                    }
-                },
-                data=str(payload),  # pywebpush requires string payload
-                vapid_private_key=vapid_private_key,
-                vapid_claims=vapid_claims,
-                timeout=10
-            )
-            print(f"[PUSH] Sent to {sub['endpoint']}")
-
-        except WebPushException as e:
-            print(f"[PUSH] WebPush error: {str(e)}")
-            all_successful = False
-        except Exception as e:
-            print(f"[PUSH] Error sending notification: {str(e)}")
-            all_successful = False
-
-    return all_successful
+    return report["subscriptions"] > 0 and report["delivered"] == report["subscriptions"]
 
 
 def remove_subscription(user_id: str, endpoint: str) -> bool:
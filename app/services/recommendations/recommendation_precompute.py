@@ -0,0 +1,229 @@
+"""
+Recommendation sets are generated off the read path.
+
+GET /recommendations/{user_id} used to call generate_recommendations inline
+whenever the user had no pending set: four context reads plus an LLM call
+inside the page load. Generation now happens here, in a small background
+worker pool, and the endpoint only reads the stored set:
+
+    schedule_recommendations(user_id, "hair_event", force=True)   # new data
+    schedule_recommendations(user_id, "cron")                     # daily pass
+
+  - triggers: the alert cron schedules every user of each page it finishes
+    (after that page's alerts are logged, so they feed the prompt), and
+    POST /event schedules the user whose hair event was just saved
+  - two lanes: hair events and read misses are served before any cron
+    request, so a user waiting on a page load never sits behind the nightly
+    backlog. At most RECOMMENDATION_MAX_QUEUED_CRON cron requests wait at
+    once; the rest are dropped and refreshed by a later run or by their
+    next (stale) read
+  - a user waits in the queue at most once (a hair event upgrades a queued
+    cron request and moves it to the front lane); a cron request for a user
+    whose set is younger than RECOMMENDATION_MAX_AGE_SECS is dropped after
+    one indexed read. Hair events always regenerate
+  - each set is saved in one insert with its generated_at / generated_by
+    freshness marker and supersedes the user's older pending set; a failed
+    or empty generation leaves the previous set in place
+  - LLM calls run at PRIORITY_BACKGROUND, behind interactive traffic
+
+Env:
+  RECOMMENDATION_WORKERS        generations in flight            (default 2)
+  RECOMMENDATION_MAX_AGE_SECS   age at which a set is stale      (default 86400)
+  RECOMMENDATION_TIMEOUT_SECS   per-user generation deadline     (default 60)
+  RECOMMENDATION_MAX_QUEUED_CRON  cron requests waiting at once    (default 500)
+"""
+import asyncio
+import itertools
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.agents.llm_call.rate_limiter import llm_priority, PRIORITY_BACKGROUND
+from app.services.async_db import get_async_db
+from app.services.recommendations.recommendation_agent import generate_recommendations
+
+RECOMMENDATION_WORKERS      = int(os.getenv("RECOMMENDATION_WORKERS",        "2"))
+RECOMMENDATION_MAX_AGE_SECS = float(os.getenv("RECOMMENDATION_MAX_AGE_SECS", "86400"))
+RECOMMENDATION_TIMEOUT_SECS = float(os.getenv("RECOMMENDATION_TIMEOUT_SECS", "60"))
+RECOMMENDATION_MAX_QUEUED_CRON = int(os.getenv("RECOMMENDATION_MAX_QUEUED_CRON", "500"))
+
+# Queue lanes — lower is served first
+_INTERACTIVE = 0
+_CRON        = 1
+
+
+def set_age_secs(generated_at: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds since a set's generated_at / created_at, or None if unknown."""
+    if not generated_at:
+        return None
+    try:
+        ts = datetime.fromisoformat(generated_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ((now or datetime.now(timezone.utc)) - ts).total_seconds()
+
+
+def is_stale(generated_at: Optional[str]) -> bool:
+    age = set_age_secs(generated_at)
+    return age is None or age > RECOMMENDATION_MAX_AGE_SECS
+
+
+async def precompute_recommendations(user_id: str, generated_by: str) -> Optional[str]:
+    """
+    Generate and store a new set for one user. Returns its generated_at, or
+    None if nothing was generated (the previous set, if any, stays).
+    """
+    db = get_async_db()
+    user_metadata, user_routine, user_alerts = await asyncio.gather(
+        db.get_user_metadata(user_id),
+        db.get_active_routine(user_id),
+        db.get_pending_alerts(user_id, limit=3),
+    )
+    user_vitals = await db.get_vitals_summary(user_id) if hasattr(db, 'get_vitals_summary') else {}
+
+    with llm_priority(PRIORITY_BACKGROUND):
+        recommendations = await generate_recommendations(
+            user_id=user_id,
+            user_metadata=user_metadata or {},
+            routine=user_routine or {},
+            alerts=user_alerts,
+            vitals=user_vitals
+        )
+
+    return await db.save_recommendation_set(user_id, recommendations, generated_by)
+
+
+class RecommendationPrecomputer:
+    """
+    Deduplicating two-lane queue of users to regenerate, drained by a few
+    workers: interactive requests (hair events, read misses) first, cron last.
+    """
+
+    def __init__(
+        self,
+        generate=precompute_recommendations,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_queued_cron: Optional[int] = None,
+    ):
+        self.generate = generate
+        self.workers = workers or RECOMMENDATION_WORKERS
+        self.timeout = timeout or RECOMMENDATION_TIMEOUT_SECS
+        self.max_queued_cron = max_queued_cron or RECOMMENDATION_MAX_QUEUED_CRON
+        # (lane, seq, user_id); a user moved to the front lane leaves a stale
+        # cron entry behind, which the worker skips
+        self._queue: "asyncio.PriorityQueue[Tuple[int, int, str]]" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._queued: Dict[str, Tuple[str, bool, int]] = {}  # user_id -> (generated_by, force, lane)
+        self._queued_cron = 0
+        self._tasks: List[asyncio.Task] = []
+        self._stats = {
+            "scheduled": 0, "deduped": 0, "promoted": 0, "cron_dropped": 0,
+            "fresh_skipped": 0, "generated": 0, "empty": 0, "failed": 0,
+        }
+
+    def schedule(self, user_id: str, generated_by: str, force: bool = False) -> bool:
+        """Queue a regeneration; False if the user is already waiting or the cron lane is full. Never blocks."""
+        lane = _CRON if generated_by == "cron" and not force else _INTERACTIVE
+        queued = self._queued.get(user_id)
+        if queued is not None:
+            self._stats["deduped"] += 1
+            if lane == _INTERACTIVE and queued[2] == _CRON:
+                self._queued[user_id] = (generated_by, force, _INTERACTIVE)
+                self._queued_cron -= 1
+                self._queue.put_nowait((_INTERACTIVE, next(self._seq), user_id))
+                self._stats["promoted"] += 1
+            elif force and not queued[1]:
+                self._queued[user_id] = (generated_by, True, queued[2])
+            return False
+        if lane == _CRON:
+            if self._queued_cron >= self.max_queued_cron:
+                self._stats["cron_dropped"] += 1
+                return False
+            self._queued_cron += 1
+        self._queued[user_id] = (generated_by, force, lane)
+        self._queue.put_nowait((lane, next(self._seq), user_id))
+        self._stats["scheduled"] += 1
+        self._ensure_workers()
+        return True
+
+    def _ensure_workers(self) -> None:
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.get_running_loop().create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        while True:
+            lane, _, user_id = await self._queue.get()
+            try:
+                queued = self._queued.get(user_id)
+                if queued is None or queued[2] != lane:
+                    continue  # left behind when the user moved lanes, or already served
+                # Off the waiting list before generating: a hair event from here on queues a new run
+                generated_by, force, _ = self._queued.pop(user_id)
+                if lane == _CRON:
+                    self._queued_cron -= 1
+                await self._refresh(user_id, generated_by, force)
+            finally:
+                self._queue.task_done()
+
+    async def _refresh(self, user_id: str, generated_by: str, force: bool) -> None:
+        try:
+            if not force:
+                generated_at = await get_async_db().get_recommendations_generated_at(user_id)
+                if not is_stale(generated_at):
+                    self._stats["fresh_skipped"] += 1
+                    return
+            generated_at = await asyncio.wait_for(self.generate(user_id, generated_by), timeout=self.timeout)
+            self._stats["generated" if generated_at else "empty"] += 1
+        except Exception as e:
+            self._stats["failed"] += 1
+            print(f"[RecommendationPrecompute] {user_id} ({generated_by}) failed: {e}")
+
+    async def drain(self) -> None:
+        """Wait until every scheduled user has been handled."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self._queued),
+            "queued_cron": self._queued_cron,
+            "workers": len(self._tasks),
+            **self._stats,
+        }
+
+
+_precomputer: Optional[RecommendationPrecomputer] = None
+
+
+def get_recommendation_precomputer() -> RecommendationPrecomputer:
+    global _precomputer
+    if _precomputer is None:
+        _precomputer = RecommendationPrecomputer()
+    return _precomputer
+
+
+def schedule_recommendations(user_id: str, generated_by: str, force: bool = False) -> bool:
+    return get_recommendation_precomputer().schedule(user_id, generated_by, force=force)
+
+
+def schedule_page_recommendations(user_ids: List[str]) -> None:
+    """Alert cron hook: refresh the stale sets among a finished page of users."""
+    precomputer = get_recommendation_precomputer()
+    for user_id in user_ids:
+        precomputer.schedule(user_id, "cron")
+
+
+def recommendation_precompute_stats() -> Dict:
+    return _precomputer.stats() if _precomputer is not None else {"queued": 0, "workers": 0}
+
+
+async def stop_recommendation_precompute() -> None:
+    if _precomputer is not None:
+        await _precomputer.stop()
@@ -10,7 +10,7 @@ user-facing capability regression (decision states repeat instead of progressing
 signals mentioned in earlier turns are forgotten), not a cosmetic error.
 """
 from datetime import datetime, timezone
-from typing import Callable, Dict, List, TypeVar
+from typing import Awaitable, Callable, Dict, List, TypeVar
 
 T = TypeVar("T")
 
@@ -47,3 +47,12 @@ def safe_call(fn: Callable[[], T], fallback: T, source: str, detail: str) -> T:
     except Exception as e:
         record_degraded_call(source, detail, e)
         return fallback
+
+
+async def safe_call_async(fn: Callable[[], Awaitable[T]], fallback: T, source: str, detail: str) -> T:
+    """safe_call for awaitables — e.g. a run_db() call that can time out."""
+    try:
+        return await fn()
+    except Exception as e:
+        record_degraded_call(source, detail, e)
+        return fallback
@@ -0,0 +1,60 @@
+from typing import Dict, List, Tuple
+
+from app.agents.llm_call.provider import generate_json
+from app.services.session_signal.signal_detector import (
+    _SIGNAL_DEFINITIONS,
+    empty_signals,
+    format_conversation,
+    parse_signals,
+)
+from app.services.session_intent.intent_detector import (
+    _INTENT_DIMENSIONS,
+    DEFAULT_INTENT,
+    parse_intent,
+)
+
+# One call that does the work of signal detection, the all-clear fallback and
+# intent detection. The transcript is sent once instead of two or three times.
+_FUSED_PROMPT = """\
+Role: You are an expert Hair Health Analyst and conversation analyst for a hair care concierge service.
+
+Analyse the conversation below and answer two questions in a single JSON object.
+
+PART 1 — Hair health Signals
+Identify ALL Signals that apply. Multiple signals can be active at the same time.
+Be generous in your interpretation — users describe symptoms in casual, everyday language, not clinical terms.
+If nothing matches the definitions directly, reason about what the user's situation *implies* about their hair or scalp health and flag a signal only if there is a clear path from what they said to what it describes. Set fallback_used to true only when a signal was inferred this way. If nothing can be reasonably inferred, set all signals to false and give a low confidence_score.
+
+Signal Definitions:
+
+""" + _SIGNAL_DEFINITIONS + """
+PART 2 — Engagement state
+Classify the user's current engagement state across five dimensions.
+Be honest — if signals are mixed or unclear, reflect that in lower clarity scores.
+
+""" + _INTENT_DIMENSIONS + """
+Return a JSON object with keys:
+  absorption_blocked, hold_loss, breakage_active, buildup_present, coated_feel, scalp_sensitivity (booleans),
+  confidence_score (0.0-1.0, how sure you are of the signals), evidence_quote (the user's words that support them),
+  fallback_used (boolean),
+  journey_state, intent_clarity, confidence_level, friction_score, emotional_state, reasoning.
+
+Conversation:
+{conversation}"""
+
+
+async def detect_signals_and_intent(messages: List[Dict[str, str]]) -> Tuple[Dict, Dict]:
+    """Returns (signals, intent) in the same shapes as detect_signals / detect_intent."""
+    conversation = format_conversation(messages)
+    print(f"[FusedDetector] Conversation sent:\n{conversation}\n")
+
+    try:
+        result = await generate_json(_FUSED_PROMPT.format(conversation=conversation))
+        print(f"[FusedDetector] Raw response: {result}")
+        signals = parse_signals(result)
+        signals["fallback_used"] = bool(result.get("fallback_used", False))
+        return signals, parse_intent(result)
+
+    except Exception as e:
+        print(f"[FusedDetector] Error: {e}")
+        return empty_signals(), dict(DEFAULT_INTENT)
@@ -0,0 +1,255 @@
+"""
+Local-first signal and intent classifier.
+
+The signal definitions and intent taxonomy already carry dozens of labelled
+example phrases. This module turns them into an exemplar index and scores a
+turn against it on the CPU, with no provider round trip:
+
+  score(label) = max over the label's exemplars of the IDF-weighted share of
+                 the exemplar's (stemmed) words that appear in the user's text
+
+i.e. a nearest-neighbour match on phrase coverage. Signals are multi-label
+(every signal scoring >= 0.5 is active); each intent dimension takes its
+best-scoring value, with a neutral default for dimensions nothing matched.
+
+Confidence is the margin from the decision boundary — the weakest active
+score and the strongest inactive one both have to be clear of 0.5. A phrase
+listed under two signals ("scalp is itchy" is both buildup and sensitivity)
+can't say which one applies, so it activates neither: it's explained when one
+of its signals is active on evidence of its own, and otherwise it counts as a
+full-strength inactive score, which sends the turn to the LLM. It's
+reported in the usual confidence_score field. Turns below
+LOCAL_CLASSIFIER_MIN_CONFIDENCE escalate to the LLM detectors (see
+session_classification_service), as does an all-clear turn: inferring a
+signal the user never named is the LLM fallback's job, not a lookup's.
+
+Env:
+  LOCAL_CLASSIFIER_MIN_CONFIDENCE  answer locally at or above this (default 0.6)
+"""
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from app.services.session_signal.signal_detector import _SIGNAL_DEFINITIONS, SIGNAL_NAMES
+from app.services.session_intent.intent_detector import _INTENT_DIMENSIONS, DEFAULT_INTENT
+
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+
+ACTIVE_THRESHOLD = 0.5
+
+# Value a dimension falls back to when no exemplar matches at all — the
+# "nothing notable" end of each scale. journey_state has no such value.
+_NEUTRAL_INTENT = {
+    "intent_clarity":   "medium",
+    "confidence_level": "unsure",
+    "friction_score":   "low",
+    "emotional_state":  "neutral",
+}
+
+_STOPWORDS = frozenset(
+    "a an the my i i'm im me is are am was be been it its it's this that these those to of and or "
+    "in on at for with as by so just very really even when what how do does did have has had "
+    "get got about from than then there their they them you your we our e g".split()
+)
+_WORD = re.compile(r"[a-z0-9']+")
+_QUOTED = re.compile(r'"([^"]+)"')
+_DIMENSION_LINE = re.compile(r"^(\w+): ")
+_VALUE_LINE = re.compile(r"^\s+- (\w+)\s*: (.*)$")
+_CLAUSE_SPLIT = re.compile(r"[,.;:]|\bOR\b|—")
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "ls":
+        word = word[:-1]  # snapp -> snap
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    text = text.lower().replace("’", "'")
+    return [_stem(w) for w in _WORD.findall(text) if w not in _STOPWORDS]
+
+
+# ---------------------------------------------------------------------------
+# Exemplars — parsed straight from the detector prompts
+# ---------------------------------------------------------------------------
+
+def signal_exemplars() -> Dict[str, List[str]]:
+    exemplars: Dict[str, List[str]] = {}
+    current = None
+    for line in _SIGNAL_DEFINITIONS.splitlines():
+        head = line.split(":", 1)[0]
+        if head in SIGNAL_NAMES:
+            current = head
+            exemplars[current] = []
+        elif current and line.strip().startswith("Example phrases:"):
+            exemplars[current].extend(_QUOTED.findall(line))
+    return exemplars
+
+
+def intent_exemplars() -> Dict[str, Dict[str, List[str]]]:
+    """dimension -> value -> phrases (quoted examples plus description clauses)."""
+    exemplars: Dict[str, Dict[str, List[str]]] = {}
+    dimension = None
+    for line in _INTENT_DIMENSIONS.splitlines():
+        value_match = _VALUE_LINE.match(line)
+        if value_match and dimension:
+            value, text = value_match.groups()
+            phrases = _QUOTED.findall(text)
+            phrases += [c.strip() for c in _CLAUSE_SPLIT.split(_QUOTED.sub("", text)) if tokenize(c)]
+            exemplars[dimension][value] = phrases
+            continue
+        dimension_match = _DIMENSION_LINE.match(line)
+        if dimension_match and dimension_match.group(1) in DEFAULT_INTENT:
+            dimension = dimension_match.group(1)
+            exemplars[dimension] = {}
+    return exemplars
+
+
+class ExemplarIndex:
+    def __init__(self, labelled: Dict[str, List[str]], idf: Dict[str, float]):
+        self.exemplars: Dict[str, List[Tuple[str, List[str]]]] = {
+            label: [(p, tokens) for p in phrases if (tokens := sorted(set(tokenize(p))))]
+            for label, phrases in labelled.items()
+        }
+        # Words shared by several labels ("hair", "scalp", "curl") say little
+        # about which label applies — weight by IDF over how many labels use them
+        spread: Dict[str, int] = {}
+        for exemplars in self.exemplars.values():
+            for token in {t for _, tokens in exemplars for t in tokens}:
+                spread[token] = spread.get(token, 0) + 1
+        self.weights = {t: idf.get(t, 1.0) / n for t, n in spread.items()}
+        owners: Dict[Tuple[str, ...], set] = {}
+        for label, exemplars in self.exemplars.items():
+            for _, tokens in exemplars:
+                owners.setdefault(tuple(tokens), set()).add(label)
+        self.shared = {tokens: labels for tokens, labels in owners.items() if len(labels) > 1}
+
+    def shared_by(self, phrase: str) -> set:
+        """Labels that list this phrase (or one with the same words), if more than one does."""
+        return self.shared.get(tuple(sorted(set(tokenize(phrase)))), set())
+
+    def _coverage(self, tokens: List[str], present: set) -> float:
+        total = sum(self.weights[t] for t in tokens)
+        hit = sum(self.weights[t] for t in tokens if t in present)
+        return hit / total if total else 0.0
+
+    def scores(self, text: str, distinct: bool = False) -> Dict[str, Tuple[float, str]]:
+        """label -> (best coverage, nearest exemplar); `distinct` skips shared exemplars."""
+        present = set(tokenize(text))
+        result = {}
+        for label, exemplars in self.exemplars.items():
+            best, nearest = 0.0, ""
+            for phrase, tokens in exemplars:
+                if distinct and tuple(tokens) in self.shared:
+                    continue
+                score = self._coverage(tokens, present)
+                if score > best:
+                    best, nearest = score, phrase
+            result[label] = (best, nearest)
+        return result
+
+
+@lru_cache(maxsize=1)
+def _indexes() -> Tuple[ExemplarIndex, Dict[str, ExemplarIndex]]:
+    signals = signal_exemplars()
+    intents = intent_exemplars()
+    docs = [p for phrases in signals.values() for p in phrases]
+    docs += [p for values in intents.values() for phrases in values.values() for p in phrases]
+    df: Dict[str, int] = {}
+    for doc in docs:
+        for token in set(tokenize(doc)):
+            df[token] = df.get(token, 0) + 1
+    idf = {t: math.log((len(docs) + 1) / (n + 1)) + 1 for t, n in df.items()}
+    return ExemplarIndex(signals, idf), {d: ExemplarIndex(v, idf) for d, v in intents.items()}
+
+
+def _margin(active: List[float], inactive: List[float]) -> float:
+    """How far the scores sit from the 0.5 boundary, mapped to 0..1."""
+    weakest_in = min(active) if active else 1.0
+    strongest_out = max(inactive) if inactive else 0.0
+    return round(min(weakest_in, 1.0 - strongest_out), 3)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def _user_text(messages: List[Dict[str, str]]) -> str:
+    return " ".join(
+        m.get("content") or m.get("message", "")
+        for m in messages
+        if m.get("role", "user") == "user"
+    )
+
+
+def classify_signals(messages: List[Dict[str, str]]) -> Dict:
+    """Same shape as detect_signals, plus "local_confident"."""
+    signal_index, _ = _indexes()
+    text = _user_text(messages)
+    scores = signal_index.scores(text, distinct=True)
+
+    active = {k: s for k, (s, _) in scores.items() if s >= ACTIVE_THRESHOLD}
+    inactive = []
+    for k, (s, phrase) in signal_index.scores(text).items():
+        if k in active:
+            continue
+        # A shared phrase an active signal accounts for says nothing more about this one
+        explained = signal_index.shared_by(phrase) & active.keys()
+        inactive.append(scores[k][0] if explained else s)
+    confidence = _margin(list(active.values()), inactive) if active else 0.0
+
+    signals = {k: k in active for k in SIGNAL_NAMES}
+    signals["confidence_score"] = confidence
+    signals["evidence_quote"] = "; ".join(scores[k][1] for k in active)
+    signals["fallback_used"] = False
+    signals["local_confident"] = bool(active) and confidence >= LOCAL_CLASSIFIER_MIN_CONFIDENCE
+    return signals
+
+
+def classify_intent(messages: List[Dict[str, str]], problem_described: bool = False) -> Dict:
+    """
+    Same shape as detect_intent, plus "confidence_score" and "local_confident".
+    `problem_described` — the turn confidently names a hair concern, which is
+    the taxonomy's definition of diagnosing when no other journey state matches.
+    """
+    _, intent_indexes = _indexes()
+    text = _user_text(messages)
+
+    intent: Dict = {}
+    margins = []
+    for dimension, index in intent_indexes.items():
+        ranked = sorted(((s, v) for v, (s, _) in index.scores(text).items()), reverse=True)
+        top_score, top_value = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+
+        if top_score >= ACTIVE_THRESHOLD:
+            intent[dimension] = top_value
+            margins.append(_margin([top_score], [runner_up]))
+        elif dimension == "journey_state" and problem_described:
+            intent[dimension] = "diagnosing"
+            margins.append(_margin([], [top_score]))
+        elif dimension in _NEUTRAL_INTENT:
+            intent[dimension] = _NEUTRAL_INTENT[dimension]
+            margins.append(_margin([], [top_score]))
+        else:
+            intent[dimension] = DEFAULT_INTENT[dimension]
+            margins.append(0.0)
+
+    confidence = min(margins) if margins else 0.0
+    intent["reasoning"] = "local exemplar match"
+    intent["confidence_score"] = confidence
+    intent["local_confident"] = confidence >= LOCAL_CLASSIFIER_MIN_CONFIDENCE
+    return intent
+
+
+def classify_local(messages: List[Dict[str, str]]) -> Tuple[Dict, Dict]:
+    """Returns (signals, intent); check each one's "local_confident" before trusting it."""
+    signals = classify_signals(messages)
+    intent = classify_intent(messages, problem_described=signals["local_confident"])
+    return signals, intent
@@ -0,0 +1,74 @@
+import asyncio
+import os
+from typing import Dict, List, Tuple
+
+from app.services.decision_state.models import SessionIntent
+from app.services.session_classification.fused_detector import detect_signals_and_intent
+from app.services.session_classification.local_classifier import classify_local
+from app.services.session_intent.intent_detector import detect_intent
+from app.services.session_intent.session_intent_service import build_session_intent, process_session_intent
+from app.services.session_signal.session_signal_service import merge_session_signals, process_session_signals
+from app.services.session_signal.signal_detector import detect_signals
+
+# "split" — separate signal and intent calls (plus the all-clear fallback call)
+# "fused" — one structured call for both; same outputs, roughly half the input tokens
+# "local" — local exemplar classifier first; only the unsure half goes to the LLM
+SESSION_CLASSIFIER_MODE = os.getenv("SESSION_CLASSIFIER_MODE", "split").lower()
+
+_cascade_stats = {"turns": 0, "local": 0, "signals_escalated": 0, "intent_escalated": 0}
+
+
+async def process_session_classification(
+    user_id: str,
+    session_id: str,
+    messages: List[Dict[str, str]],
+    window_size: int = 10,
+    mode: str | None = None,
+) -> Tuple[Dict[str, bool], SessionIntent]:
+    """Returns (signal_snapshot, session_intent) for the decision engine."""
+    mode = mode or SESSION_CLASSIFIER_MODE
+    if mode == "local":
+        detected, intent = await classify_with_cascade(messages[-window_size:])
+        return await merge_session_signals(user_id, session_id, detected), build_session_intent(intent)
+
+    if mode != "fused":
+        signal_snapshot, session_intent = await asyncio.gather(
+            process_session_signals(user_id, session_id, messages),
+            process_session_intent(messages, window_size=window_size),
+        )
+        return signal_snapshot, session_intent
+
+    detected, intent = await detect_signals_and_intent(messages[-window_size:])
+    return await merge_session_signals(user_id, session_id, detected), build_session_intent(intent)
+
+
+async def classify_with_cascade(messages: List[Dict[str, str]]) -> Tuple[Dict, Dict]:
+    """
+    Local classifier first. Whatever it isn't confident about is escalated:
+    one half alone goes to its own detector, both together to the fused call.
+    """
+    signals, intent = classify_local(messages)
+    signals_ok = signals.pop("local_confident")
+    intent_ok = intent.pop("local_confident")
+
+    _cascade_stats["turns"] += 1
+    _cascade_stats["signals_escalated"] += not signals_ok
+    _cascade_stats["intent_escalated"] += not intent_ok
+    print(
+        f"[Classifier] local signals={'ok' if signals_ok else 'escalate'} ({signals['confidence_score']}) "
+        f"intent={'ok' if intent_ok else 'escalate'} ({intent['confidence_score']})"
+    )
+
+    if signals_ok and intent_ok:
+        _cascade_stats["local"] += 1
+        return signals, intent
+    if not signals_ok and not intent_ok:
+        return await detect_signals_and_intent(messages)
+    if not signals_ok:
+        return await detect_signals(messages), intent
+    return signals, await detect_intent(messages)
+
+
+def cascade_stats() -> Dict:
+    turns = _cascade_stats["turns"]
+    return {**_cascade_stats, "local_rate": round(_cascade_stats["local"] / turns, 3) if turns else 0.0}
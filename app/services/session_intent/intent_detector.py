@@ -1,15 +1,9 @@
 from typing import List, Dict
 
 from app.agents.llm_call.provider import generate_json
+from app.services.session_signal.signal_detector import format_conversation
 
-_DETECTION_PROMPT = """\
-Role: You are an expert conversation analyst for a hair care concierge service.
-
-Analyse the conversation below and classify the user's current engagement state across five dimensions.
-Be honest — if signals are mixed or unclear, reflect that in lower clarity scores.
-
-Dimensions to detect:
-
+_INTENT_DIMENSIONS = """\
 journey_state: Where is the user in their journey?
   - discovering    : Exploring broadly, no specific concern yet. "I want to learn more about my hair."
   - diagnosing     : Describing a specific problem, seeking root cause. "My hair keeps breaking off."
@@ -39,39 +33,47 @@ emotional_state: What is the user's predominant emotional tone?
   - hopeful    : Optimistic, looking for a solution they believe exists
   - neutral    : Matter-of-fact, no strong emotional signal
   - fatigued   : Tired of trying, low energy, resigned tone
+"""
+
+_DETECTION_PROMPT = """\
+Role: You are an expert conversation analyst for a hair care concierge service.
+
+Analyse the conversation below and classify the user's current engagement state across five dimensions.
+Be honest — if signals are mixed or unclear, reflect that in lower clarity scores.
+
+Dimensions to detect:
 
+""" + _INTENT_DIMENSIONS + """
 Return a JSON object with keys: journey_state, intent_clarity, confidence_level, friction_score, emotional_state, reasoning.
 
 Conversation:
 {conversation}"""
 
 
+DEFAULT_INTENT = {
+    "journey_state":    "discovering",
+    "intent_clarity":   "low",
+    "confidence_level": "unsure",
+    "friction_score":   "low",
+    "emotional_state":  "neutral",
+    "reasoning":        "",
+}
+
+
+def parse_intent(result: Dict) -> Dict:
+    # A null or empty dimension falls back like a missing one
+    return {k: result.get(k) or default for k, default in DEFAULT_INTENT.items()}
+
+
 async def detect_intent(messages: List[Dict[str, str]]) -> Dict:
-    conversation = "\n".join(
-        f"{m.get('role', 'user').upper()}: {m.get('content') or m.get('message', '')}"
-        for m in messages
-    )
+    conversation = format_conversation(messages)
     print(f"[IntentDetector] Conversation sent:\n{conversation}\n")
 
     try:
         result = await generate_json(_DETECTION_PROMPT.format(conversation=conversation))
         print(f"[IntentDetector] Raw response: {result}")
-        return {
-            "journey_state":    result.get("journey_state", "discovering"),
-            "intent_clarity":   result.get("intent_clarity", "low"),
-            "confidence_level": result.get("confidence_level", "unsure"),
-            "friction_score":   result.get("friction_score", "low"),
-            "emotional_state":  result.get("emotional_state", "neutral"),
-            "reasoning":        result.get("reasoning", ""),
-        }
+        return parse_intent(result)
 
     except Exception as e:
         print(f"[IntentDetector] Error: {e}")
-        return {
-            "journey_state":    "discovering",
-            "intent_clarity":   "low",
-            "confidence_level": "unsure",
-            "friction_score":   "low",
-            "emotional_state":  "neutral",
-            "reasoning":        "",
-        }
+        return dict(DEFAULT_INTENT)
@@ -10,6 +10,10 @@ async def process_session_intent(
 ) -> SessionIntent:
     window = messages[-window_size:]
     result = await detect_intent(window)
+    return build_session_intent(result)
+
+
+def build_session_intent(result: Dict) -> SessionIntent:
     return SessionIntent(
         journey_state=result["journey_state"],
         intent_clarity=result["intent_clarity"],
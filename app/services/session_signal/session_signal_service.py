@@ -2,6 +2,8 @@ from typing import Dict, List
 
 from app.services.session_signal.signal_detector import detect_signals, SIGNAL_NAMES
 from app.services.session_signal.signal_state import log_new_signals, get_session_snapshot
+from app.services.async_db import run_db
+from app.services.resilience import safe_call_async
 
 
 async def process_session_signals(
@@ -13,13 +15,29 @@ async def process_session_signals(
     # log_new_signals is additive: it only persists signals not already on record
     window = messages[-10:]
     detected = await detect_signals(window)
-    log_new_signals(user_id, session_id, detected)
+    return await merge_session_signals(user_id, session_id, detected)
+
+
+async def merge_session_signals(user_id: str, session_id: str, detected: Dict) -> Dict[str, bool]:
+    """Persist this turn's signals and return the session-wide snapshot."""
+    # signal_state degrades Supabase errors itself; a pool timeout degrades the same way
+    await safe_call_async(
+        lambda: run_db(log_new_signals, user_id, session_id, detected),
+        fallback=[],
+        source="session_signal_service.merge_session_signals",
+        detail=f"Timed out persisting signals for session={session_id!r}.",
+    )
 
     # Snapshot merges everything logged so far in this session. If Supabase is
     # unreachable, get_session_snapshot degrades to all-False (see signal_state.py) —
     # OR in this turn's freshly detected signals as a floor, so an outage costs only
     # memory of past turns, not the current message too.
-    snapshot = get_session_snapshot(session_id)
+    snapshot = await safe_call_async(
+        lambda: run_db(get_session_snapshot, session_id),
+        fallback={k: False for k in SIGNAL_NAMES},
+        source="session_signal_service.merge_session_signals",
+        detail=f"Timed out reading prior signals for session={session_id!r}.",
+    )
     for k in SIGNAL_NAMES:
         if detected.get(k):
             snapshot[k] = True
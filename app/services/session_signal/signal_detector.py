@@ -11,15 +11,7 @@ SIGNAL_NAMES = [
     "scalp_sensitivity",
 ]
 
-_DETECTION_PROMPT = """\
-Role: You are an expert Hair Health Analyst. Your goal is to map user complaints to specific hair health "Signals" with high precision.
-
-Detection Instructions:
-Analyze the conversation and identify ALL Signals that apply. Multiple signals can be active at the same time. If the user's description is vague or doesn't fit any signal, set all to false.
-Be generous in your interpretation — users describe symptoms in casual, everyday language, not clinical terms.
-
-Signal Definitions:
-
+_SIGNAL_DEFINITIONS = """\
 absorption_blocked: Products physically sit on the hair surface and cannot penetrate — the hair actively repels moisture or product despite being clean. Flag when the user has tried products and they are not working, regardless of whether they name the mechanism.
   Example phrases: "nothing absorbs", "products just sit on top", "my hair won't drink anything", "repelling moisture", "hydration won't penetrate", "dry after washing and conditioning even with heavy products", "nothing seems to work no matter what I apply", "curls never feel fully clean after cleansing", "moisture just bounces off", "I've tried everything and nothing works", "tried curl creams and leave-ins but still dry", "doesn't stay moisturised no matter what I use", "brittle even after conditioning"
   DO NOT flag for: general dryness the user attributes to climate, heat, or AC — only dismiss when the user explicitly names an external cause. If they have tried multiple products with no result, flag it.
@@ -39,7 +31,18 @@ coated_feel: A waxy, plastic-like, or "filmy" texture on the strand, often from
 
 scalp_sensitivity: Scalp is irritated, itchy, tender, flaky, or reactive — due to sensitivity, dryness, or an adverse reaction to a product, NOT from product buildup. Focuses on scalp comfort and barrier health rather than buildup removal.
   Example phrases: "my scalp is itchy", "flaky scalp", "scalp irritation", "scalp is sensitive", "scalp hurts", "tender scalp after styling", "scalp reacts to products", "my child has a sensitive scalp", "scalp dryness", "scalp is inflamed", "scalp burns", "scalp feels sore", "dandruff", "itchy after washing", "scalp feels irritated by my conditioner"
+"""
+
+_DETECTION_PROMPT = """\
+Role: You are an expert Hair Health Analyst. Your goal is to map user complaints to specific hair health "Signals" with high precision.
+
+Detection Instructions:
+Analyze the conversation and identify ALL Signals that apply. Multiple signals can be active at the same time. If the user's description is vague or doesn't fit any signal, set all to false.
+Be generous in your interpretation — users describe symptoms in casual, everyday language, not clinical terms.
+
+Signal Definitions:
 
+""" + _SIGNAL_DEFINITIONS + """
 Conversation:
 {conversation}"""
 
@@ -79,20 +82,32 @@ def _all_clear(signals: Dict) -> bool:
     return not any(signals.get(k, False) for k in SIGNAL_NAMES)
 
 
+def format_conversation(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(
+        f"{m.get('role', 'user').upper()}: {m.get('content') or m.get('message', '')}"
+        for m in messages
+    )
+
+
+def parse_signals(result: Dict) -> Dict:
+    signals = {k: bool(result.get(k, False)) for k in SIGNAL_NAMES}
+    signals["confidence_score"] = result.get("confidence_score") or 0.0
+    signals["evidence_quote"] = result.get("evidence_quote") or ""
+    return signals
+
+
+def empty_signals() -> Dict:
+    return {k: False for k in SIGNAL_NAMES} | {"confidence_score": 0.0, "evidence_quote": "", "fallback_used": False}
+
+
 async def _run_detection(prompt: str, label: str) -> Dict:
     result = await generate_json(prompt)
     print(f"[SignalDetector][{label}] Raw response: {result}")
-    signals = {k: bool(result.get(k, False)) for k in SIGNAL_NAMES}
-    signals["confidence_score"] = result.get("confidence_score", 0.0)
-    signals["evidence_quote"] = result.get("evidence_quote", "")
-    return signals
+    return parse_signals(result)
 
 
 async def detect_signals(messages: List[Dict[str, str]]) -> Dict[str, bool]:
-    conversation = "\n".join(
-        f"{m.get('role', 'user').upper()}: {m.get('content') or m.get('message', '')}"
-        for m in messages
-    )
+    conversation = format_conversation(messages)
     print(f"[SignalDetector] Conversation sent:\n{conversation}\n")
 
     try:
@@ -109,4 +124,4 @@ async def detect_signals(messages: List[Dict[str, str]]) -> Dict[str, bool]:
 
     except Exception as e:
         print(f"[SignalDetector] Error: {e}")
-        return {k: False for k in SIGNAL_NAMES} | {"confidence_score": 0.0, "evidence_quote": "", "fallback_used": False}
+        return empty_signals()
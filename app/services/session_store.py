@@ -0,0 +1,525 @@
+"""
+Bounded per-session state for the chat endpoints.
+
+Chat history, Librarian context and the web chat's transient profile used to
+live in plain module dicts that were only cleared on /api/event or an
+explicit DELETE, so memory grew with every session the process had ever
+seen. A SessionStore bounds that state:
+
+  - per-entry TTL, refreshed on every read or write (idle sessions expire)
+  - an entry cap and an approximate byte cap, evicting least-recently-used
+  - a per-session message cap for list values (oldest messages dropped)
+  - eviction counters, exposed through stats() / session_store_stats()
+
+    _chat_history = SessionStore("chat_history", max_messages=SESSION_MAX_MESSAGES)
+    _chat_history.append(session_id, {"role": "user", "message": text})
+    history = _chat_history.history(session_id, limit=10)
+
+Values are copied in and out, so callers that mutate what they read must
+write it back with set() — inside `async with store.lock(session_id)` if
+another request for the same session could be doing the same.
+
+Request handlers use the async twins (aget / aset / aappend / ahistory /
+adelete / acontains). With the sqlite backend these run on one dedicated
+thread per process, so waiting on another worker's write lock never stalls
+the event loop; with the memory backend they run inline.
+
+Backends:
+  memory  — per-process OrderedDict (default). Fine for a single worker.
+  sqlite  — one WAL-mode file shared by every worker on the host, so any
+            worker can serve any session without sticky routing. append()
+            is a single transaction; lock() takes a per-session lease row
+            that other workers wait on. The entry/byte caps are enforced
+            every SESSION_CAP_INTERVAL_SECS rather than on each write.
+
+Env:
+  SESSION_STORE_BACKEND     memory | sqlite                     (default memory)
+  SESSION_STORE_PATH        sqlite file  (default <tmp>/concierge_sessions.sqlite3)
+  SESSION_TTL_SECS          idle time before a session expires  (default 7200)
+  SESSION_MAX_ENTRIES       sessions kept per store             (default 10000)
+  SESSION_MAX_MB            approximate size cap per store      (default 64)
+  SESSION_MAX_MESSAGES      messages kept per session history   (default 50)
+  SESSION_LOCK_TIMEOUT_SECS wait for a session lock before giving up (default 10)
+  SESSION_BUSY_TIMEOUT_SECS sqlite wait for another worker's write lock (default 2)
+  SESSION_CAP_INTERVAL_SECS sqlite cap enforcement interval     (default 30)
+"""
+import asyncio
+import copy
+import functools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+SESSION_STORE_BACKEND     = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+SESSION_STORE_PATH        = os.getenv(
+    "SESSION_STORE_PATH", os.path.join(tempfile.gettempdir(), "concierge_sessions.sqlite3")
+)
+SESSION_TTL_SECS          = float(os.getenv("SESSION_TTL_SECS",          "7200"))
+SESSION_MAX_ENTRIES       = int(os.getenv("SESSION_MAX_ENTRIES",         "10000"))
+SESSION_MAX_MB            = float(os.getenv("SESSION_MAX_MB",            "64"))
+SESSION_MAX_MESSAGES      = int(os.getenv("SESSION_MAX_MESSAGES",        "50"))
+SESSION_LOCK_TIMEOUT_SECS = float(os.getenv("SESSION_LOCK_TIMEOUT_SECS", "10"))
+SESSION_BUSY_TIMEOUT_SECS = float(os.getenv("SESSION_BUSY_TIMEOUT_SECS", "2"))
+SESSION_CAP_INTERVAL_SECS = float(os.getenv("SESSION_CAP_INTERVAL_SECS", "30"))
+
+_LOCK_LEASE_SECS = 30.0   # a crashed worker's lock frees itself after this
+_LOCK_POLL_SECS  = 0.02
+
+_stores: Dict[str, "SessionStore"] = {}
+
+_sqlite_executor: Optional[ThreadPoolExecutor] = None
+_sqlite_executor_pid = None
+
+
+def _get_sqlite_executor() -> ThreadPoolExecutor:
+    """One thread per process for every sqlite session call; re-created after fork."""
+    global _sqlite_executor, _sqlite_executor_pid
+    if _sqlite_executor is None or _sqlite_executor_pid != os.getpid():
+        _sqlite_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-sqlite")
+        _sqlite_executor_pid = os.getpid()
+    return _sqlite_executor
+
+
+def _approx_size(value: Any) -> int:
+    return len(json.dumps(value, default=str))
+
+
+def _trim(items: List, max_messages: Optional[int]) -> int:
+    """Drop the oldest items beyond max_messages in place; returns how many."""
+    if not max_messages or len(items) <= max_messages:
+        return 0
+    overflow = len(items) - max_messages
+    del items[:overflow]
+    return overflow
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class MemorySessionBackend:
+    def __init__(self, ttl_secs: float, max_entries: int, max_bytes: int):
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = {"expired": 0, "lru": 0, "trimmed_messages": 0}
+
+    # -- internals (call with the lock held) --------------------------------
+
+    def _live(self, session_id: str) -> Optional[_Entry]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        now = time.time()
+        if entry.expires_at < now:
+            self._drop(session_id)
+            self.evictions["expired"] += 1
+            return None
+        entry.expires_at = now + self.ttl_secs
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _enforce_caps(self) -> None:
+        now = time.time()
+        # TTL is sliding and uniform, so LRU order is also expiry order
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if oldest.expires_at < now:
+                self._drop(oldest_id)
+                self.evictions["expired"] += 1
+            elif len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(oldest_id)
+                self.evictions["lru"] += 1
+            else:
+                break
+
+    def _store(self, session_id: str, value: Any, size: int) -> None:
+        self._drop(session_id)
+        self._entries[session_id] = _Entry(value, size, time.time() + self.ttl_secs)
+        self._bytes += size
+        self._enforce_caps()
+
+    # -- backend API ---------------------------------------------------------
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(session_id)
+            return None if entry is None else copy.deepcopy(entry.value)
+
+    def set(self, session_id: str, value: Any) -> None:
+        with self._lock:
+            self._store(session_id, copy.deepcopy(value), _approx_size(value))
+
+    def append(self, session_id: str, item: Any, max_messages: Optional[int]) -> None:
+        with self._lock:
+            entry = self._live(session_id)
+            items = entry.value if entry is not None else []
+            items.append(copy.deepcopy(item))
+            self.evictions["trimmed_messages"] += _trim(items, max_messages)
+            self._store(session_id, items, _approx_size(items))
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._drop(session_id)
+
+    def contains(self, session_id: str) -> bool:
+        with self._lock:
+            return self._live(session_id) is not None
+
+    def count(self) -> int:
+        return len(self._entries)
+
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+class SQLiteSessionBackend:
+    """
+    Shared across processes through one WAL-mode file. Every operation is its
+    own short transaction; eviction counters are per process. Calls block, so
+    async code reaches them through SessionStore's async methods.
+
+    Counting the store for the caps is O(n), so it runs at most once every
+    `cap_interval_secs` per process; between passes the store can run over
+    its caps by that interval's writes. Reads still honour each row's TTL.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        store: str,
+        ttl_secs: float,
+        max_entries: int,
+        max_bytes: int,
+        cap_interval_secs: float = SESSION_CAP_INTERVAL_SECS,
+    ):
+        self.path = path
+        self.store = store
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cap_interval_secs = cap_interval_secs
+        self.busy_timeout_secs = SESSION_BUSY_TIMEOUT_SECS
+        self.evictions = {"expired": 0, "lru": 0, "trimmed_messages": 0}
+        self._caps_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Re-open after fork — a connection must never cross processes
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout_secs, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "  store TEXT NOT NULL,"
+                "  session_id TEXT NOT NULL,"
+                "  value TEXT NOT NULL,"
+                "  size INTEGER NOT NULL,"
+                "  expires_at REAL NOT NULL,"
+                "  PRIMARY KEY (store, session_id)"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions (store, expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_locks ("
+                "  store TEXT NOT NULL,"
+                "  session_id TEXT NOT NULL,"
+                "  owner TEXT NOT NULL,"
+                "  expires_at REAL NOT NULL,"
+                "  PRIMARY KEY (store, session_id)"
+                ")"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _read_live(self, conn: sqlite3.Connection, session_id: str) -> Optional[str]:
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM sessions WHERE store = ? AND session_id = ?",
+            (self.store, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM sessions WHERE store = ? AND session_id = ?", (self.store, session_id))
+            self.evictions["expired"] += 1
+            return None
+        conn.execute(
+            "UPDATE sessions SET expires_at = ? WHERE store = ? AND session_id = ?",
+            (now + self.ttl_secs, self.store, session_id),
+        )
+        return value
+
+    def _write(self, conn: sqlite3.Connection, session_id: str, raw: str) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (store, session_id, value, size, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (self.store, session_id, raw, len(raw), time.time() + self.ttl_secs),
+        )
+        now = time.monotonic()
+        if now - self._caps_checked_at >= self.cap_interval_secs:
+            self._caps_checked_at = now
+            self._enforce_caps(conn)
+
+    def _enforce_caps(self, conn: sqlite3.Connection) -> None:
+        expired = conn.execute(
+            "DELETE FROM sessions WHERE store = ? AND expires_at < ?", (self.store, time.time())
+        ).rowcount
+        self.evictions["expired"] += max(expired, 0)
+
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions WHERE store = ?", (self.store,)
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from the least recently used until both caps are met
+        evict = []
+        for session_id, size in conn.execute(
+            "SELECT session_id, size FROM sessions WHERE store = ? ORDER BY expires_at ASC", (self.store,)
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append((self.store, session_id))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM sessions WHERE store = ? AND session_id = ?", evict)
+        self.evictions["lru"] += len(evict)
+
+    # -- backend API ---------------------------------------------------------
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connection()
+            raw = self._read_live(conn, session_id)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, session_id: str, value: Any) -> None:
+        raw = json.dumps(value, default=str)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(conn, session_id, raw)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def append(self, session_id: str, item: Any, max_messages: Optional[int]) -> None:
+        with self._lock:
+            conn = self._connection()
+            # IMMEDIATE takes the write lock up front, so concurrent appends
+            # from other workers queue instead of losing each other's message
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                raw = self._read_live(conn, session_id)
+                items = json.loads(raw) if raw is not None else []
+                items.append(item)
+                self.evictions["trimmed_messages"] += _trim(items, max_messages)
+                self._write(conn, session_id, json.dumps(items, default=str))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM sessions WHERE store = ? AND session_id = ?", (self.store, session_id)
+            )
+
+    def contains(self, session_id: str) -> bool:
+        with self._lock:
+            return self._read_live(self._connection(), session_id) is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM sessions WHERE store = ?", (self.store,)
+            ).fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COALESCE(SUM(size), 0) FROM sessions WHERE store = ?", (self.store,)
+            ).fetchone()[0]
+
+    def try_lock(self, session_id: str, owner: str) -> bool:
+        """Take the session's lease unless another owner holds an unexpired one."""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO session_locks (store, session_id, owner, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (store, session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE session_locks.expires_at < ?",
+                (self.store, session_id, owner, now + _LOCK_LEASE_SECS, now),
+            )
+            return cursor.rowcount == 1
+
+    def unlock(self, session_id: str, owner: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM session_locks WHERE store = ? AND session_id = ? AND owner = ?",
+                (self.store, session_id, owner),
+            )
+
+
+# ---------------------------------------------------------------------------
+# SessionStore — the interface the endpoints use
+# ---------------------------------------------------------------------------
+
+class SessionStore:
+    def __init__(
+        self,
+        name: str,
+        ttl_secs: float = SESSION_TTL_SECS,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        max_bytes: int = int(SESSION_MAX_MB * 1024 * 1024),
+        max_messages: Optional[int] = None,
+        backend: str = SESSION_STORE_BACKEND,
+        path: str = SESSION_STORE_PATH,
+        cap_interval_secs: float = SESSION_CAP_INTERVAL_SECS,
+    ):
+        self.name = name
+        self.max_messages = max_messages
+        if backend == "sqlite":
+            self.backend = SQLiteSessionBackend(path, name, ttl_secs, max_entries, max_bytes, cap_interval_secs)
+        else:
+            self.backend = MemorySessionBackend(ttl_secs, max_entries, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._local_locks: Dict[str, asyncio.Lock] = {}
+        self._local_waiters: Dict[str, int] = {}
+        _stores[name] = self
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        value = self.backend.get(session_id)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, session_id: str, value: Any) -> None:
+        self.backend.set(session_id, value)
+
+    def append(self, session_id: str, item: Any) -> None:
+        """Append to a list-valued session, keeping at most max_messages items."""
+        self.backend.append(session_id, item, self.max_messages)
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List:
+        items = self.get(session_id, default=[])
+        return items[-limit:] if limit else items
+
+    def delete(self, session_id: str) -> None:
+        self.backend.delete(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.backend.contains(session_id)
+
+    def __len__(self) -> int:
+        return self.backend.count()
+
+    # -- async twins for request handlers -------------------------------------
+
+    async def _call(self, fn: Callable, *args) -> Any:
+        if isinstance(self.backend, SQLiteSessionBackend):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_sqlite_executor(), functools.partial(fn, *args))
+        return fn(*args)
+
+    async def aget(self, session_id: str, default: Any = None) -> Any:
+        return await self._call(self.get, session_id, default)
+
+    async def aset(self, session_id: str, value: Any) -> None:
+        await self._call(self.set, session_id, value)
+
+    async def aappend(self, session_id: str, item: Any) -> None:
+        await self._call(self.append, session_id, item)
+
+    async def ahistory(self, session_id: str, limit: Optional[int] = None) -> List:
+        return await self._call(self.history, session_id, limit)
+
+    async def adelete(self, session_id: str) -> None:
+        await self._call(self.delete, session_id)
+
+    async def acontains(self, session_id: str) -> bool:
+        return await self._call(self.__contains__, session_id)
+
+    @asynccontextmanager
+    async def lock(self, session_id: str, timeout: float = SESSION_LOCK_TIMEOUT_SECS):
+        """
+        Serialise read-modify-write on one session. Coroutines in this process
+        queue on an asyncio.Lock; with the sqlite backend the holder also takes
+        a lease row so other workers wait too. Raises asyncio.TimeoutError if
+        the lock can't be had within `timeout`.
+        """
+        local = self._local_locks.setdefault(session_id, asyncio.Lock())
+        self._local_waiters[session_id] = self._local_waiters.get(session_id, 0) + 1
+        try:
+            await asyncio.wait_for(local.acquire(), timeout)
+            try:
+                owner = None
+                if isinstance(self.backend, SQLiteSessionBackend):
+                    owner = uuid.uuid4().hex
+                    deadline = time.monotonic() + timeout
+                    while not await self._call(self.backend.try_lock, session_id, owner):
+                        if time.monotonic() >= deadline:
+                            raise asyncio.TimeoutError(f"session {session_id!r} is locked by another worker")
+                        await asyncio.sleep(_LOCK_POLL_SECS)
+                try:
+                    yield
+                finally:
+                    if owner is not None:
+                        await self._call(self.backend.unlock, session_id, owner)
+            finally:
+                local.release()
+        finally:
+            self._local_waiters[session_id] -= 1
+            if self._local_waiters[session_id] == 0:
+                del self._local_waiters[session_id]
+                self._local_locks.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.count(),
+            "approx_bytes": self.backend.size_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": dict(self.backend.evictions),
+        }
+
+
+def session_store_stats() -> Dict[str, Dict]:
+    return {name: store.stats() for name, store in _stores.items()}
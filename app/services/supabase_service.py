@@ -5,7 +5,7 @@ Provides singleton access to Supabase client for the application
 
 import os
 from typing import Optional
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
 from pathlib import Path
@@ -14,6 +14,9 @@ from pathlib import Path
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Bounds each PostgREST round trip, so a stuck query frees its DB pool thread
+SUPABASE_HTTP_TIMEOUT_SECS = float(os.getenv("SUPABASE_HTTP_TIMEOUT_SECS", "15"))
+
 class SupabaseService:
     """
     Singleton service for Supabase database operations.
@@ -30,7 +33,12 @@ class SupabaseService:
                 "Please set SUPABASE_URL and SUPABASE_KEY in .env file"
             )
         
-        self.client: Client = create_client(supabase_url, supabase_key)
+        # One client (and one keep-alive connection pool) shared by every DB pool thread
+        self.client: Client = create_client(
+            supabase_url,
+            supabase_key,
+            options=ClientOptions(postgrest_client_timeout=SUPABASE_HTTP_TIMEOUT_SECS),
+        )
         print(f"[Supabase] Connected to {supabase_url}")
     
     def get_client(self) -> Client:
@@ -0,0 +1,61 @@
+"""
+Streaming iteration over user_metadata for batch jobs.
+
+The daily cron used to load every user row (select "*") before its loop
+started, so its memory grew with the user table. iter_user_pages() reads
+one keyset page at a time through the DB pool, projected to the columns the
+job actually uses, and fetches the next page while the caller works on the
+current one — at most two pages are held at once:
+
+    async for users, cursor in iter_user_pages(start_after=resume_cursor):
+        for user in users:
+            ...
+        checkpoint(cursor)   # resume with start_after=cursor
+
+Cursors are plain user_ids: "continue with users after this one".
+"""
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.async_db import run_db
+from app.services.db_service import CRON_USER_COLUMNS, get_db
+
+
+async def iter_user_pages(
+    page_size: Optional[int] = None,
+    start_after: Optional[str] = None,
+    columns: str = CRON_USER_COLUMNS,
+) -> AsyncIterator[Tuple[List[Dict], str]]:
+    """
+    Yield (users, cursor) pages in user_id order, starting after `start_after`.
+
+    `cursor` is the last user_id of the page; passing it back as start_after
+    resumes with the next page. Page read errors propagate so the caller can
+    stop and keep its last checkpoint.
+    """
+    db = get_db()
+
+    def fetch(after: Optional[str]) -> asyncio.Future:
+        return asyncio.ensure_future(run_db(db.get_users_page, page_size, after, columns))
+
+    pending: Optional[asyncio.Future] = fetch(start_after)
+    try:
+        while pending is not None:
+            users, next_cursor = await pending
+            pending = fetch(next_cursor) if next_cursor else None
+            if users:
+                yield users, users[-1]["user_id"]
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def iter_users(
+    page_size: Optional[int] = None,
+    start_after: Optional[str] = None,
+    columns: str = CRON_USER_COLUMNS,
+) -> AsyncIterator[Dict]:
+    """Flattened iter_user_pages(): one user row at a time."""
+    async for users, _ in iter_user_pages(page_size, start_after, columns):
+        for user in users:
+            yield user
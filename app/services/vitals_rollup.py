@@ -0,0 +1,149 @@
+"""
+Consistency check for the user_vitals_latest rollup.
+
+sql/create_user_vitals_latest.sql keeps one row per (user, category) current
+from triggers on hair_events. This tool recomputes those rows from the raw
+events and reports any user whose rollup has drifted (a missed backfill, a
+trigger dropped during a schema change, rows edited by hand):
+
+    python -m app.services.vitals_rollup --check                  # every user
+    python -m app.services.vitals_rollup --check --user u1 --user u2
+    python -m app.services.vitals_rollup --check --repair         # rebuild drifted users
+
+--repair calls rebuild_user_vitals_latest(user_id), the same function the
+migration's update/delete trigger uses.
+"""
+import argparse
+from typing import Dict, Iterable, List, Optional
+
+from app.services.db_service import get_db
+from app.services.supabase_service import get_supabase
+
+ROLLUP_COLUMNS = "user_id, category, latest_score, history, score_sum, score_count"
+_EVENT_COLUMNS = "id, primary_label, vital_score, created_at"
+_PAGE_SIZE = 1000
+
+
+def rollup_from_events(rows: Iterable[Dict]) -> Dict[str, Dict]:
+    """
+    What the rollup should hold for one user's hair_events rows (any order):
+    category -> {latest_score, history, score_sum, score_count}.
+    """
+    scored = [r for r in rows if r.get("primary_label") and r.get("vital_score") is not None]
+    scored.sort(key=lambda r: (r["created_at"], str(r["id"])), reverse=True)
+
+    expected: Dict[str, Dict] = {}
+    for row in scored:
+        entry = expected.setdefault(row["primary_label"], {
+            "latest_score": row["vital_score"],
+            "history": [],
+            "score_sum": 0,
+            "score_count": 0,
+        })
+        if len(entry["history"]) < 5:
+            entry["history"].append(row["vital_score"])
+        entry["score_sum"] += row["vital_score"]
+        entry["score_count"] += 1
+    return expected
+
+
+def diff_rollup(expected: Dict[str, Dict], actual_rows: List[Dict]) -> List[str]:
+    """Human-readable differences between the expected rollup and the stored rows."""
+    actual = {
+        row["category"]: {
+            "latest_score": row["latest_score"],
+            "history": list(row["history"] or []),
+            "score_sum": row["score_sum"],
+            "score_count": row["score_count"],
+        }
+        for row in actual_rows
+    }
+    problems = []
+    for category in sorted(set(expected) | set(actual)):
+        want, have = expected.get(category), actual.get(category)
+        if want is None:
+            problems.append(f"{category}: rollup row has no scored events behind it")
+        elif have is None:
+            problems.append(f"{category}: missing rollup row ({want['score_count']} events)")
+        else:
+            for field in ("latest_score", "history", "score_sum", "score_count"):
+                if want[field] != have[field]:
+                    problems.append(f"{category}.{field}: rollup={have[field]} events={want[field]}")
+    return problems
+
+
+def user_events(user_id: str) -> List[Dict]:
+    """Every hair_events row for a user, keyset-paged. Raises on a failed read."""
+    # A failed read must stop the check, not show up as drift against zero events
+    db = get_db()
+    rows, cursor = [], None
+    while True:
+        page, cursor = db.get_events_page(
+            user_id, limit=_PAGE_SIZE, cursor=cursor, columns=_EVENT_COLUMNS, as_models=False, raise_errors=True
+        )
+        rows.extend(page)
+        if not cursor:
+            return rows
+
+
+def _rollup_rows(user_id: str) -> List[Dict]:
+    response = get_supabase().table("user_vitals_latest") \
+        .select(ROLLUP_COLUMNS) \
+        .eq("user_id", user_id) \
+        .execute()
+    return response.data or []
+
+
+def _all_user_ids() -> List[str]:
+    """Every user with metadata or a rollup row — catches rollups for deleted users too."""
+    db, user_ids, cursor = get_db(), set(), None
+    while True:
+        page, cursor = db.get_users_page(limit=_PAGE_SIZE, after_user_id=cursor, columns="user_id")
+        user_ids.update(u["user_id"] for u in page)
+        if not cursor:
+            break
+    response = get_supabase().table("user_vitals_latest").select("user_id").execute()
+    user_ids.update(row["user_id"] for row in response.data or [])
+    return sorted(user_ids)
+
+
+def check_vitals_rollup(user_ids: Optional[List[str]] = None, repair: bool = False) -> Dict:
+    """
+    Compare the rollup against raw events for each user.
+
+    Returns:
+        {"checked": int, "drifted": {user_id: [problems]}, "repaired": [user_ids]}
+    """
+    user_ids = user_ids or _all_user_ids()
+    drifted: Dict[str, List[str]] = {}
+    repaired: List[str] = []
+
+    for user_id in user_ids:
+        problems = diff_rollup(rollup_from_events(user_events(user_id)), _rollup_rows(user_id))
+        if not problems:
+            continue
+        drifted[user_id] = problems
+        if repair:
+            get_supabase().rpc("rebuild_user_vitals_latest", {"p_user_id": user_id}).execute()
+            repaired.append(user_id)
+
+    return {"checked": len(user_ids), "drifted": drifted, "repaired": repaired}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify user_vitals_latest against hair_events.")
+    parser.add_argument("--check", action="store_true", help="compare the rollup with raw events (the default action)")
+    parser.add_argument("--user", action="append", dest="users", help="limit to this user (repeatable)")
+    parser.add_argument("--repair", action="store_true", help="rebuild rollup rows for drifted users")
+    args = parser.parse_args()
+
+    report = check_vitals_rollup(args.users, repair=args.repair)
+    for user_id, problems in report["drifted"].items():
+        print(f"[VitalsRollup] {user_id}:")
+        for problem in problems:
+            print(f"    {problem}")
+    print(
+        f"[VitalsRollup] {report['checked']} users checked, {len(report['drifted'])} drifted"
+        + (f", {len(report['repaired'])} repaired" if args.repair else "")
+    )
+    raise SystemExit(1 if report["drifted"] and not args.repair else 0)
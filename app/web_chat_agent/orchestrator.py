@@ -14,10 +14,11 @@ from .hair_advisor_agent import run_hair_advisor
 from app.services.session_signal.session_signal_service import process_session_signals
 from app.services.alerts.alert_service import process_alerts
 from app.services.environmental_factors.weather_service import get_city_environmental_data
-from app.services.db_service import get_db
+from app.services.async_db import get_async_db, run_db
+from app.services.session_store import SessionStore
 
-# In-memory session state for V1
-_session_profile_cache: Dict[str, Dict] = {}
+# In-memory session state for V1, bounded by TTL/LRU
+_session_profile_cache = SessionStore("web_chat_profile")
 
 class ProfileObserver:
     """
@@ -64,23 +65,26 @@ Example: {"texture": "Fine", "density": null, "moisture_behaviour": null, "humid
         print(f"\n--- [PASS 1: OBSERVER] Analyzing: \"{message}\" ---")
         new_traits = await self.extract_traits(message)
         
-        if session_id not in _session_profile_cache:
-            _session_profile_cache[session_id] = {
-                "texture": None,
-                "density": None,
-                "moisture_behaviour": None,
-                "humidity_response": None,
-                "hair_goals": []
-            }
-        
-        current = _session_profile_cache[session_id]
-        # Merge new traits (simple overwrite for now)
-        for key, val in new_traits.items():
-            if val is not None:
-                if key == "hair_goals" and isinstance(val, list):
-                    current[key] = list(set(current[key] + val))
-                else:
-                    current[key] = val
+        # Another worker may be updating the same session — merge under its lock
+        async with _session_profile_cache.lock(session_id):
+            current = await _session_profile_cache.aget(session_id)
+            if current is None:
+                current = {
+                    "texture": None,
+                    "density": None,
+                    "moisture_behaviour": None,
+                    "humidity_response": None,
+                    "hair_goals": []
+                }
+            
+            # Merge new traits (simple overwrite for now)
+            for key, val in new_traits.items():
+                if val is not None:
+                    if key == "hair_goals" and isinstance(val, list):
+                        current[key] = list(set(current[key] + val))
+                    else:
+                        current[key] = val
+            await _session_profile_cache.aset(session_id, current)
         
         print(f"[OBSERVER] Updated Session State: {current}")
         return current
@@ -128,7 +132,7 @@ No preamble or explanation.
 
         env_kwargs: Dict = {}
         try:
-            metadata = get_db().get_user_metadata(user_id) or {}
+            metadata = await get_async_db().get_user_metadata(user_id) or {}
             location = metadata.get("location")
             if location:
                 env_kwargs["country"] = location
@@ -140,7 +144,7 @@ No preamble or explanation.
             print(f"[orchestrator] env context fetch failed: {e}")
 
         try:
-            alerts = process_alerts(user_id, snapshot, **env_kwargs)
+            alerts = await run_db(process_alerts, user_id, snapshot, **env_kwargs)
         except Exception as e:
             print(f"[orchestrator] alert processing failed: {e}")
             return
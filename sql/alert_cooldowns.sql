@@ -0,0 +1,53 @@
+-- Cooldown lookups for alert_state.filter_unsent.
+-- Safe to run multiple times. Relies on idx_alert_log_user_type_sent_at
+-- (user_id, alert_type, sent_at DESC) from create_alert_log.sql.
+
+-- Last send per (user, alert_type), for dashboards and ad-hoc checks.
+CREATE OR REPLACE VIEW alert_latest_sent AS
+SELECT user_id, alert_type, MAX(sent_at) AS last_sent_at
+FROM alert_log
+GROUP BY user_id, alert_type;
+
+-- Last send of each of p_alert_types for one user; NULL when never sent.
+-- Each MAX is a single probe of idx_alert_log_user_type_sent_at, so the cost
+-- is one index lookup per candidate type however long the user's history is.
+CREATE OR REPLACE FUNCTION alert_last_sent(
+    p_user_id     TEXT,
+    p_alert_types TEXT[]
+)
+RETURNS TABLE (alert_type TEXT, last_sent_at TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT t.alert_type,
+           (SELECT MAX(a.sent_at)
+              FROM alert_log a
+             WHERE a.user_id = p_user_id
+               AND a.alert_type = t.alert_type)
+    FROM unnest(p_alert_types) AS t(alert_type);
+$$;
+
+-- alert_last_sent for a page of users at once (the cron), in one round trip.
+-- One row per user that has sent any of p_alert_types, with
+-- {alert_type: last sent_at} for those types: at most one row per user, so a
+-- page stays under PostgREST's max-rows however many types are checked.
+CREATE OR REPLACE FUNCTION alert_last_sent_many(
+    p_user_ids    TEXT[],
+    p_alert_types TEXT[]
+)
+RETURNS TABLE (user_id TEXT, last_sent JSONB)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT u.user_id, jsonb_object_agg(t.alert_type, s.last_sent_at)
+    FROM unnest(p_user_ids) AS u(user_id)
+    CROSS JOIN unnest(p_alert_types) AS t(alert_type)
+    CROSS JOIN LATERAL (
+        SELECT MAX(a.sent_at) AS last_sent_at
+        FROM alert_log a
+        WHERE a.user_id = u.user_id
+          AND a.alert_type = t.alert_type
+    ) s
+    WHERE s.last_sent_at IS NOT NULL
+    GROUP BY u.user_id;
+$$;
@@ -0,0 +1,146 @@
+-- Vitals rollup: one row per (user, category) so GET /api/vitals is a single
+-- indexed read instead of a scan of the user's hair_events.
+--
+--   latest_score / latest_at  newest scored event in the category
+--   history                   up to 5 newest scores, newest first
+--   score_sum / score_count   lifetime totals, for the average
+--
+-- Kept current by triggers on hair_events (every writer, including
+-- DatabaseService.save_hair_event behind POST /api/event, goes through them)
+-- and backfilled at the bottom of this file. Safe to run multiple times.
+-- Verify with: python -m app.services.vitals_rollup --check
+
+CREATE TABLE IF NOT EXISTS user_vitals_latest (
+    user_id       TEXT        NOT NULL,
+    category      TEXT        NOT NULL,
+    latest_score  INTEGER     NOT NULL,
+    latest_at     TIMESTAMPTZ NOT NULL,
+    history       INTEGER[]   NOT NULL,
+    score_sum     BIGINT      NOT NULL,
+    score_count   INTEGER     NOT NULL,
+    updated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (user_id, category)
+);
+
+-- Recompute a user's rollup rows from hair_events. Used by the backfill, by
+-- the update/delete trigger, and by the consistency tool's --repair.
+CREATE OR REPLACE FUNCTION rebuild_user_vitals_latest(p_user_id TEXT)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    DELETE FROM user_vitals_latest WHERE user_id = p_user_id;
+
+    INSERT INTO user_vitals_latest (
+        user_id, category, latest_score, latest_at, history, score_sum, score_count, updated_at
+    )
+    SELECT
+        user_id,
+        primary_label,
+        (array_agg(vital_score ORDER BY created_at DESC, id DESC))[1],
+        MAX(created_at),
+        (array_agg(vital_score ORDER BY created_at DESC, id DESC))[1:5],
+        SUM(vital_score),
+        COUNT(*),
+        NOW()
+    FROM hair_events
+    WHERE user_id = p_user_id
+      AND primary_label IS NOT NULL
+      AND vital_score IS NOT NULL
+    GROUP BY user_id, primary_label;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$;
+
+-- Insert path: O(1) upsert. A backdated event (older than latest_at) only
+-- needs its category's 5-row history re-read; the totals are additive.
+CREATE OR REPLACE FUNCTION apply_hair_event_to_vitals()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.primary_label IS NULL OR NEW.vital_score IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO user_vitals_latest AS v (
+        user_id, category, latest_score, latest_at, history, score_sum, score_count, updated_at
+    )
+    VALUES (
+        NEW.user_id, NEW.primary_label, NEW.vital_score, NEW.created_at,
+        ARRAY[NEW.vital_score], NEW.vital_score, 1, NOW()
+    )
+    ON CONFLICT (user_id, category) DO UPDATE SET
+        latest_score = CASE WHEN EXCLUDED.latest_at >= v.latest_at
+                            THEN EXCLUDED.latest_score ELSE v.latest_score END,
+        latest_at    = GREATEST(v.latest_at, EXCLUDED.latest_at),
+        history      = CASE WHEN EXCLUDED.latest_at >= v.latest_at
+                            THEN (ARRAY[EXCLUDED.latest_score] || v.history)[1:5]
+                            ELSE ARRAY(
+                                SELECT h.vital_score
+                                FROM hair_events h
+                                WHERE h.user_id = NEW.user_id
+                                  AND h.primary_label = NEW.primary_label
+                                  AND h.vital_score IS NOT NULL
+                                ORDER BY h.created_at DESC, h.id DESC
+                                LIMIT 5
+                            ) END,
+        score_sum    = v.score_sum + EXCLUDED.score_sum,
+        score_count  = v.score_count + 1,
+        updated_at   = NOW();
+
+    RETURN NEW;
+END;
+$$;
+
+-- Update / delete path: rare, so just rebuild the affected user(s).
+CREATE OR REPLACE FUNCTION rebuild_vitals_for_changed_event()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM rebuild_user_vitals_latest(OLD.user_id);
+    IF TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id THEN
+        PERFORM rebuild_user_vitals_latest(NEW.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_hair_events_vitals_insert ON hair_events;
+CREATE TRIGGER trg_hair_events_vitals_insert
+    AFTER INSERT ON hair_events
+    FOR EACH ROW EXECUTE FUNCTION apply_hair_event_to_vitals();
+
+DROP TRIGGER IF EXISTS trg_hair_events_vitals_change ON hair_events;
+CREATE TRIGGER trg_hair_events_vitals_change
+    AFTER UPDATE OF user_id, primary_label, vital_score, created_at OR DELETE ON hair_events
+    FOR EACH ROW EXECUTE FUNCTION rebuild_vitals_for_changed_event();
+
+-- Backfill. The SHARE lock holds off inserts while existing history is
+-- rolled up, so no event is counted twice or missed.
+BEGIN;
+LOCK TABLE hair_events IN SHARE MODE;
+TRUNCATE user_vitals_latest;
+INSERT INTO user_vitals_latest (
+    user_id, category, latest_score, latest_at, history, score_sum, score_count, updated_at
+)
+SELECT
+    user_id,
+    primary_label,
+    (array_agg(vital_score ORDER BY created_at DESC, id DESC))[1],
+    MAX(created_at),
+    (array_agg(vital_score ORDER BY created_at DESC, id DESC))[1:5],
+    SUM(vital_score),
+    COUNT(*),
+    NOW()
+FROM hair_events
+WHERE primary_label IS NOT NULL
+  AND vital_score IS NOT NULL
+GROUP BY user_id, primary_label;
+COMMIT;
@@ -0,0 +1,31 @@
+-- Keyset pagination and latest-N-per-category reads for hair_events.
+-- Safe to run multiple times.
+
+-- Tie-break on id so pages are stable when two events share a created_at.
+CREATE INDEX IF NOT EXISTS idx_hair_events_user_created_id
+    ON hair_events (user_id, created_at DESC, id DESC);
+
+-- Newest p_per_category events in each of p_categories, in one round trip.
+-- Each LATERAL branch is a bounded scan of idx_hair_events_user_category, so
+-- the cost is categories x p_per_category rows regardless of history length.
+CREATE OR REPLACE FUNCTION latest_hair_events_per_category(
+    p_user_id      TEXT,
+    p_categories   TEXT[],
+    p_per_category INTEGER DEFAULT 5
+)
+RETURNS TABLE (primary_label TEXT, vital_score INTEGER, created_at TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT e.primary_label, e.vital_score, e.created_at
+    FROM unnest(p_categories) AS c(label)
+    CROSS JOIN LATERAL (
+        SELECT h.primary_label, h.vital_score, h.created_at
+        FROM hair_events h
+        WHERE h.user_id = p_user_id
+          AND h.primary_label = c.label
+        ORDER BY h.created_at DESC
+        LIMIT p_per_category
+    ) e
+    ORDER BY e.primary_label, e.created_at DESC;
+$$;
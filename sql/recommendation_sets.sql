@@ -0,0 +1,16 @@
+-- Precomputed recommendation sets (recommendation_precompute.py).
+-- Safe to run multiple times. Without it sets are still saved, with
+-- created_at as the only freshness marker.
+
+-- Every row of a generated set shares set_id / generated_at; generated_by
+-- records what triggered it (cron | hair_event | read_miss). Older pending
+-- rows are marked 'superseded' when a new set lands.
+ALTER TABLE routine_recommendations ADD COLUMN IF NOT EXISTS set_id UUID;
+ALTER TABLE routine_recommendations ADD COLUMN IF NOT EXISTS generated_at TIMESTAMPTZ;
+ALTER TABLE routine_recommendations ADD COLUMN IF NOT EXISTS generated_by TEXT;
+
+-- GET /recommendations/{user_id} and the freshness check read only the
+-- user's pending set, newest first.
+CREATE INDEX IF NOT EXISTS idx_recommendations_user_pending
+    ON routine_recommendations(user_id, created_at DESC)
+    WHERE status = 'pending';
@@ -0,0 +1,136 @@
+"""
+Offline benchmark for the local signal/intent classifier — no LLM calls.
+
+Runs the 30 QA scenarios from qa_scenarios.py through classify_local and the
+decision engine and reports:
+  - coverage : turns the cascade would answer locally (both halves confident)
+  - accuracy : signal set and decision_state routing on those turns, and on
+               all turns if the local answer were always used; a turn counts
+               as correct only if both match
+  - latency  : per-turn classification time
+
+Run from project root:
+    python tests/benchmark_local_classifier.py
+    python tests/benchmark_local_classifier.py --verbose
+"""
+
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from qa_scenarios import SCENARIOS
+from app.services.decision_state.decision_engine import build_strategy_payload
+from app.services.decision_state.models import SessionSignal
+from app.services.session_classification.local_classifier import (
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE,
+    classify_local,
+)
+from app.services.session_intent.session_intent_service import build_session_intent
+from app.services.session_signal.signal_detector import SIGNAL_NAMES
+
+REPEATS = 200
+
+# Signals each scenario should raise, read off the definitions in signal_detector
+EXPECTED_SIGNALS = {
+    "01": {"hold_loss"},
+    "02": {"hold_loss"},
+    "03": {"scalp_sensitivity"},
+    "04": {"breakage_active"},
+    "05": {"hold_loss"},
+    "06": {"absorption_blocked"},
+    "07": set(),
+    "08": {"hold_loss"},
+    "09": set(),
+    "10": {"scalp_sensitivity"},
+    "11": {"hold_loss"},
+    "12": {"breakage_active"},
+    "13": {"absorption_blocked"},
+    "14": {"coated_feel"},
+    "15": {"buildup_present"},
+    "16": {"hold_loss"},
+    "17": set(),
+    "18": {"hold_loss"},
+    "19": {"absorption_blocked", "buildup_present"},
+    "20": set(),
+    "21": set(),
+    "22": {"hold_loss"},
+    "23": {"scalp_sensitivity"},
+    "24": {"breakage_active"},
+    "25": set(),
+    "26": {"scalp_sensitivity"},
+    "27": set(),
+    "28": {"hold_loss"},
+    "29": {"breakage_active"},
+    "30": set(),
+}
+
+
+def route(signals, intent, profile, env) -> str:
+    session_signal = SessionSignal(**{k: signals[k] for k in SessionSignal.model_fields if k in signals})
+    with contextlib.redirect_stdout(io.StringIO()):  # decision engine logs every call
+        return build_strategy_payload(profile, session_signal, env, build_session_intent(intent)).decision_state
+
+
+def main(verbose: bool = False):
+    print("=" * 70)
+    print("  LOCAL CLASSIFIER BENCHMARK (offline)")
+    print(f"  min confidence: {LOCAL_CLASSIFIER_MIN_CONFIDENCE}")
+    print("=" * 70)
+
+    classify_local([{"role": "user", "content": "warm up"}])  # build the index once
+
+    rows = []
+    latencies_ms = []
+    for label, message, profile, env, expected in SCENARIOS:
+        messages = [{"role": "user", "content": message}]
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            signals, intent = classify_local(messages)
+        latencies_ms.append((time.perf_counter() - started) * 1000 / REPEATS)
+
+        local = signals["local_confident"] and intent["local_confident"]
+        got = route(signals, intent, profile, env)
+        active = {k for k in SIGNAL_NAMES if signals.get(k)}
+        signals_ok = active == EXPECTED_SIGNALS[label[:2]]
+        rows.append((label, local, got == expected, signals_ok, got, expected, signals, intent))
+
+    answered = [r for r in rows if r[1]]
+    local_routed = sum(1 for r in answered if r[2])
+    local_signals = sum(1 for r in answered if r[3])
+    local_correct = sum(1 for r in answered if r[2] and r[3])
+    all_correct = sum(1 for r in rows if r[2] and r[3])
+
+    for label, local, routed, signals_ok, got, expected, signals, intent in rows:
+        if not verbose and not local:
+            continue
+        tag = "PASS" if routed and signals_ok else "FAIL"
+        route_tag = "local" if local else "escalate"
+        active = [k for k in SIGNAL_NAMES if signals.get(k)] or ["none"]
+        print(f"  [{tag}] [{route_tag:8}] {label}")
+        if not routed:
+            print(f"         expected={expected}  got={got}")
+        if not signals_ok:
+            print(f"         expected signals={sorted(EXPECTED_SIGNALS[label[:2]]) or ['none']}")
+        print(f"         signals={active} ({signals['confidence_score']})  "
+              f"journey={intent['journey_state']} ({intent['confidence_score']})")
+
+    latencies_ms.sort()
+    print()
+    print(f"  Coverage:  {len(answered)}/{len(rows)} turns answered locally")
+    if answered:
+        print(f"  Accuracy:  {local_correct}/{len(answered)} on locally answered turns "
+              f"({local_signals} right signals, {local_routed} right routing)")
+    print(f"  Accuracy:  {all_correct}/{len(rows)} if every turn used the local answer")
+    print(f"  Latency:   mean {statistics.mean(latencies_ms):.3f} ms, "
+          f"p95 {latencies_ms[int(len(latencies_ms) * 0.95) - 1]:.3f} ms per turn")
+
+
+if __name__ == "__main__":
+    main(verbose="--verbose" in sys.argv)
@@ -0,0 +1,155 @@
+"""
+Push fan-out benchmark against a stub push service — no browser, no network.
+
+Sends one batch to SUBSCRIPTIONS subscriptions spread over a few push-service
+origins, twice:
+  - per-send signing : the VAPID key parsed and the JWT signed for every
+                       subscription, as pywebpush.webpush() does per call
+  - cached           : the key parsed once, one signed header per origin
+and reports sends per CPU-second (this process only) and wall time.
+
+By default the stub runs in-process (httpx.ASGITransport), so its own CPU is
+counted too. To measure the sender alone, run the stub in another process:
+    python tests/fake_push_endpoint.py --port 8089
+    python tests/benchmark_push.py --url http://127.0.0.1:8089 --concurrency 8
+
+A single-process stub can't keep up with many connections; past that point
+the numbers measure queueing in the HTTP client's pool, not the sender.
+
+Run from project root:
+    python tests/benchmark_push.py
+    python tests/benchmark_push.py --subscriptions 5000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import httpx
+from py_vapid import Vapid
+
+import app.services.recommendations.push_service as push_service
+from fake_push_endpoint import FakePushService, generate_vapid_keys
+
+ORIGINS = ["http://fcm.push.test", "http://mozilla.push.test", "http://apple.push.test"]
+
+
+class StaticSupabase:
+    """push_subscriptions stand-in: reads only, nothing is ever pruned."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.selected = rows
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self.selected = self.rows
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.selected = [r for r in self.selected if r[column] in values]
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=self.selected)
+
+
+def _per_send_headers(vapid, endpoint):
+    """The old path: parse the key and sign fresh claims for every subscription."""
+    key = Vapid.from_string(private_key=os.environ["VAPID_PRIVATE_KEY"])
+    claims = {"sub": push_service.VAPID_CLAIMS_SUB, "aud": push_service._origin(endpoint), "exp": int(time.time()) + 12 * 3600}
+    return key.sign(claims)
+
+
+def _subscriptions(count, url):
+    rows = []
+    for i in range(count):
+        base = url or ORIGINS[i % len(ORIGINS)]
+        service = FakePushService(base_url=base, decrypt=False)
+        rows.append(service.subscription(f"user-{i % 500:03d}", f"ok-{i}"))
+    return rows
+
+
+async def _one_batch(users, url):
+    # A fresh client per round, created and closed on this round's loop; over
+    # HTTP it is the service's own pooled client
+    push_service._http_client = None if url else httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=FakePushService(decrypt=False))
+    )
+    try:
+        started_cpu, started_wall = time.process_time(), time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = await push_service.send_push_batch(
+                [{"user_id": u, "title": "New routine tip", "body": "benchmark"} for u in users]
+            )
+        return report, time.process_time() - started_cpu, time.perf_counter() - started_wall
+    finally:
+        await push_service.close_push_client()
+
+
+def run_mode(label, rows, url, rounds, per_send):
+    users = sorted({r["user_id"] for r in rows})
+    push_service._vapid_headers_by_origin.clear()
+    original_headers = push_service._vapid_headers
+    if per_send:
+        push_service._vapid_headers = _per_send_headers
+    results = []
+    try:
+        for _ in range(rounds):
+            report, cpu, wall = asyncio.run(_one_batch(users, url))
+            if report["delivered"] != len(rows):
+                raise RuntimeError(f"{label}: only {report['delivered']}/{len(rows)} delivered: {report['errors'][:3]}")
+            results.append((cpu, wall))
+    finally:
+        push_service._vapid_headers = original_headers
+
+    cpu = statistics.median(r[0] for r in results)
+    wall = statistics.median(r[1] for r in results)
+    return {"label": label, "cpu": cpu, "wall": wall, "per_cpu_sec": len(rows) / cpu if cpu else float("inf")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=push_service.PUSH_CONCURRENCY)
+    parser.add_argument("--url", help="base URL of a stub started with tests/fake_push_endpoint.py")
+    args = parser.parse_args()
+    push_service.PUSH_CONCURRENCY = args.concurrency
+
+    private_key, public_key = generate_vapid_keys()
+    os.environ["VAPID_PRIVATE_KEY"], os.environ["NEXT_PUBLIC_VAPID_PUBLIC_KEY"] = private_key, public_key
+    rows = _subscriptions(args.subscriptions, args.url)
+    push_service.get_supabase = lambda: StaticSupabase(rows)
+    push_service.load_vapid_key()
+
+    print("=" * 70)
+    print("  PUSH FAN-OUT BENCHMARK (stub push service)")
+    print(f"  {args.subscriptions} subscriptions, {len({push_service._origin(r['endpoint']) for r in rows})} origins, "
+          f"concurrency {push_service.PUSH_CONCURRENCY}, {args.rounds} rounds, stub {'at ' + args.url if args.url else 'in-process'}")
+    print("=" * 70)
+
+    before = run_mode("per-send signing", rows, args.url, args.rounds, per_send=True)
+    after = run_mode("cached", rows, args.url, args.rounds, per_send=False)
+    for row in (before, after):
+        print(f"  {row['label']:<18} {row['per_cpu_sec']:>9.0f} sends/CPU-sec   "
+              f"cpu {row['cpu'] * 1000:>7.0f}ms   wall {row['wall'] * 1000:>7.0f}ms")
+    print(f"\n  throughput per core: {after['per_cpu_sec'] / before['per_cpu_sec']:.2f}x")
+    print(f"  VAPID signatures in the cached mode: {push_service.vapid_cache_stats()['signed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+A local Web Push service for tests and benchmarks — no browser, no network.
+
+FakePushService is a plain ASGI app that accepts pushes at /push/<token>,
+checks the VAPID header, decrypts the aes128gcm body with the subscription's
+receiver keys and records it. The token picks the answer:
+
+    gone-*     410 (subscription expired)
+    missing-*  404 (subscription unknown)
+    error-*    500
+    slow-*     201 after `slow_secs`
+    anything   201 (after `latency`, like a real push service round trip)
+
+In-process (tests):
+    service = FakePushService()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=service))
+    sub = service.subscription("user-1", "ok-1")   # a push_subscriptions row
+
+Over real HTTP (benchmarks against a separate process):
+    python tests/fake_push_endpoint.py --port 8089
+"""
+
+import asyncio
+import base64
+import json
+import os
+from typing import Dict, List, Optional
+
+import http_ece
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+
+def _b64url(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def generate_vapid_keys() -> tuple:
+    """(VAPID_PRIVATE_KEY, NEXT_PUBLIC_VAPID_PUBLIC_KEY) in the web-push CLI's format."""
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public = private_key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64url(private_key.private_numbers().private_value.to_bytes(32, "big")), _b64url(public)
+
+
+class FakePushService:
+    def __init__(self, base_url: str = "http://push.test", latency: float = 0.0, slow_secs: float = 0.0, decrypt: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.slow_secs = slow_secs
+        self.decrypt = decrypt
+        self.received: List[Dict] = []   # {"token", "payload", "headers"}
+        self.rejected: List[str] = []    # tokens answered with a non-2xx
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._keys: Dict[str, tuple] = {}
+
+    def subscription(self, user_id: str, token: str) -> Dict:
+        """A push_subscriptions row for `token`, with fresh receiver keys."""
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        auth = os.urandom(16)
+        self._keys[token] = (private_key, auth)
+        public = private_key.public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        )
+        return {
+            "user_id": user_id,
+            "endpoint": f"{self.base_url}/push/{token}",
+            "p256dh": _b64url(public),
+            "auth": _b64url(auth),
+        }
+
+    def _status_for(self, token: str) -> int:
+        if token.startswith("gone-"):
+            return 410
+        if token.startswith("missing-"):
+            return 404
+        if token.startswith("error-"):
+            return 500
+        return 201
+
+    def _open(self, token: str, body: bytes) -> Optional[Dict]:
+        if not self.decrypt or token not in self._keys:
+            return None
+        private_key, auth = self._keys[token]
+        plain = http_ece.decrypt(body, private_key=private_key, auth_secret=auth, version="aes128gcm")
+        return json.loads(plain)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            token = scope["path"].rsplit("/", 1)[-1]
+            headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+            delay = self.slow_secs if token.startswith("slow-") else self.latency
+            if delay:
+                await asyncio.sleep(delay)
+
+            status = self._status_for(token)
+            if not headers.get("authorization", "").startswith("vapid "):
+                status = 401
+            if status == 201:
+                self.received.append({"token": token, "payload": self._open(token, body), "headers": headers})
+            else:
+                self.rejected.append(token)
+        finally:
+            self.in_flight -= 1
+
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-length", b"0")]})
+        await send({"type": "http.response.body", "body": b""})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local fake Web Push service")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--slow-secs", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Over HTTP nobody holds receiver keys, so bodies are counted, not decrypted
+    app = FakePushService(
+        base_url=f"http://127.0.0.1:{args.port}", latency=args.latency, slow_secs=args.slow_secs, decrypt=False
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -4,6 +4,11 @@ Tests decision state routing, JTE mode/depth, and signal detection.
 
 Run from project root:
     python tests/qa_scenarios.py
+    SESSION_CLASSIFIER_MODE=fused python tests/qa_scenarios.py   # one fused signal+intent call
+    SESSION_CLASSIFIER_MODE=local python tests/qa_scenarios.py   # local classifier, LLM on escalation
+
+Offline (no LLM) accuracy/latency of the local classifier alone:
+    python tests/benchmark_local_classifier.py
 """
 
 import asyncio
@@ -19,7 +24,11 @@ from app.services.decision_state.models import (
 from app.services.session_signal.signal_detector import detect_signals, SIGNAL_NAMES
 from app.services.decision_state.decision_engine import build_strategy_payload
 from app.services.decision_state.jte import resolve_delivery_plan
-from app.services.session_intent.session_intent_service import process_session_intent
+from app.services.session_intent.session_intent_service import process_session_intent, build_session_intent
+from app.services.session_classification.fused_detector import detect_signals_and_intent
+from app.services.session_classification.session_classification_service import (
+    SESSION_CLASSIFIER_MODE, classify_with_cascade,
+)
 from app.services.decision_state.response_composer import compose_response
 
 # ---------------------------------------------------------------------------
@@ -180,12 +189,22 @@ SCENARIOS = [
 ]
 
 
-async def run_routing_check(label, message, profile, env, expected):
-    messages = [{"role": "user", "content": message}]
-    sigs, intent = await asyncio.gather(
+async def classify(messages):
+    if SESSION_CLASSIFIER_MODE == "fused":
+        sigs, intent = await detect_signals_and_intent(messages)
+        return sigs, build_session_intent(intent)
+    if SESSION_CLASSIFIER_MODE == "local":
+        sigs, intent = await classify_with_cascade(messages)
+        return sigs, build_session_intent(intent)
+    return await asyncio.gather(
         detect_signals(messages),
         process_session_intent(messages),
     )
+
+
+async def run_routing_check(label, message, profile, env, expected):
+    messages = [{"role": "user", "content": message}]
+    sigs, intent = await classify(messages)
     ss = SessionSignal(**{k: sigs.get(k, False) for k in SessionSignal.model_fields if k in sigs})
     strategy = build_strategy_payload(profile, ss, env, intent)
     delivery = resolve_delivery_plan(strategy.jte_input, strategy.decision_state)
@@ -204,10 +223,7 @@ async def run_routing_check(label, message, profile, env, expected):
 
 async def run_full_response(label, message, profile, env):
     messages = [{"role": "user", "content": message}]
-    sigs, intent = await asyncio.gather(
-        detect_signals(messages),
-        process_session_intent(messages),
-    )
+    sigs, intent = await classify(messages)
     ss = SessionSignal(**{k: sigs.get(k, False) for k in SessionSignal.model_fields if k in sigs})
     strategy = build_strategy_payload(profile, ss, env, intent)
     delivery = resolve_delivery_plan(strategy.jte_input, strategy.decision_state)
@@ -226,6 +242,7 @@ async def run_full_response(label, message, profile, env):
 async def main():
     print("=" * 70)
     print("  EMERSON QA SCENARIO TEST - 30 SCENARIOS")
+    print(f"  classifier mode: {SESSION_CLASSIFIER_MODE}")
     print("=" * 70)
 
     # Phase 1: routing check for all 30
@@ -0,0 +1,282 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.services.alerts.alert_state as alert_state
+from app.services.alerts.alert_state import filter_unsent, filter_unsent_many, log_sent, log_sent_many
+from app.services.alerts.alert_types import Alert
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db = db
+        self.rows = list(db.rows)
+        self.columns = None
+        self.pending_insert = None
+        self.row_limit = None
+
+    def select(self, columns):
+        self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def in_(self, column, values):
+        self.rows = [r for r in self.rows if r[column] in values]
+        return self
+
+    def order(self, column, desc=False):
+        self.rows.sort(key=lambda r: r[column], reverse=desc)
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def insert(self, row):
+        self.pending_insert = row
+        return self
+
+    def execute(self):
+        if self.pending_insert is not None:
+            rows = self.pending_insert if isinstance(self.pending_insert, list) else [self.pending_insert]
+            self.db.rows.extend(rows)
+            self.db.inserts += 1
+            return SimpleNamespace(data=rows)
+        # Like PostgREST, never more than max-rows, whatever was asked for
+        rows = self.rows[:min(self.row_limit or self.db.max_rows, self.db.max_rows)]
+        self.db.table_reads += 1
+        self.db.rows_returned += len(rows)
+        return SimpleNamespace(data=[{c: r[c] for c in self.columns} for r in rows])
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def _last_sent(self, user_id, alert_type):
+        sent = [r["sent_at"] for r in self.db.rows if r["user_id"] == user_id and r["alert_type"] == alert_type]
+        return max(sent) if sent else None
+
+    def execute(self):
+        if not self.db.has_rpc:
+            raise RuntimeError(f"PGRST202: Could not find the function public.{self.name}")
+        self.db.rpc_calls += 1
+        if self.name == "alert_last_sent_many":
+            rows = []
+            for user_id in self.params["p_user_ids"]:
+                latest = {t: self._last_sent(user_id, t) for t in self.params["p_alert_types"]}
+                latest = {t: sent for t, sent in latest.items() if sent}
+                if latest:
+                    rows.append({"user_id": user_id, "last_sent": latest})
+            self.db.rows_returned += len(rows)
+            return SimpleNamespace(data=rows)
+        rows = []
+        for alert_type in self.params["p_alert_types"]:
+            sent = [r["sent_at"] for r in self.db.rows
+                    if r["user_id"] == self.params["p_user_id"] and r["alert_type"] == alert_type]
+            rows.append({"alert_type": alert_type, "last_sent_at": max(sent) if sent else None})
+        self.db.rows_returned += len(rows)
+        if self.db.during_rpc is not None:
+            # Something lands after the snapshot was taken but before the answer arrives
+            hook, self.db.during_rpc = self.db.during_rpc, None
+            hook()
+        return SimpleNamespace(data=rows)
+
+
+class FakeSupabase:
+    def __init__(self, rows, has_rpc=True, max_rows=1000):
+        self.rows = rows
+        self.has_rpc = has_rpc
+        self.max_rows = max_rows
+        self.rpc_calls = 0
+        self.table_reads = 0
+        self.rows_returned = 0
+        self.inserts = 0
+        self.during_rpc = None
+
+    def table(self, name):
+        return FakeQuery(self)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+    def round_trips(self):
+        return self.rpc_calls + self.table_reads
+
+
+def _history(user_id: str, old_sends: int = 500):
+    """Old sends of one type, plus a recent send of a 7-day alert and an old one of a forever alert."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"user_id": user_id, "alert_type": "sweat_high_humidity",
+         "sent_at": (now - timedelta(days=30, minutes=i)).isoformat()}
+        for i in range(old_sends)
+    ]
+    rows.append({"user_id": user_id, "alert_type": "long_gap_clarify", "sent_at": (now - timedelta(days=2)).isoformat()})
+    rows.append({"user_id": user_id, "alert_type": "hard_water_cleansing", "sent_at": (now - timedelta(days=400)).isoformat()})
+    return rows
+
+
+def _alert(alert_type: str, cooldown_days):
+    return Alert(alert_type=alert_type, source_type="cron", source_id="test", message="m", cooldown_days=cooldown_days)
+
+
+CANDIDATES = [
+    _alert("sweat_high_humidity", 7),    # last sent 30 days ago -> due
+    _alert("long_gap_clarify", 7),       # 2 days ago -> on cooldown
+    _alert("hard_water_cleansing", None),  # sent once, never re-fires
+    _alert("day_3_pulse_moisture", 1),   # never sent -> due
+]
+
+
+def _types(alerts):
+    return [a.alert_type for a in alerts]
+
+
+def test_alert_cooldowns():
+    print("--- Alert Cooldown Lookup Test ---")
+    original_get_supabase, original_ttl = alert_state.get_supabase, alert_state.ALERT_COOLDOWN_CACHE_TTL_SECS
+    supabase = FakeSupabase(_history("u1"))
+    alert_state.get_supabase = lambda: supabase
+    alert_state._cooldown_rpc = True
+    alert_state.clear_cooldown_cache()
+    try:
+        due = filter_unsent("u1", CANDIDATES)
+        first_trips, first_rows = supabase.round_trips(), supabase.rows_returned
+
+        due_again = filter_unsent("u1", CANDIDATES)
+        cached_trips = supabase.round_trips() - first_trips
+
+        log_sent("u1", due[0])
+        after_send = filter_unsent("u1", CANDIDATES)
+        write_through_trips = supabase.round_trips() - first_trips
+
+        extra = filter_unsent("u1", CANDIDATES + [_alert("weather_defense_humectants", 1)])
+        extra_trips = supabase.round_trips() - first_trips - write_through_trips
+
+        empty_before = supabase.round_trips()
+        empty = filter_unsent("u1", [])
+        empty_trips = supabase.round_trips() - empty_before
+
+        alert_state.ALERT_COOLDOWN_CACHE_TTL_SECS = -1
+        expired_before = supabase.rpc_calls
+        filter_unsent("u1", CANDIDATES)
+        expired_calls = supabase.rpc_calls - expired_before
+        alert_state.ALERT_COOLDOWN_CACHE_TTL_SECS = original_ttl
+
+        # log_sent for an uncached user while a lookup for that user is in flight
+        supabase.during_rpc = lambda: log_sent("u3", _alert("day_3_pulse_moisture", 1))
+        racing = filter_unsent("u3", CANDIDATES)
+        race_before = supabase.round_trips()
+        after_race = filter_unsent("u3", CANDIDATES)
+        race_trips = supabase.round_trips() - race_before
+
+        no_rpc = FakeSupabase(_history("u2"), has_rpc=False)
+        alert_state.get_supabase = lambda: no_rpc
+        alert_state.clear_cooldown_cache()
+        fallback_due = filter_unsent("u2", CANDIDATES)
+        fallback_flag = alert_state._cooldown_rpc
+        stats = alert_state.alert_cooldown_stats()
+
+        # A long history: the grouped read is cut short before the one-shot's send
+        capped = FakeSupabase(_history("u4", old_sends=1500), has_rpc=False)
+        alert_state.get_supabase = lambda: capped
+        capped_due = filter_unsent("u4", CANDIDATES)
+    finally:
+        alert_state.get_supabase = original_get_supabase
+        alert_state.ALERT_COOLDOWN_CACHE_TTL_SECS = original_ttl
+        alert_state._cooldown_rpc = True
+        alert_state.clear_cooldown_cache()
+
+    checks = [
+        ("due alerts pass, cooldowns and one-shots are dropped", _types(due) == ["sweat_high_humidity", "day_3_pulse_moisture"]),
+        ("one round trip for the whole candidate set", first_trips == 1),
+        ("reads one row per candidate type, not the history", first_rows == len(CANDIDATES)),
+        ("a repeat check is served from the cache", cached_trips == 0 and _types(due_again) == _types(due)),
+        ("log_sent writes through to the cache", "sweat_high_humidity" not in _types(after_send) and write_through_trips == 0),
+        ("only uncached types are fetched", extra_trips == 1 and "weather_defense_humectants" in _types(extra)),
+        ("no candidates means no lookup", empty == [] and empty_trips == 0),
+        ("expired cache entries are re-read", expired_calls == 1),
+        ("a send during an in-flight lookup isn't overwritten by its answer",
+            "day_3_pulse_moisture" not in _types(racing) + _types(after_race) and race_trips == 0),
+        ("without the RPC the table fallback gives the same answer", _types(fallback_due) == _types(due)),
+        ("a missing RPC is detected once", fallback_flag is False and stats["rpc"] is False),
+        ("a fallback read cut short by max-rows doesn't re-fire old alerts",
+            _types(capped_due) == _types(due) and capped.table_reads == 1 + 2),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+def test_alert_cooldowns_many():
+    print("--- Bulk Alert Cooldown Test ---")
+    original_get_supabase = alert_state.get_supabase
+    users = [f"u{i}" for i in range(50)]
+    history = [row for u in users[::2] for row in _history(u)]  # even users have history
+    supabase = FakeSupabase(list(history))
+    alert_state.get_supabase = lambda: supabase
+    alert_state._cooldown_many_rpc = True
+    alert_state.clear_cooldown_cache()
+    try:
+        page = {u: list(CANDIDATES) for u in users}
+        page["idle"] = []
+        due = filter_unsent_many(page)
+        lookup_trips, lookup_rows = supabase.round_trips(), supabase.rows_returned
+
+        written = log_sent_many(due)
+        after_log = filter_unsent_many(page)
+        repeat_trips = supabase.round_trips() - lookup_trips
+
+        no_rpc = FakeSupabase(list(history), has_rpc=False)
+        alert_state.get_supabase = lambda: no_rpc
+        alert_state.clear_cooldown_cache()
+        fallback_due = filter_unsent_many({u: list(CANDIDATES) for u in users})
+        fallback_flag = alert_state._cooldown_many_rpc
+    finally:
+        alert_state.get_supabase = original_get_supabase
+        alert_state._cooldown_many_rpc = True
+        alert_state.clear_cooldown_cache()
+
+    with_history, never_sent = ["sweat_high_humidity", "day_3_pulse_moisture"], _types(CANDIDATES)
+    checks = [
+        ("a page of users is checked in one round trip", lookup_trips == 1),
+        ("at most one row per user comes back", lookup_rows == len(users) // 2),
+        ("each user gets their own cooldowns", all(_types(due[u]) == (with_history if i % 2 == 0 else never_sent) for i, u in enumerate(users))),
+        ("users without candidates are passed through empty", due["idle"] == []),
+        ("the page is logged in one insert", supabase.inserts == 1 and written == sum(len(a) for a in due.values())),
+        ("log_sent_many writes through to the cache", repeat_trips == 0 and not any(after_log.values())),
+        ("without the RPC the table fallback gives the same answer", {u: _types(a) for u, a in fallback_due.items()}
+            == {u: _types(a) for u, a in due.items() if u != "idle"}),
+        ("the fallback reads users in chunks", fallback_flag is False and no_rpc.rows_returned >= 1000),
+        ("what a capped read didn't reach is probed per user and type",
+            no_rpc.table_reads == 1 + len(users) // 2 * 2 + len(users) // 2 * len(CANDIDATES)),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_alert_cooldowns()
+    test_alert_cooldowns_many()
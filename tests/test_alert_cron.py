@@ -0,0 +1,255 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import BackgroundTasks, HTTPException
+
+import app.api.scenarios as scenarios
+import app.services.alerts.alert_cron as alert_cron
+from app.services.alerts.alert_cron import AlertCronJob
+from app.services.alerts.alert_rules import build_city_environment, evaluate
+
+USERS = [f"user-{i:04d}" for i in range(240)]
+
+
+CITIES = ["Dubai", "Lagos", "London"]
+
+
+def _fake_pages(fail_after_page=None, size=40, located=False):
+    """Stands in for iter_user_pages over USERS; optionally a page read fails."""
+
+    async def iter_user_pages(page_size=None, start_after=None, columns=None):
+        remaining = [u for u in USERS if start_after is None or u > start_after]
+        for page_no, i in enumerate(range(0, len(remaining), size)):
+            if fail_after_page is not None and page_no == fail_after_page:
+                raise ConnectionError("connection reset by peer")
+            page = [
+                {"user_id": u, "location": CITIES[int(u[-4:]) % 3] if located else None}
+                for u in remaining[i:i + size]
+            ]
+            yield page, page[-1]["user_id"]
+
+    return iter_user_pages
+
+
+class FakeEngine:
+    """evaluate_user stand-in: fixed latency, one user hangs, a few raise."""
+
+    def __init__(self, latency=0.02, hang=(), fail=()):
+        self.latency = latency
+        self.hang = set(hang)
+        self.fail = set(fail)
+        self.handled = []
+        self.environments = {}
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, user, current_date, environment=None):
+        user_id = user["user_id"]
+        self.environments[user_id] = environment
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(5 if user_id in self.hang else self.latency)
+            if user_id in self.fail:
+                raise RuntimeError("alert_log insert failed")
+            self.handled.append(user_id)
+            return ["alert"] if user_id.endswith("0") else []
+        finally:
+            self.active -= 1
+
+
+class FakeDeliver:
+    """deliver_alerts stand-in: records each page's batch; can fail one."""
+
+    def __init__(self, fail_on_call=None):
+        self.batches = []
+        self.fail_on_call = fail_on_call
+
+    async def __call__(self, user_candidates):
+        self.batches.append(dict(user_candidates))
+        if len(self.batches) == self.fail_on_call:
+            raise RuntimeError("alert_log insert failed")
+        return user_candidates
+
+    def delivered_users(self):
+        return {u for batch in self.batches for u in batch}
+
+
+def _job(engine, path, deliver=None, pages_done=None, **kwargs):
+    on_page_done = pages_done.append if pages_done is not None else (lambda user_ids: None)
+    return AlertCronJob(
+        process=engine, deliver=deliver or FakeDeliver(), on_page_done=on_page_done, workers=8,
+        user_timeout=0.2, checkpoint_path=path, checkpoint_every=10, **kwargs,
+    )
+
+
+async def _full_run(path):
+    engine, deliver, pages_done = FakeEngine(hang=["user-0007"], fail=["user-0100", "user-0101"]), FakeDeliver(), []
+    job = _job(engine, path, deliver, pages_done)
+    started = time.perf_counter()
+    status = await job.run()
+    return engine, deliver, pages_done, job, status, time.perf_counter() - started
+
+
+async def _failed_delivery(path):
+    deliver = FakeDeliver(fail_on_call=2)
+    job = _job(FakeEngine(latency=0.005), path, deliver)
+    status = await job.run()
+    return deliver, status
+
+
+async def _crash_then_resume(path):
+    first_engine = FakeEngine()
+    first = _job(first_engine, path)
+    alert_cron.iter_user_pages = _fake_pages(fail_after_page=3)
+    first_status = await first.run()
+
+    second_engine = FakeEngine()
+    second = _job(second_engine, path)
+    resume_from = second.resume_cursor()
+    alert_cron.iter_user_pages = _fake_pages()
+    second.start(start_after=resume_from)
+    second_status = await second.run()
+    return first_engine, first_status, second_engine, second_status, resume_from, second.resume_cursor()
+
+
+async def _cancel_mid_run(path):
+    engine, deliver = FakeEngine(latency=0.05), FakeDeliver()
+    job = _job(engine, path, deliver)
+    task = asyncio.create_task(job.run())
+    await asyncio.sleep(0.3)
+    await job.stop()
+    cancelled = task.cancelled()
+    checkpoint = job.load_checkpoint()
+    return engine, deliver, checkpoint, cancelled
+
+
+class FakeWeather:
+    """load_city_environment stand-in: counts lookups and their concurrency."""
+
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, city):
+        self.calls.append(city)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.05)
+            if city == "London":
+                raise ConnectionError("weather upstream down")
+            return build_city_environment(city, 38.0 if city == "Dubai" else 31.0, 40 if city == "Dubai" else 85)
+        finally:
+            self.active -= 1
+
+
+async def _per_city_environment(path):
+    engine, weather = FakeEngine(latency=0.005), FakeWeather()
+    job = _job(engine, path, load_environment=weather)
+    status = await job.run()
+    return engine, weather, status
+
+
+async def _endpoint(path):
+    engine = FakeEngine(latency=0.01)
+    original_job = alert_cron._job
+    alert_cron._job = _job(engine, path)
+    try:
+        tasks = BackgroundTasks()
+        started = await scenarios.run_scenarios(tasks)
+        try:
+            await scenarios.run_scenarios(BackgroundTasks())
+            conflict = False
+        except HTTPException as e:
+            conflict = e.status_code == 409
+        running = await scenarios.scenarios_status()
+        await tasks()
+        done = await scenarios.scenarios_status()
+    finally:
+        alert_cron._job = original_job
+    return started, conflict, running, done
+
+
+def test_alert_cron():
+    print("--- Alert Cron Job Test ---")
+    original_pages = alert_cron.iter_user_pages
+    tmp = tempfile.mkdtemp()
+    try:
+        alert_cron.iter_user_pages = _fake_pages()
+        engine, deliver, pages_done, job, status, elapsed = asyncio.run(_full_run(os.path.join(tmp, "full.json")))
+        checkpoint = job.load_checkpoint()
+        failed_deliver, failed_delivery_status = asyncio.run(_failed_delivery(os.path.join(tmp, "delivery.json")))
+
+        crash = asyncio.run(_crash_then_resume(os.path.join(tmp, "crash.json")))
+        first_engine, first_status, second_engine, second_status, resume_from, after_complete = crash
+
+        alert_cron.iter_user_pages = _fake_pages()
+        cancel_engine, cancel_deliver, cancel_checkpoint, cancelled = asyncio.run(_cancel_mid_run(os.path.join(tmp, "cancel.json")))
+
+        started, conflict, running, done = asyncio.run(_endpoint(os.path.join(tmp, "endpoint.json")))
+
+        alert_cron.iter_user_pages = _fake_pages(located=True)
+        env_engine, weather, env_status = asyncio.run(_per_city_environment(os.path.join(tmp, "env.json")))
+    finally:
+        alert_cron.iter_user_pages = original_pages
+
+    serial_secs = len(USERS) * 0.02
+    env_report = env_status["environment"]
+    user_envs = env_engine.environments
+    lagos = build_city_environment("Lagos", 31.0, 85)
+    precomputed = evaluate({}, environment=lagos, wash_logs=[], current_date=None)
+    per_user = evaluate({}, temp_c=31.0, humidity=85, country="Lagos", wash_logs=[], current_date=None)
+    cancel_cursor = cancel_checkpoint["cursor"]
+
+    checks = [
+        ("users run concurrently", elapsed < serial_secs / 3),
+        ("concurrency is bounded by the worker count", engine.peak == 8),
+        ("a hung user times out without stalling the run", status["timed_out"] == 1 and status["state"] == "completed"),
+        ("failing users are counted and listed", status["failed"] == 2 and {"user-0100", "user-0101"} <= {f["user_id"] for f in status["recent_failures"]}),
+        ("every other user is processed", status["succeeded"] == len(USERS) - 3 and status["processed_users"] == len(USERS)),
+        ("alerts and throughput are reported", status["alerts_generated"] == 23 and status["users_per_sec"] > 0),
+        ("alerts are delivered once per page, not per user", len(deliver.batches) == len(USERS) // 40 and status["alert_batches"] == 6),
+        ("a page batch holds only users with candidates", all(batch and all(batch.values()) for batch in deliver.batches)),
+        ("each delivered page's evaluated users go to the page hook", len(pages_done) == 6
+            and sorted(u for page in pages_done for u in page) == sorted(engine.handled)),
+        ("a failed delivery fails its page's users, the run goes on", failed_delivery_status["state"] == "completed"
+            and failed_delivery_status["failed"] == len(failed_deliver.batches[1]) and len(failed_deliver.batches) == 6),
+        ("a completed run checkpoints the last user", checkpoint["state"] == "completed" and checkpoint["cursor"] == USERS[-1]),
+        ("a failed page read stops the run as failed", first_status["state"] == "failed" and first_status["error"]),
+        ("queued users still finish before it stops", resume_from == USERS[119] and len(first_engine.handled) == 120),
+        ("the resumed run covers exactly the rest", first_engine.handled + second_engine.handled == USERS),
+        ("nothing to resume once a run completes", second_status["state"] == "completed" and after_complete is None),
+        ("stopping a run cancels it", cancelled and cancel_checkpoint["state"] == "cancelled"),
+        ("the cancel checkpoint never skips an unfinished user", all(u in cancel_engine.handled for u in USERS if u <= cancel_cursor)),
+        ("nor a user whose alerts were not yet delivered", all(u in cancel_deliver.delivered_users() for u in USERS if u <= cancel_cursor and u.endswith("0"))),
+        ("POST /run returns before the run finishes", started["status"] == "started" and running["state"] == "running"),
+        ("a second POST while running is a 409", conflict),
+        ("GET /status reports the finished run and its checkpoint", done["state"] == "completed" and done["checkpoint"]["cursor"] == USERS[-1]),
+        ("weather is looked up once per city, concurrently", sorted(weather.calls) == CITIES and weather.peak == 3),
+        ("every user gets their city's environment", all(user_envs[u].country == CITIES[int(u[-4:]) % 3] for u in USERS)),
+        ("a city whose lookup fails runs without weather", user_envs["user-0002"].temp_c is None and env_report["cities_without_weather"] == 1),
+        ("the report counts lookups avoided", env_report["lookups"] == 3 and env_report["lookups_avoided"] == len(USERS) - 3),
+        ("a shared environment yields the per-user alerts", [a.alert_type for a in precomputed] == [a.alert_type for a in per_user]),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status_text = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status_text} | {desc}")
+    print(f"         {len(USERS)} users in {elapsed * 1000:.0f}ms (serial {serial_secs * 1000:.0f}ms)")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_alert_cron()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.services.async_db as async_db
+from app.services.async_db import AsyncService, DBTimeoutError, run_db
+from app.services.resilience import safe_call_async
+
+
+class SlowService:
+    """Stands in for DatabaseService: blocking calls that hold their thread."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_active_routine(self, user_id: str) -> dict:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self._lock:
+            self.active -= 1
+        return {"user_id": user_id}
+
+    async def build_greeting(self, name: str) -> str:
+        return f"hi {name}"
+
+
+async def _loop_stays_responsive() -> tuple:
+    service = AsyncService(SlowService(latency=0.2))
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(service.get_active_routine(f"u{i}") for i in range(4)))
+    elapsed = time.perf_counter() - started
+    tick_task.cancel()
+    return results, elapsed, ticks
+
+
+async def _pool_is_bounded() -> int:
+    service = SlowService(latency=0.05)
+    await asyncio.gather(*(run_db(service.get_active_routine, f"u{i}") for i in range(10)))
+    return service.peak
+
+
+async def _times_out() -> tuple:
+    service = SlowService(latency=0.3)
+    try:
+        await run_db(service.get_active_routine, "u1", timeout=0.05)
+        raised = False
+    except DBTimeoutError:
+        raised = True
+    degraded = await safe_call_async(
+        lambda: run_db(service.get_active_routine, "u2", timeout=0.05),
+        fallback={},
+        source="test_async_db",
+        detail="timeout degrades to the fallback",
+    )
+    return raised, degraded
+
+
+async def _surface_matches() -> tuple:
+    service = AsyncService(SlowService(latency=0.0))
+    routine = await service.get_active_routine("u1")
+    greeting = await service.build_greeting("Ada")
+    return routine, greeting, hasattr(service, "no_such_method")
+
+
+def test_async_db():
+    print("--- Async DB Access Test ---")
+    original_pool = async_db.DB_POOL_SIZE
+    async_db.close_db_pool()
+    async_db.DB_POOL_SIZE = 3
+    try:
+        results, elapsed, ticks = asyncio.run(_loop_stays_responsive())
+        peak = asyncio.run(_pool_is_bounded())
+        raised, degraded = asyncio.run(_times_out())
+        routine, greeting, has_missing = asyncio.run(_surface_matches())
+        stats = async_db.db_pool_stats()
+    finally:
+        async_db.close_db_pool()
+        async_db.DB_POOL_SIZE = original_pool
+
+    checks = [
+        ("blocking calls run concurrently off the event loop", len(results) == 4 and elapsed < 0.6),
+        ("the event loop keeps ticking during DB calls", ticks >= 20),
+        ("concurrency is bounded by the pool size", peak == 3),
+        ("a slow call raises DBTimeoutError", raised),
+        ("safe_call_async degrades a timeout to the fallback", degraded == {}),
+        ("sync methods become awaitables with the same name", routine == {"user_id": "u1"}),
+        ("async methods pass straight through", greeting == "hi Ada"),
+        ("unknown methods still raise AttributeError", not has_missing),
+        ("timeouts are counted", stats["timeouts"] >= 2),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         4 x 200ms calls in {elapsed * 1000:.0f}ms, {ticks} loop ticks; stats: {stats}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_async_db()
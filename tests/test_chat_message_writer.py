@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.services.chat_message_writer as chat_message_writer
+from app.services.chat_message_writer import ChatMessageWriter
+
+
+class FakeTable:
+    """Stands in for DatabaseService.append_chat_messages."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.batches = []
+        self.failing = False
+
+    def insert(self, rows):
+        time.sleep(self.latency)
+        if self.failing:
+            raise ConnectionError("database unreachable")
+        self.batches.append(list(rows))
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def _writer(table: FakeTable, spool_path: str, **kwargs) -> ChatMessageWriter:
+    kwargs.setdefault("flush_secs", 0.05)
+    return ChatMessageWriter(table.insert, spool_path=spool_path, **kwargs)
+
+
+async def _batches_and_orders(spool_path: str) -> tuple:
+    table = FakeTable(latency=0.05)
+    writer = _writer(table, spool_path, batch_size=10)
+    started = time.perf_counter()
+    for turn in range(12):
+        for session in ("a", "b"):
+            await writer.submit(session, "user", f"{session}-{turn}", user_id="u1")
+    ack_secs = time.perf_counter() - started
+    await writer.close()
+    per_session = {
+        s: [r["content"] for r in table.rows if r["session_id"] == s] for s in ("a", "b")
+    }
+    ordered = all(per_session[s] == [f"{s}-{t}" for t in range(12)] for s in ("a", "b"))
+    stamps = [r["created_at"] for r in table.rows]
+    return ack_secs, len(table.batches), len(table.rows), ordered, stamps == sorted(stamps)
+
+
+async def _flushes_on_timer(spool_path: str) -> int:
+    table = FakeTable()
+    writer = _writer(table, spool_path, batch_size=100)
+    await writer.submit("s", "user", "hello")
+    await asyncio.sleep(0.2)
+    written = len(table.rows)
+    await writer.close()
+    return written
+
+
+async def _spools_and_replays(spool_path: str) -> tuple:
+    table = FakeTable()
+    table.failing = True
+    writer = _writer(table, spool_path, max_attempts=2)
+    original_base = chat_message_writer._RETRY_BASE_SECS
+    chat_message_writer._RETRY_BASE_SECS = 0.0
+    try:
+        await writer.submit("s", "user", "first")
+        await writer.submit("s", "assistant", "second")
+        await asyncio.sleep(0.2)
+        spooled = writer.stats()["spooled"]
+
+        table.failing = False
+        await writer.submit("s", "user", "third")
+        await asyncio.sleep(0.2)
+        await writer.close()
+    finally:
+        chat_message_writer._RETRY_BASE_SECS = original_base
+    contents = sorted(table.rows, key=lambda r: r["created_at"])
+    return spooled, [r["content"] for r in contents], os.path.exists(spool_path)
+
+
+async def _backpressure(spool_path: str) -> tuple:
+    table = FakeTable(latency=0.1)
+    writer = _writer(table, spool_path, batch_size=2, max_queue=2, enqueue_timeout=0.01)
+    for i in range(8):
+        await writer.submit("s", "user", f"m{i}")
+    stats = writer.stats()
+    await writer.close()
+    replay = _writer(table, spool_path)
+    await replay.submit("s", "user", "after restart")
+    await replay.close()
+    return stats, sorted(r["content"] for r in table.rows)
+
+
+async def _forget_and_drain(spool_path: str) -> tuple:
+    table = FakeTable()
+    writer = _writer(table, spool_path, flush_secs=10, batch_size=100)
+    await writer.submit("gone", "user", "delete me")
+    await writer.submit("kept", "user", "keep me")
+    removed = await writer.forget_session("gone")
+    await writer.close(timeout=1)
+    return removed, [r["content"] for r in table.rows]
+
+
+async def _forget_while_batching(spool_path: str) -> tuple:
+    table = FakeTable()
+    writer = _writer(table, spool_path, flush_secs=0.2, batch_size=100)
+    await writer.submit("gone", "user", "delete me")
+    await writer.submit("kept", "user", "keep me")
+    await asyncio.sleep(0.05)  # the flusher has both rows in a batch and is waiting for more
+    # A row spooled during an outage, replayed after the next successful flush
+    with open(spool_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(chat_message_writer.chat_message_row("gone", "user", "spooled")) + "\n")
+    collecting = len(writer._in_flight)
+    await writer.forget_session("gone")
+    await writer.submit("gone", "user", "after the delete")
+    await asyncio.sleep(0.4)
+    await writer.close(timeout=1)
+    return collecting, [r["content"] for r in table.rows], os.path.exists(spool_path)
+
+
+def test_chat_message_writer():
+    print("--- Chat Message Write-Behind Test ---")
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = lambda name: os.path.join(tmp, f"{name}.jsonl")
+        ack_secs, batches, written, ordered, stamps_sorted = asyncio.run(_batches_and_orders(spool("order")))
+        timer_written = asyncio.run(_flushes_on_timer(spool("timer")))
+        spooled, replayed, spool_left = asyncio.run(_spools_and_replays(spool("retry")))
+        pressure, after_restart = asyncio.run(_backpressure(spool("pressure")))
+        removed, drained = asyncio.run(_forget_and_drain(spool("forget")))
+        collecting, batched, forgot_spool_left = asyncio.run(_forget_while_batching(spool("batching")))
+
+    checks = [
+        ("submit acknowledges without waiting on the insert", ack_secs < 0.05),
+        ("rows are written as multi-row inserts", written == 24 and batches <= 4),
+        ("each session's messages keep their order", ordered and stamps_sorted),
+        ("a partial batch flushes on the timer", timer_written == 1),
+        ("failed batches are spooled", spooled == 2),
+        ("spooled rows are replayed once the database is back", replayed == ["first", "second", "third"] and not spool_left),
+        ("a full queue applies backpressure then spools", pressure["backpressure_waits"] > 0 and pressure["spooled"] > 0),
+        ("nothing is lost across backpressure and restart", after_restart == sorted([f"m{i}" for i in range(8)] + ["after restart"])),
+        ("forgetting a session drops its queued rows", removed == 1),
+        ("close drains what's left", drained == ["keep me"]),
+        ("forgetting a session drops rows already in a collecting batch", collecting == 2
+            and "delete me" not in batched and "keep me" in batched),
+        ("forgetting a session drops its spooled rows", "spooled" not in batched and not forgot_spool_left),
+        ("messages sent after the delete are still written", "after the delete" in batched),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         ack: {ack_secs * 1000:.1f}ms for 24 messages, {batches} inserts")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_chat_message_writer()
@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.services.decision_state.models import SessionSignal
+from app.services.session_classification import fused_detector
+from app.services.session_intent.intent_detector import DEFAULT_INTENT
+from app.services.session_intent.session_intent_service import build_session_intent
+from app.services.session_signal.signal_detector import SIGNAL_NAMES, empty_signals
+
+FULL = {
+    "absorption_blocked": False, "hold_loss": False, "breakage_active": True,
+    "buildup_present": False, "coated_feel": False, "scalp_sensitivity": True,
+    "confidence_score": 0.85, "evidence_quote": "my ends keep snapping",
+    "fallback_used": False,
+    "journey_state": "diagnosing", "intent_clarity": "medium", "confidence_level": "unsure",
+    "friction_score": "moderate", "emotional_state": "frustrated", "reasoning": "describes a problem",
+}
+
+# Signals only — the model dropped the whole intent half and two signal keys
+PARTIAL = {"breakage_active": True, "hold_loss": False, "confidence_score": 0.6, "fallback_used": True}
+
+# Every key present, but the model answered null where it wasn't sure
+NULLS = {k: None for k in FULL} | {"hold_loss": True}
+
+
+async def _detect(response) -> tuple:
+    async def fake_generate_json(prompt):
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    saved = fused_detector.generate_json
+    fused_detector.generate_json = fake_generate_json
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # the detector logs every call
+            return await fused_detector.detect_signals_and_intent([{"role": "user", "content": "hello"}])
+    finally:
+        fused_detector.generate_json = saved
+
+
+def _builds(signals, intent) -> bool:
+    """The pipeline turns both halves into models; that must not raise."""
+    try:
+        SessionSignal(**signals)
+        build_session_intent(intent)
+    except Exception:
+        return False
+    return True
+
+
+def test_fused_detector():
+    print("--- Fused Detector Test ---")
+    full_signals, full_intent = asyncio.run(_detect(FULL))
+    partial_signals, partial_intent = asyncio.run(_detect(PARTIAL))
+    null_signals, null_intent = asyncio.run(_detect(NULLS))
+    empty_result_signals, empty_result_intent = asyncio.run(_detect({}))
+    malformed_signals, malformed_intent = asyncio.run(_detect(json.JSONDecodeError("Expecting value", "{", 1)))
+    wrong_shape_signals, wrong_shape_intent = asyncio.run(_detect(["breakage_active"]))
+    malformed_ok = malformed_signals == empty_signals() and malformed_intent == DEFAULT_INTENT
+    malformed_intent["journey_state"] = "evaluating"
+
+    checks = [
+        ("a full answer is parsed into both halves", full_signals["breakage_active"] and full_signals["scalp_sensitivity"]
+            and not full_signals["hold_loss"] and full_signals["confidence_score"] == 0.85
+            and full_signals["evidence_quote"] == "my ends keep snapping" and full_signals["fallback_used"] is False),
+        ("a full answer keeps every intent dimension", full_intent == {k: FULL[k] for k in DEFAULT_INTENT}),
+        ("missing signals read as false", partial_signals["breakage_active"]
+            and not any(partial_signals[k] for k in SIGNAL_NAMES if k != "breakage_active")
+            and partial_signals["evidence_quote"] == "" and partial_signals["fallback_used"] is True),
+        ("a missing intent half falls back to DEFAULT_INTENT", partial_intent == DEFAULT_INTENT),
+        ("null fields fall back like missing ones", null_signals["hold_loss"] and null_signals["confidence_score"] == 0.0
+            and null_signals["evidence_quote"] == "" and null_intent == DEFAULT_INTENT),
+        ("an empty object reads as all clear", empty_result_signals == empty_signals()
+            and empty_result_intent == DEFAULT_INTENT),
+        ("malformed JSON falls back to empty_signals / DEFAULT_INTENT", malformed_ok),
+        ("a non-object answer falls back to empty_signals / DEFAULT_INTENT", wrong_shape_signals == empty_signals()
+            and wrong_shape_intent == DEFAULT_INTENT),
+        ("the fallback intent is a copy", DEFAULT_INTENT["journey_state"] == "discovering"),
+        ("every outcome builds SessionSignal / SessionIntent", all(_builds(s, i) for s, i in (
+            (full_signals, full_intent), (partial_signals, partial_intent), (null_signals, null_intent),
+            (empty_result_signals, empty_result_intent), (wrong_shape_signals, wrong_shape_intent)))),
+        ("the intent model carries the parsed dimensions", build_session_intent(full_intent).journey_state == "diagnosing"),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_fused_detector()
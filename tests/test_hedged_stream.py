@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.agents.llm_call import provider
+
+
+def _fake_stream(name: str, first_token_delay: float, log: list):
+    async def stream(prompt: str, temperature: float = 0.1):
+        try:
+            await asyncio.sleep(first_token_delay)
+            for word in (f"{name}-a ", f"{name}-b"):
+                yield {"type": "content", "content": word}
+                await asyncio.sleep(0.005)
+            yield {"type": "token_usage", "model": name,
+                   "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}}
+        except asyncio.CancelledError:
+            log.append(f"{name} cancelled")
+            raise
+    return stream
+
+
+_PATCHED = ("LLM_PROVIDER", "GEMINI_API_KEY", "LLM_HEDGE_STREAM", "LLM_HEDGE_AFTER_SECS", "_openai_stream", "_gemini_stream")
+
+
+async def _collect(primary_delay: float, secondary_delay: float) -> tuple:
+    log: list = []
+    saved = {name: getattr(provider, name) for name in _PATCHED}
+    provider.LLM_PROVIDER = "openai"
+    provider.GEMINI_API_KEY = "test"
+    provider.LLM_HEDGE_STREAM = True
+    provider.LLM_HEDGE_AFTER_SECS = 0.05
+    provider._openai_stream = _fake_stream("openai", primary_delay, log)
+    provider._gemini_stream = _fake_stream("gemini", secondary_delay, log)
+    try:
+        chunks = [c async for c in provider.stream_text("hello")]
+        await asyncio.sleep(0.01)
+    finally:
+        for name, value in saved.items():
+            setattr(provider, name, value)
+    text = "".join(c["content"] for c in chunks if c["type"] == "content")
+    usage = [c for c in chunks if c["type"] == "token_usage"]
+    return text, usage, log
+
+
+def test_hedged_stream():
+    print("--- Hedged stream_text Test ---")
+    fast_text, fast_usage, fast_log = asyncio.run(_collect(0.0, 0.0))
+    slow_text, slow_usage, slow_log = asyncio.run(_collect(0.5, 0.0))
+    both_text, both_usage, _ = asyncio.run(_collect(0.07, 0.5))
+
+    checks = [
+        ("fast primary is not hedged", fast_text == "openai-a openai-b" and len(fast_usage) == 1 and not fast_log),
+        ("slow primary loses to the hedge", slow_text == "gemini-a gemini-b"),
+        ("loser is cancelled", slow_log == ["openai cancelled"]),
+        ("usage reported for both lanes", len(slow_usage) == 2 and slow_usage[-1].get("hedge") == "cancelled"),
+        ("primary still wins if it answers first after hedging", both_text == "openai-a openai-b" and len(both_usage) == 2),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         stats: {provider.hedge_stats()}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_hedged_stream()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.agents.llm_call import provider
+from app.agents.llm_call.response_cache import build_cache
+
+
+class FakeNotFound(Exception):
+    status_code = 404
+
+
+class FakeCompletions:
+    """chat.completions stand-in: models in `missing` 404, the rest answer with their name."""
+
+    def __init__(self):
+        self.missing = set()
+        self.calls = []
+
+    async def create(self, model, **kwargs):
+        self.calls.append(model)
+        if model in self.missing:
+            raise FakeNotFound(f"Error code: 404 - model {model} does not exist")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f'{{"model": "{model}"}}'))])
+
+
+_PATCHED = ("LLM_PROVIDER", "OPENAI_CHAT_MODEL", "OPENAI_CHAT_FALLBACK_MODEL", "_json_cache")
+
+
+async def _scenario(completions: FakeCompletions) -> dict:
+    results = {}
+
+    completions.missing.add("primary-model")
+    results["fallback_first"] = await provider.generate_json("hello")
+    results["fallback_second"] = await provider.generate_json("hello")
+    results["calls_while_missing"] = list(completions.calls)
+
+    completions.missing.clear()
+    completions.calls.clear()
+    results["primary_first"] = await provider.generate_json("hello")
+    results["primary_second"] = await provider.generate_json("hello")
+    results["calls_while_healthy"] = list(completions.calls)
+    return results
+
+
+def test_json_cache():
+    print("--- generate_json Cache Test ---")
+    completions = FakeCompletions()
+    saved = {name: getattr(provider, name) for name in _PATCHED}
+    saved_client = provider._clients.get("openai")
+    provider.LLM_PROVIDER = "openai"
+    provider.OPENAI_CHAT_MODEL = "primary-model"
+    provider.OPENAI_CHAT_FALLBACK_MODEL = "backup-model"
+    provider._json_cache = build_cache(backend="memory")
+    provider._clients["openai"] = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    try:
+        results = asyncio.run(_scenario(completions))
+    finally:
+        for name, value in saved.items():
+            setattr(provider, name, value)
+        if saved_client is None:
+            provider._clients.pop("openai", None)
+        else:
+            provider._clients["openai"] = saved_client
+
+    checks = [
+        ("a fallback model's answer is served", results["fallback_first"] == {"model": "backup-model"}
+            and results["fallback_second"] == {"model": "backup-model"}),
+        ("a fallback model's answer isn't cached under the primary's key",
+            results["calls_while_missing"] == ["primary-model", "backup-model"] * 2),
+        ("the primary answers once the model is back", results["primary_first"] == {"model": "primary-model"}
+            and results["primary_second"] == {"model": "primary-model"}),
+        ("the primary's answer is cached", results["calls_while_healthy"] == ["primary-model"]),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_json_cache()
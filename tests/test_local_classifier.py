@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.services.session_classification import session_classification_service as service
+from app.services.session_classification.local_classifier import (
+    classify_local,
+    intent_exemplars,
+    signal_exemplars,
+)
+from app.services.session_signal.signal_detector import SIGNAL_NAMES
+
+
+def _turn(text):
+    return [{"role": "user", "content": text}]
+
+
+async def _cascade(text):
+    calls = []
+
+    async def fake_fused(messages):
+        calls.append("fused")
+        return {k: False for k in SIGNAL_NAMES} | {"confidence_score": 0.2}, {"journey_state": "discovering"}
+
+    saved = service.detect_signals_and_intent
+    service.detect_signals_and_intent = fake_fused
+    try:
+        signals, intent = await service.classify_with_cascade(_turn(text))
+    finally:
+        service.detect_signals_and_intent = saved
+    return calls, signals, intent
+
+
+def test_local_classifier():
+    print("--- Local Classifier Test ---")
+    signal_ex = signal_exemplars()
+    intent_ex = intent_exemplars()
+
+    snapping, snapping_intent = classify_local(_turn("My hair keeps snapping when I detangle, lots of short broken pieces"))
+    vague, _ = classify_local(_turn("Hi there, what do you think?"))
+    child, _ = classify_local(_turn("My child has a very sensitive scalp that is always itchy and gets irritated easily"))
+    shared_only, _ = classify_local(_turn("My scalp is itchy"))
+    local_calls, local_signals, _ = asyncio.run(_cascade("My scalp is itchy, flaky and sore"))
+    escalated_calls, _, _ = asyncio.run(_cascade("Hi there, what do you think?"))
+
+    checks = [
+        ("exemplars parsed for every signal", set(signal_ex) == set(SIGNAL_NAMES) and all(signal_ex.values())),
+        ("exemplars parsed for every intent dimension", len(intent_ex) == 5 and len(intent_ex["journey_state"]) == 7),
+        ("clear breakage turn answered locally", snapping["breakage_active"] and snapping["local_confident"]),
+        ("confidence reported in confidence_score", 0.6 <= snapping["confidence_score"] <= 1.0),
+        ("problem turn reads as diagnosing", snapping_intent["journey_state"] == "diagnosing"),
+        ("a phrase shared by two signals doesn't flag both", child["scalp_sensitivity"] and not child["buildup_present"]
+            and child["local_confident"]),
+        ("a turn only a shared phrase matches is not trusted", not shared_only["buildup_present"]
+            and not shared_only["local_confident"]),
+        ("vague turn is not trusted", not vague["local_confident"] and vague["confidence_score"] == 0.0),
+        ("confident turn skips the LLM", local_calls == [] and local_signals["scalp_sensitivity"]),
+        ("ambiguous turn escalates", escalated_calls == ["fused"]),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_local_classifier()
@@ -0,0 +1,195 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import app.services.recommendations.push_service as push_service
+from app.services.recommendations.push_service import send_push_batch, send_push_notification
+from fake_push_endpoint import FakePushService, generate_vapid_keys
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db = db
+        self.rows = list(db.rows)
+        self.deleting = False
+
+    def select(self, columns):
+        return self
+
+    def delete(self):
+        self.deleting = True
+        return self
+
+    def in_(self, column, values):
+        self.rows = [r for r in self.rows if r[column] in values]
+        return self
+
+    def execute(self):
+        if self.deleting:
+            self.db.rows = [r for r in self.db.rows if r not in self.rows]
+            self.db.deletes += 1
+            return SimpleNamespace(data=self.rows)
+        self.db.reads += 1
+        return SimpleNamespace(data=[dict(r) for r in self.rows])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+        self.deletes = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+USERS = [f"user-{i:02d}" for i in range(40)]
+EXPIRED = {"user-03": "gone-3", "user-05": "missing-5"}
+
+
+def _subscriptions(service):
+    """Two live devices per user; a few users also have a dead, failing or slow one."""
+    rows = []
+    for i, user_id in enumerate(USERS):
+        rows += [service.subscription(user_id, f"ok-{i}-a"), service.subscription(user_id, f"ok-{i}-b")]
+    for user_id, token in EXPIRED.items():
+        rows.append(service.subscription(user_id, token))
+    rows.append(service.subscription("user-07", "error-7"))
+    rows.append(service.subscription("user-09", "slow-9"))
+    return rows
+
+
+def _batch(users):
+    return [{"user_id": u, "title": "New routine tip", "body": f"hi {u}", "data": {"url": "/recommendations"}} for u in users]
+
+
+async def _scenario(service, supabase):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    report = await send_push_batch(_batch(USERS + ["user-without-devices"]))
+    elapsed = time.perf_counter() - started
+    tick_task.cancel()
+    reads = supabase.reads
+
+    rejected_before = list(service.rejected)
+    second = await send_push_batch(_batch(EXPIRED))
+    single_ok = await send_push_notification("user-01", "Hello", "one user")
+    single_none = await send_push_notification("user-without-devices", "Hello", "nobody")
+    vapid = (push_service.vapid_cache_stats(), push_service.load_vapid_key())
+
+    # Inside the refresh window the header is re-signed every time
+    push_service.PUSH_VAPID_REFRESH_SECS = push_service._VAPID_EXPIRY_SECS + 1
+    signed_before = push_service.vapid_cache_stats()["signed"]
+    await send_push_notification("user-01", "Hello", "again")
+    resigned = push_service.vapid_cache_stats()["signed"] - signed_before
+    return report, elapsed, ticks, reads, rejected_before, second, single_ok, single_none, vapid, resigned
+
+
+def _jwt_claims(authorization):
+    token = authorization.split("t=", 1)[1].split(",", 1)[0]
+    claims = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(claims + "=" * (-len(claims) % 4)))
+
+
+def test_push_dispatch():
+    print("--- Push Dispatch Test ---")
+    service = FakePushService(latency=0.02, slow_secs=1.0)
+    supabase = FakeSupabase(_subscriptions(service))
+    subscriptions_before = len(supabase.rows)
+    private_key, public_key = generate_vapid_keys()
+
+    saved = (
+        push_service.get_supabase, push_service._http_client,
+        push_service.PUSH_CONCURRENCY, push_service.PUSH_TIMEOUT_SECS, push_service.PUSH_VAPID_REFRESH_SECS,
+    )
+    saved_env = {k: os.environ.get(k) for k in ("VAPID_PRIVATE_KEY", "NEXT_PUBLIC_VAPID_PUBLIC_KEY")}
+    push_service.get_supabase = lambda: supabase
+    push_service._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=service))
+    push_service.PUSH_CONCURRENCY = 8
+    push_service.PUSH_TIMEOUT_SECS = 0.2
+    os.environ["VAPID_PRIVATE_KEY"], os.environ["NEXT_PUBLIC_VAPID_PUBLIC_KEY"] = private_key, public_key
+    loaded_key = push_service.load_vapid_key()
+    try:
+        results = asyncio.run(_scenario(service, supabase))
+        report, elapsed, ticks, reads, rejected_before, second, single_ok, single_none, vapid, resigned = results
+        os.environ.pop("VAPID_PRIVATE_KEY")
+        unconfigured = asyncio.run(send_push_batch(_batch(USERS[:1])))
+    finally:
+        (
+            push_service.get_supabase, push_service._http_client,
+            push_service.PUSH_CONCURRENCY, push_service.PUSH_TIMEOUT_SECS, push_service.PUSH_VAPID_REFRESH_SECS,
+        ) = saved
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        push_service.load_vapid_key()
+
+    live = 2 * len(USERS)
+    serial_secs = (live + 4) * 0.02 + 1.0
+    first_payload = next(r["payload"] for r in service.received if r["token"] == "ok-0-a")
+    remaining_endpoints = {r["endpoint"].rsplit("/", 1)[-1] for r in supabase.rows}
+    vapid_stats, reloaded_key = vapid
+    authorizations = {r["headers"]["authorization"] for r in service.received}
+    claims = _jwt_claims(next(iter(authorizations)))
+
+    checks = [
+        ("every live subscription is delivered", report["delivered"] == live and report["subscriptions"] == live + 4),
+        ("subscriptions are read in one query per 100 users", reads == 1 and report["users"] == len(USERS) + 1),
+        ("users without devices are reported", report["users_without_subscriptions"] == 1),
+        ("sends run concurrently, bounded by PUSH_CONCURRENCY", service.peak_in_flight == 8 and elapsed < serial_secs / 3),
+        ("the event loop keeps running during the batch", ticks >= elapsed / 0.01 * 0.5),
+        ("a slow push service times out instead of stalling the batch", report["timed_out"] == 1),
+        ("a 5xx is a failure, not an expiry", report["failed"] == 1 and "error-7" in rejected_before),
+        ("errors name the push-service origin, not the endpoint", report["errors"] and all("/push/" not in e for e in report["errors"])),
+        ("404/410 subscriptions are expired and pruned", report["expired"] == 2 and report["pruned"] == 2),
+        ("pruned subscriptions are gone from the table", not set(EXPIRED.values()) & remaining_endpoints
+            and len(supabase.rows) == subscriptions_before - 2),
+        ("a pruned subscription is never retried", second["expired"] == 0 and service.rejected.count("gone-3") == 1),
+        ("the payload arrives encrypted as JSON", first_payload == {
+            "title": "New routine tip", "body": "hi user-00", "icon": "/icons/icon-192x192.png",
+            "badge": "/icons/icon-192x192.png", "url": "/recommendations",
+        }),
+        ("send_push_notification is True when every device gets it", single_ok is True),
+        ("send_push_notification is False without subscriptions", single_none is False),
+        ("the VAPID key is parsed once", reloaded_key is loaded_key and loaded_key is not None),
+        ("one VAPID signature serves every send to an origin", vapid_stats["signed"] == 1 and vapid_stats["origins"] == 1
+            and vapid_stats["reused"] == report["subscriptions"] + second["subscriptions"] + 2 - 1),
+        ("the shared header carries the origin and a future expiry", claims["aud"] == "http://push.test"
+            and claims["exp"] > time.time() + 11 * 3600),
+        ("inside the refresh window each send re-signs", resigned == 2),
+        ("missing VAPID keys send nothing", unconfigured["subscriptions"] == 0 and unconfigured["errors"]),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         {report['subscriptions']} sends in {elapsed * 1000:.0f}ms (serial ~{serial_secs * 1000:.0f}ms)")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_push_dispatch()
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.agents.llm_call.rate_limiter import (
+    ModelLimiter,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_WEB_CHAT,
+    current_priority,
+    llm_priority,
+)
+
+
+async def _priority_order() -> list:
+    limiter = ModelLimiter("test-model", rpm=6000, tpm=10_000_000, max_concurrency=1)
+    order = []
+
+    async def call(name: str, priority: int):
+        await limiter.acquire(priority, tokens=10)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        limiter.release()
+
+    # Occupy the only slot, then queue low-priority work ahead of interactive work
+    await limiter.acquire(PRIORITY_INTERACTIVE, tokens=10)
+    tasks = [
+        asyncio.create_task(call("cron-1", PRIORITY_BACKGROUND)),
+        asyncio.create_task(call("cron-2", PRIORITY_BACKGROUND)),
+        asyncio.create_task(call("web", PRIORITY_WEB_CHAT)),
+        asyncio.create_task(call("chat", PRIORITY_INTERACTIVE)),
+    ]
+    await asyncio.sleep(0.01)
+    limiter.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+async def _background_reserve() -> tuple:
+    limiter = ModelLimiter("test-model", rpm=6000, tpm=10_000_000, max_concurrency=4)
+    for _ in range(2):
+        await limiter.acquire(PRIORITY_BACKGROUND, tokens=10)
+    blocked = asyncio.create_task(limiter.acquire(PRIORITY_BACKGROUND, tokens=10))
+    await asyncio.sleep(0.01)
+    background_blocked = not blocked.done()
+    await asyncio.wait_for(limiter.acquire(PRIORITY_INTERACTIVE, tokens=10), timeout=0.5)
+    blocked.cancel()
+    return background_blocked, limiter.in_flight
+
+
+async def _cancelled_waiter_frees_queue() -> bool:
+    limiter = ModelLimiter("test-model", rpm=6000, tpm=10_000_000, max_concurrency=1)
+    await limiter.acquire(PRIORITY_INTERACTIVE, tokens=10)
+    doomed = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE, tokens=10))
+    survivor = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE, tokens=10))
+    await asyncio.sleep(0.01)
+    doomed.cancel()
+    limiter.release()
+    await asyncio.wait_for(survivor, timeout=0.5)
+    return limiter.in_flight == 1
+
+
+def test_rate_limiter():
+    print("--- Provider Rate Limiter Test ---")
+    order = asyncio.run(_priority_order())
+    background_blocked, in_flight = asyncio.run(_background_reserve())
+    cancel_ok = asyncio.run(_cancelled_waiter_frees_queue())
+
+    with llm_priority(PRIORITY_BACKGROUND):
+        inside = current_priority()
+    outside = current_priority()
+
+    checks = [
+        ("interactive jumps queued cron work", order == ["chat", "web", "cron-1", "cron-2"]),
+        ("background lane leaves headroom", background_blocked),
+        ("interactive still admitted while background is capped", in_flight == 3),
+        ("cancelled waiter doesn't strand the queue", cancel_ok),
+        ("llm_priority scopes the contextvar", inside == PRIORITY_BACKGROUND and outside == PRIORITY_INTERACTIVE),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         admission order: {order}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_rate_limiter()
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.api.recommendations as recommendations_api
+import app.services.recommendations.recommendation_precompute as precompute
+from app.services.async_db import AsyncService
+from app.services.db_service import DatabaseService
+from app.services.recommendations.recommendation_precompute import RecommendationPrecomputer
+
+
+class FakeQuery:
+    """routine_recommendations in memory: insert, update, filtered/ordered selects."""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = list(db.rows)
+        self.action = None
+        self.values = None
+        self.row_limit = None
+
+    def select(self, columns):
+        return self
+
+    def insert(self, rows):
+        self.action, self.values = "insert", rows
+        return self
+
+    def update(self, values):
+        self.action, self.values = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r.get(column) == value]
+        return self
+
+    def lt(self, column, value):
+        self.rows = [r for r in self.rows if r.get(column) < value]
+        return self
+
+    def order(self, column, desc=False):
+        self.rows.sort(key=lambda r: r[column], reverse=desc)
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def execute(self):
+        if self.action == "insert":
+            if not self.db.has_set_columns and "set_id" in self.values[0]:
+                raise RuntimeError("PGRST204: Could not find the 'set_id' column of 'routine_recommendations'")
+            for row in self.values:
+                self.db.rows.append({"id": f"rec-{len(self.db.rows)}", **row})
+            self.db.inserts += 1
+            return SimpleNamespace(data=self.values)
+        if self.action == "update":
+            for row in self.rows:
+                row.update(self.values)
+            return SimpleNamespace(data=self.rows)
+        self.db.reads += 1
+        return SimpleNamespace(data=[dict(r) for r in self.rows[: self.row_limit]])
+
+
+class FakeSupabase:
+    def __init__(self, has_set_columns=True):
+        self.rows = []
+        self.has_set_columns = has_set_columns
+        self.reads = 0
+        self.inserts = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+class FakeDatabase(DatabaseService):
+    """Real recommendation reads/writes over FakeSupabase; canned user context."""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.context_reads = 0
+
+    def get_user_metadata(self, user_id):
+        self.context_reads += 1
+        return {"first_name": "Ada", "location": "Lagos", "primary_goal": "moisture"}
+
+    def get_active_routine(self, user_id):
+        self.context_reads += 1
+        return {"routine": [{"step": "Cleanse"}]}
+
+    def get_pending_alerts(self, user_id, limit=3):
+        self.context_reads += 1
+        return []
+
+
+class FakeAgent:
+    """generate_recommendations stand-in: slow like an LLM call; can fail or return nothing."""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = []
+        self.fail = set()
+        self.empty = set()
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, user_id, user_metadata, routine, alerts, vitals):
+        self.calls.append(user_id)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        if user_id in self.fail:
+            raise RuntimeError("LLM unavailable")
+        if user_id in self.empty:
+            return []
+        n = len(self.calls)
+        return [
+            {"title": f"tip {n}.{i}", "message": "m", "reasoning": "r",
+             "routine_step_ref": "Cleanse", "recommendation_type": "habit"}
+            for i in range(2)
+        ]
+
+
+async def _timed_get(user_id):
+    started = time.perf_counter()
+    response = await recommendations_api.get_recommendations(user_id)
+    return response, (time.perf_counter() - started) * 1000
+
+
+async def _scenario(db, supabase, agent, precomputer):
+    results = {}
+
+    # Cold read: returns at once and queues generation instead of calling the LLM
+    results["cold"], results["cold_ms"] = await _timed_get("u1")
+    await precomputer.drain()
+    results["warm"], results["warm_ms"] = await _timed_get("u1")
+    results["calls_after_warm"] = len(agent.calls)
+
+    # Cron for a user with a fresh set: one indexed read, no generation
+    precompute.schedule_page_recommendations(["u1"])
+    await precomputer.drain()
+    results["cron_fresh_calls"] = len(agent.calls)
+
+    # A hair event regenerates and supersedes the previous set
+    first_ids = {r.id for r in results["warm"].recommendations}
+    precompute.schedule_recommendations("u1", "hair_event", force=True)
+    await precomputer.drain()
+    results["after_event"], _ = await _timed_get("u1")
+    results["superseded"] = [r for r in supabase.rows if r["id"] in first_ids]
+
+    # Duplicate requests coalesce; a hair event upgrades a queued cron request
+    for _ in range(5):
+        precompute.schedule_page_recommendations(["u2"])
+    precompute.schedule_recommendations("u2", "hair_event", force=True)
+    results["u2_queued"] = precomputer.stats()["queued"]
+    await precomputer.drain()
+    results["u2_calls"] = agent.calls.count("u2")
+    results["u2_generated_by"] = {r.get("generated_by") for r in supabase.rows if r["user_id"] == "u2"}
+
+    # A failed or empty generation keeps the previous set
+    agent.fail.add("u1")
+    precompute.schedule_recommendations("u1", "hair_event", force=True)
+    agent.empty.add("u2")
+    precompute.schedule_recommendations("u2", "hair_event", force=True)
+    await precomputer.drain()
+    results["after_failure"], _ = await _timed_get("u1")
+    results["after_empty"], _ = await _timed_get("u2")
+
+    # An old set is served, flagged stale, and refreshed in the background
+    old = (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
+    supabase.rows.append({"id": "old-1", "user_id": "u3", "title": "old tip", "message": "m",
+                          "recommendation_type": "habit", "status": "pending", "created_at": old})
+    results["stale"], _ = await _timed_get("u3")
+    await precomputer.drain()
+    results["refreshed"], _ = await _timed_get("u3")
+
+    # A cron page over many users runs at most `workers` generations at once
+    agent.peak = 0
+    precompute.schedule_page_recommendations([f"bulk-{i}" for i in range(12)])
+    started = time.perf_counter()
+    await precomputer.drain()
+    results["bulk_secs"] = time.perf_counter() - started
+    results["stats"] = precomputer.stats()
+
+    # A hair event for a user nobody queued goes ahead of a cron backlog already being worked
+    precompute.schedule_page_recommendations([f"backlog-{i}" for i in range(15)])
+    await asyncio.sleep(agent.latency / 4)  # workers are mid-generation
+    calls_before = len(agent.calls)
+    precompute.schedule_recommendations("urgent", "hair_event", force=True)
+    precompute.schedule_recommendations("reader", "read_miss")
+    await precomputer.drain()
+    served = agent.calls[calls_before:]
+    results["urgent_position"] = served.index("urgent")
+    results["reader_position"] = served.index("reader")
+
+    # The cron lane holds at most max_queued_cron users; interactive requests still get in
+    agent.latency = 0.01
+    precompute.schedule_page_recommendations([f"flood-{i}" for i in range(25)])
+    results["flood_queued"] = precomputer.stats()["queued_cron"]
+    results["flood_urgent"] = precompute.schedule_recommendations("urgent-2", "hair_event", force=True)
+    await precomputer.drain()
+    results["final_stats"] = precomputer.stats()
+    await precomputer.stop()
+    return results
+
+
+def _without_set_columns():
+    supabase = FakeSupabase(has_set_columns=False)
+    db = FakeDatabase(supabase)
+    saved = db.save_recommendation_set("u9", [{"title": "t", "message": "m", "recommendation_type": "habit"}], "cron")
+    return saved, supabase.rows, db._recommendation_set_columns
+
+
+def test_recommendation_precompute():
+    print("--- Recommendation Precompute Test ---")
+    supabase = FakeSupabase()
+    db = FakeDatabase(supabase)
+    agent = FakeAgent()
+    llm_ms = agent.latency * 1000
+    precomputer = RecommendationPrecomputer(workers=3, timeout=2.0, max_queued_cron=20)
+
+    saved = (
+        precompute.get_async_db, recommendations_api.get_async_db,
+        precompute.generate_recommendations, precompute._precomputer,
+    )
+    precompute.get_async_db = recommendations_api.get_async_db = lambda: AsyncService(db)
+    precompute.generate_recommendations = agent
+    precompute._precomputer = precomputer
+    try:
+        results = asyncio.run(_scenario(db, supabase, agent, precomputer))
+        no_columns = _without_set_columns()
+    finally:
+        (
+            precompute.get_async_db, recommendations_api.get_async_db,
+            precompute.generate_recommendations, precompute._precomputer,
+        ) = saved
+
+    cold, warm = results["cold"], results["warm"]
+    after_event = results["after_event"]
+    stats, final_stats = results["stats"], results["final_stats"]
+    no_columns_saved, no_columns_rows, no_columns_flag = no_columns
+
+    checks = [
+        ("a cold read returns without waiting on the LLM", cold.recommendations == [] and cold.status == "pending"
+            and results["cold_ms"] < llm_ms / 4),
+        ("the cold read queued a background generation", len(warm.recommendations) == 2 and results["calls_after_warm"] == 1),
+        ("reads are pure reads with a freshness marker", warm.generated_at and warm.stale is False
+            and results["warm_ms"] < llm_ms / 4),
+        ("each set is saved in one insert", supabase.inserts >= 1 and all(r.get("set_id") for r in supabase.rows if r["id"] != "old-1")),
+        ("the cron skips users whose set is fresh", results["cron_fresh_calls"] == 1),
+        ("a hair event regenerates the set", {r.title for r in after_event.recommendations} == {"tip 2.0", "tip 2.1"}),
+        ("the previous set is superseded, not shown", all(r["status"] == "superseded" for r in results["superseded"])),
+        ("duplicate requests for one user coalesce", results["u2_queued"] == 1 and results["u2_calls"] == 1),
+        ("a hair event upgrades a queued cron request", results["u2_generated_by"] == {"hair_event"} and results["u2_calls"] == 1),
+        ("a failed generation keeps the previous set", {r.title for r in results["after_failure"].recommendations} == {"tip 2.0", "tip 2.1"}),
+        ("an empty generation keeps the previous set", len(results["after_empty"].recommendations) == 2),
+        ("an old set is served but flagged stale", results["stale"].stale is True and results["stale"].recommendations[0].title == "old tip"),
+        ("a stale read queues a refresh", results["refreshed"].stale is False and results["refreshed"].recommendations[0].title != "old tip"),
+        ("generations are bounded by the worker count", agent.peak == 3 and results["bulk_secs"] < 12 * llm_ms / 1000 / 2),
+        ("a hair event is served ahead of queued cron users", results["urgent_position"] == 0
+            and results["reader_position"] == 1),
+        ("the cron lane is capped; extra cron requests are dropped", results["flood_queued"] == 20
+            and final_stats["cron_dropped"] == 5 and final_stats["queued_cron"] == 0),
+        ("a full cron lane doesn't block interactive requests", results["flood_urgent"] is True),
+        ("stats count outcomes", stats["failed"] == 1 and stats["empty"] == 1 and stats["fresh_skipped"] == 1 and stats["deduped"] >= 5),
+        ("without the set columns sets still save", no_columns_saved and len(no_columns_rows) == 1 and no_columns_flag is False),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         cold read {results['cold_ms']:.1f}ms, warm read {results['warm_ms']:.1f}ms, LLM {llm_ms:.0f}ms")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_recommendation_precompute()
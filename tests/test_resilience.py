@@ -0,0 +1,205 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.agents.llm_call import resilience
+from app.agents.llm_call.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitOpenError,
+    call_with_retry,
+    get_breaker,
+    llm_deadline,
+    stream_with_retry,
+)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        super().__init__(f"Error code: {status_code}")
+
+
+async def _retries_then_succeeds() -> tuple:
+    attempts = []
+
+    async def call(model):
+        attempts.append(model)
+        if len(attempts) < 3:
+            raise FakeAPIError(503)
+        return "ok"
+
+    result = await call_with_retry(["retry-model"], call)
+    return result, len(attempts), get_breaker("retry-model").state
+
+
+async def _client_error_not_retried() -> tuple:
+    attempts = []
+
+    async def call(model):
+        attempts.append(model)
+        raise FakeAPIError(400)
+
+    try:
+        await call_with_retry(["bad-request-model"], call)
+    except FakeAPIError:
+        pass
+    return len(attempts), get_breaker("bad-request-model").consecutive_failures
+
+
+async def _breaker_opens_and_fails_over() -> tuple:
+    served_by = []
+
+    async def call(model):
+        if model == "sick-model":
+            raise FakeAPIError(429)
+        served_by.append(model)
+        return model
+
+    first = await call_with_retry(["sick-model", "backup-model"], call)
+    sick_state = get_breaker("sick-model").state
+    try:
+        await call_with_retry(["sick-model"], call)
+        fast_fail = False
+    except CircuitOpenError:
+        fast_fail = True
+    return first, sick_state, fast_fail
+
+
+async def _half_open_probe() -> tuple:
+    breaker = get_breaker("probe-model")
+    breaker.record_failure(FakeAPIError(500))
+    breaker.state, breaker.opened_at = OPEN, 0.0   # cooldown long over
+    first_allowed = breaker.allow()
+    second_allowed = breaker.allow()
+    state_during_probe = breaker.state
+    breaker.record_success()
+    return first_allowed, second_allowed, state_during_probe, breaker.state
+
+
+async def _deadline_bounds_retries() -> tuple:
+    attempts = []
+
+    async def call(model):
+        attempts.append(model)
+        raise FakeAPIError(502)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with llm_deadline(0.05):
+        try:
+            await call_with_retry(["slow-model"], call)
+        except FakeAPIError:
+            pass
+    return loop.time() - started, len(attempts)
+
+
+async def _stream_retries_only_before_output() -> tuple:
+    calls = []
+
+    async def stream(model):
+        calls.append(model)
+        if len(calls) == 1:
+            raise FakeAPIError(500)
+        yield "hello"
+        raise FakeAPIError(500)
+
+    chunks = []
+    try:
+        async for chunk in stream_with_retry(["stream-model"], stream):
+            chunks.append(chunk)
+    except FakeAPIError:
+        pass
+    return len(calls), chunks
+
+
+async def _missing_model_falls_over() -> tuple:
+    attempts = []
+
+    async def call(model):
+        attempts.append(model)
+        if model == "retired-model":
+            raise FakeAPIError(404)
+        return model
+
+    async def stream(model):
+        attempts.append(model)
+        if model == "retired-stream-model":
+            raise RuntimeError("404 NOT_FOUND. models/retired-stream-model is not found")
+        yield model
+
+    served = await call_with_retry(["retired-model", "backup-model"], call)
+    streamed = [chunk async for chunk in stream_with_retry(["retired-stream-model", "backup-model"], stream)]
+    try:
+        await call_with_retry(["retired-model"], call)
+        last_raised = False
+    except FakeAPIError:
+        last_raised = True
+    return served, streamed, attempts, last_raised, get_breaker("retired-model").consecutive_failures
+
+
+_TUNABLES = ("LLM_RETRY_BASE_SECS", "LLM_RETRY_MAX_SECS", "LLM_RETRY_MAX_ATTEMPTS", "LLM_BREAKER_FAILURES")
+
+
+def test_resilience():
+    saved = {name: getattr(resilience, name) for name in _TUNABLES}
+    try:
+        _run_checks()
+    finally:
+        for name, value in saved.items():
+            setattr(resilience, name, value)
+
+
+def _run_checks():
+    print("--- Retry / Circuit Breaker Test ---")
+    resilience.LLM_RETRY_BASE_SECS = 0.01
+    resilience.LLM_RETRY_MAX_SECS = 0.02
+    resilience.LLM_RETRY_MAX_ATTEMPTS = 3
+    resilience.LLM_BREAKER_FAILURES = 3
+
+    result, attempts, state = asyncio.run(_retries_then_succeeds())
+    bad_attempts, bad_failures = asyncio.run(_client_error_not_retried())
+    first, sick_state, fast_fail = asyncio.run(_breaker_opens_and_fails_over())
+    probe_first, probe_second, probe_state, probe_final = asyncio.run(_half_open_probe())
+
+    resilience.LLM_RETRY_BASE_SECS = 1.0
+    resilience.LLM_RETRY_MAX_SECS = 1.0
+    elapsed, deadline_attempts = asyncio.run(_deadline_bounds_retries())
+    resilience.LLM_RETRY_BASE_SECS = 0.01
+    resilience.LLM_RETRY_MAX_SECS = 0.02
+    stream_calls, stream_chunks = asyncio.run(_stream_retries_only_before_output())
+    missing_served, missing_streamed, missing_attempts, missing_raised, missing_failures = asyncio.run(
+        _missing_model_falls_over()
+    )
+
+    checks = [
+        ("transient errors are retried", result == "ok" and attempts == 3 and state == CLOSED),
+        ("client errors fail immediately", bad_attempts == 1 and bad_failures == 0),
+        ("breaker opens and fails over", first == "backup-model" and sick_state == OPEN),
+        ("open breaker fails fast", fast_fail),
+        ("half-open lets one probe through", probe_first and not probe_second and probe_state == HALF_OPEN),
+        ("successful probe closes the breaker", probe_final == CLOSED),
+        ("deadline cuts the retry budget", elapsed < 0.5 and deadline_attempts <= 2),
+        ("streams retry only before first chunk", stream_calls == 2 and stream_chunks == ["hello"]),
+        ("a missing model fails over without retrying", missing_served == "backup-model"
+            and missing_streamed == ["backup-model"]
+            and missing_attempts == ["retired-model", "backup-model", "retired-stream-model", "backup-model", "retired-model"]),
+        ("a missing last model raises and isn't counted as unhealthy", missing_raised and missing_failures == 0),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_resilience()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.agents.llm_call.response_cache import (
+    MemoryBackend,
+    ResponseCache,
+    SQLiteBackend,
+    cache_key,
+    normalize_prompt,
+)
+
+
+def _run_checks(cache: ResponseCache, label: str) -> bool:
+    key_a = cache_key("openai", "gpt-4o-mini", normalize_prompt("USER:  my hair\n keeps breaking"))
+    key_b = cache_key("openai", "gpt-4o-mini", normalize_prompt("USER: my hair keeps breaking"))
+    key_c = cache_key("gemini", "gpt-4o-mini", normalize_prompt("USER: my hair keeps breaking"))
+
+    checks = []
+    checks.append(("whitespace-only differences share a key", key_a == key_b))
+    checks.append(("provider is part of the key", key_a != key_c))
+
+    checks.append(("cold lookup misses", cache.get(key_a) is None))
+    cache.set(key_a, {"breakage_active": True})
+    hit = cache.get(key_a)
+    checks.append(("warm lookup hits", hit == {"breakage_active": True}))
+    hit["breakage_active"] = False
+    checks.append(("hits return a private copy", cache.get(key_a) == {"breakage_active": True}))
+
+    cache.set(key_c, {"x": 1}, ttl=0.01)
+    time.sleep(0.02)
+    checks.append(("expired entries miss", cache.get(key_c) is None))
+
+    for i in range(5):
+        cache.set(cache_key("k", i), i)
+    checks.append(("LRU cap holds", len(cache.backend) <= 3))
+    checks.append(("oldest entry evicted first", cache.get(key_a) is None))
+
+    stats = cache.stats()
+    checks.append(("hit/miss counters move", stats["hits"] == 2 and stats["misses"] >= 3))
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | [{label}] {desc}")
+    return all_pass
+
+
+def _sqlite_eviction_is_batched(path: str) -> bool:
+    backend = SQLiteBackend(path, max_entries=100, evict_every=50)
+    counts = []
+    backend._conn.set_trace_callback(lambda sql: counts.append(sql) if "COUNT(*)" in sql else None)
+    for i in range(300):
+        backend.set(cache_key("batch", i), "v", ttl=60)
+    backend._conn.set_trace_callback(None)
+    size = len(backend)
+    backend._conn.close()
+
+    checks = [
+        ("the table is counted once per evict_every writes, not per write", len(counts) == 300 // 50),
+        ("the cap holds after an eviction pass", size == 100 and backend.evictions == 200),
+    ]
+    for desc, ok in checks:
+        print(f"  {'PASS' if ok else 'FAIL'} | [sqlite] {desc}")
+    return all(ok for _, ok in checks)
+
+
+class ThreadRecordingBackend(SQLiteBackend):
+    """SQLiteBackend that notes which thread each read and write ran on."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.current_thread())
+        super().set(key, value, ttl)
+
+
+async def _async_round_trip(cache: ResponseCache) -> tuple:
+    await cache.aset("one", [1.0, 2.0])
+    await cache.aset_many([("two", [2.0]), ("three", [3.0])])
+    single = await cache.aget("one")
+    many = await cache.aget_many(["two", "three", "missing"])
+    return single, many, threading.current_thread()
+
+
+def _sqlite_async_runs_off_loop(path: str) -> bool:
+    backend = ThreadRecordingBackend(path, max_entries=100)
+    single, many, loop_thread = asyncio.run(_async_round_trip(ResponseCache(backend, ttl_secs=60)))
+    backend._conn.close()
+
+    checks = [
+        ("aget/aset round trip", single == [1.0, 2.0] and many == [[2.0], [3.0], None]),
+        ("async reads and writes run off the event loop thread",
+            len(backend.threads) == 7 and loop_thread not in backend.threads),
+    ]
+    for desc, ok in checks:
+        print(f"  {'PASS' if ok else 'FAIL'} | [sqlite] {desc}")
+    return all(ok for _, ok in checks)
+
+
+def test_response_cache():
+    print("--- Response Cache Test ---")
+    memory_ok = _run_checks(ResponseCache(MemoryBackend(max_entries=3), ttl_secs=60), "memory")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteBackend(os.path.join(tmp, "cache.sqlite3"), max_entries=3)
+        sqlite_ok = _run_checks(ResponseCache(backend, ttl_secs=60), "sqlite")
+        backend._conn.close()
+        batched_ok = _sqlite_eviction_is_batched(os.path.join(tmp, "batched.sqlite3"))
+        async_ok = _sqlite_async_runs_off_loop(os.path.join(tmp, "async.sqlite3"))
+
+    all_pass = memory_ok and sqlite_ok and batched_ok and async_ok
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_response_cache()
@@ -0,0 +1,163 @@
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.session_store import SessionStore
+
+
+def _worker_appends(path: str, worker: int, count: int) -> None:
+    store = SessionStore("shared_history", backend="sqlite", path=path, max_messages=1000)
+    for i in range(count):
+        store.append("s1", {"role": "user", "message": f"w{worker}-{i}"})
+
+
+def _worker_increments(path: str, count: int) -> None:
+    store = SessionStore("shared_profile", backend="sqlite", path=path)
+
+    async def run():
+        for _ in range(count):
+            async with store.lock("s1"):
+                value = store.get("s1", default={"n": 0})
+                await asyncio.sleep(0)  # widen the read-modify-write window
+                value["n"] += 1
+                store.set("s1", value)
+
+    asyncio.run(run())
+
+
+async def _write_while_locked(store: SessionStore, path: str, hold_secs: float) -> tuple:
+    """Another worker holds the write lock; the loop must keep ticking while aset waits."""
+    await store.aset("warm", 1)  # open the connection and create the tables first
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    loop = asyncio.get_running_loop()
+    loop.call_later(hold_secs, other.execute, "COMMIT")
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await store.aset("s1", {"written": True})
+    waited = time.perf_counter() - started
+    tick_task.cancel()
+    other.close()
+    return waited, ticks, await store.aget("s1")
+
+
+def _run_workers(target, args_list) -> None:
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=target, args=args) for args in args_list]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(timeout=60)
+
+
+def test_session_store():
+    print("--- Session Store Test ---")
+
+    # Per-session message cap
+    history = SessionStore("test_history", max_messages=3)
+    for i in range(5):
+        history.append("s1", {"role": "user", "message": f"m{i}"})
+    kept = [m["message"] for m in history.history("s1")]
+    last_two = [m["message"] for m in history.history("s1", limit=2)]
+
+    # Entry cap with LRU eviction — reading s1 keeps it warm
+    lru = SessionStore("test_lru", max_entries=2)
+    lru.set("s1", "a")
+    lru.set("s2", "b")
+    lru.get("s1")
+    lru.set("s3", "c")
+
+    # Byte cap
+    sized = SessionStore("test_bytes", max_bytes=100)
+    for i in range(10):
+        sized.set(f"s{i}", "x" * 30)
+
+    # TTL
+    ttl = SessionStore("test_ttl", ttl_secs=0.05)
+    ttl.set("s1", {"texture": "Fine"})
+    fresh = ttl.get("s1")
+    time.sleep(0.08)
+    expired = ttl.get("s1")
+
+    # Values are copies — mutations don't leak back without set()
+    profile = SessionStore("test_copy")
+    profile.set("s1", {"hair_goals": []})
+    profile.get("s1")["hair_goals"].append("Volume")
+
+    # Shared sqlite backend across worker processes
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        _run_workers(_worker_appends, [(path, w, 25) for w in range(4)])
+        shared = SessionStore("shared_history", backend="sqlite", path=path, max_messages=1000)
+        shared_history = shared.history("s1")
+        per_worker_ordered = all(
+            [m["message"] for m in shared_history if m["message"].startswith(f"w{w}-")]
+            == [f"w{w}-{i}" for i in range(25)]
+            for w in range(4)
+        )
+
+        _run_workers(_worker_increments, [(path, 20) for _ in range(3)])
+        counter = SessionStore("shared_profile", backend="sqlite", path=path).get("s1")
+
+        capped = SessionStore("shared_capped", backend="sqlite", path=path, max_entries=2, cap_interval_secs=0)
+        for i in range(4):
+            capped.set(f"s{i}", {"i": i})
+        capped_ok = len(capped) == 2 and capped.get("s3") == {"i": 3} and capped.get("s0") is None
+
+        # Caps are enforced on the first write, then not again until the interval passes
+        periodic = SessionStore("shared_periodic", backend="sqlite", path=path, max_entries=2, cap_interval_secs=60)
+        for i in range(4):
+            periodic.set(f"s{i}", {"i": i})
+        periodic_size = len(periodic)
+        periodic.backend._caps_checked_at -= 60
+        periodic.set("s4", {"i": 4})
+        periodic_ok = periodic_size == 4 and len(periodic) == 2
+
+        blocked = SessionStore("shared_blocked", backend="sqlite", path=path)
+        waited, ticks, written = asyncio.run(_write_while_locked(blocked, path, hold_secs=0.3))
+
+    checks = [
+        ("history keeps the newest messages", kept == ["m2", "m3", "m4"] and last_two == ["m3", "m4"]),
+        ("trimmed messages are counted", history.stats()["evictions"]["trimmed_messages"] == 2),
+        ("LRU evicts the least recently used", "s1" in lru and "s3" in lru and "s2" not in lru),
+        ("LRU evictions are counted", lru.stats()["evictions"]["lru"] == 1),
+        ("byte cap bounds the store", sized.stats()["approx_bytes"] <= 100 and len(sized) < 10),
+        ("idle sessions expire", fresh == {"texture": "Fine"} and expired is None),
+        ("expiry is counted", ttl.stats()["evictions"]["expired"] == 1),
+        ("reads return copies", profile.get("s1") == {"hair_goals": []}),
+        ("sqlite: appends from 4 workers all land", len(shared_history) == 100),
+        ("sqlite: each worker's messages stay in order", per_worker_ordered),
+        ("sqlite: session lock prevents lost updates", counter == {"n": 60}),
+        ("sqlite: entry cap evicts least recently used", capped_ok),
+        ("sqlite: caps are enforced periodically, not per write", periodic_ok),
+        ("sqlite: a write waiting on another worker's lock lands", written == {"written": True} and waited >= 0.25),
+        ("sqlite: the event loop keeps running while it waits", ticks >= waited / 0.01 * 0.5),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_session_store()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.agents.llm_call.single_flight import SingleFlight
+
+
+async def _collapses_identical_calls() -> tuple:
+    group = SingleFlight("test-collapse")
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return {"answer": 42}
+
+    results = await asyncio.gather(*(group.do("same", work) for _ in range(5)))
+    other = await group.do("other", work)
+    return calls, results, other, group.stats()
+
+
+async def _one_caller_cancelling_keeps_flight() -> tuple:
+    group = SingleFlight("test-cancel-one")
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leaver = asyncio.create_task(group.do("k", work))
+    stayer = asyncio.create_task(group.do("k", work))
+    await started.wait()
+    leaver.cancel()
+    result = await asyncio.wait_for(stayer, timeout=0.5)
+    return leaver.cancelled(), result
+
+
+async def _all_callers_cancelling_stops_work() -> tuple:
+    group = SingleFlight("test-cancel-all")
+    finished = False
+
+    async def work():
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+
+    callers = [asyncio.create_task(group.do("k", work)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.sleep(0.08)
+    return finished, group.stats()["in_flight"]
+
+
+async def _joining_during_cancel_starts_fresh() -> tuple:
+    group = SingleFlight("test-cancel-window")
+
+    async def slow_to_unwind():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.05)  # cleanup still running when the next caller arrives
+            raise
+
+    async def work():
+        return "fresh"
+
+    leaver = asyncio.create_task(group.do("k", slow_to_unwind))
+    await asyncio.sleep(0.01)
+    leaver.cancel()
+    await asyncio.sleep(0)
+    try:
+        result = await asyncio.wait_for(group.do("k", work), timeout=0.5)
+    except asyncio.CancelledError:
+        result = "cancelled"
+    await asyncio.sleep(0.08)
+    return result, group.stats()
+
+
+async def _errors_reach_every_caller() -> int:
+    group = SingleFlight("test-errors")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(*(group.do("k", work) for _ in range(3)), return_exceptions=True)
+    return sum(isinstance(r, RuntimeError) for r in results)
+
+
+def test_single_flight():
+    print("--- Single-Flight Coalescing Test ---")
+    calls, results, other, stats = asyncio.run(_collapses_identical_calls())
+    leaver_cancelled, stayer_result = asyncio.run(_one_caller_cancelling_keeps_flight())
+    finished, in_flight = asyncio.run(_all_callers_cancelling_stops_work())
+    errors = asyncio.run(_errors_reach_every_caller())
+    window_result, window_stats = asyncio.run(_joining_during_cancel_starts_fresh())
+
+    checks = [
+        ("identical calls share one execution", calls == 2 and stats["collapsed"] == 4),
+        ("every caller gets the result", all(r == {"answer": 42} for r in results) and other == {"answer": 42}),
+        ("one caller leaving doesn't cancel the others", leaver_cancelled and stayer_result == "done"),
+        ("last caller leaving cancels the work", not finished and in_flight == 0),
+        ("errors propagate to every caller", errors == 3),
+        ("a caller arriving while a cancelled flight unwinds starts fresh work",
+            window_result == "fresh" and window_stats["executed"] == 2 and window_stats["in_flight"] == 0),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         stats: {stats}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_single_flight()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.services.user_pages as user_pages
+from app.services.db_service import CRON_USER_COLUMNS, DatabaseService
+from app.services.user_pages import iter_user_pages, iter_users
+
+
+class FakeQuery:
+    """Just enough of the PostgREST builder to page user_metadata in memory."""
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = list(table.rows)
+        self.columns = None
+        self.row_limit = None
+
+    def select(self, columns):
+        self.columns = [c.strip() for c in columns.split(",")]
+        self.table.selects.append(columns)
+        return self
+
+    def gt(self, column, value):
+        self.rows = [r for r in self.rows if r[column] > value]
+        return self
+
+    def order(self, column, desc=False):
+        self.rows.sort(key=lambda r: r[column], reverse=desc)
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def execute(self):
+        self.table.reads += 1
+        rows = self.rows[: self.row_limit]
+        self.table.largest_read = max(self.table.largest_read, len(rows))
+        return SimpleNamespace(data=[{c: r[c] for c in self.columns} for r in rows])
+
+
+class FakeSupabase:
+    def __init__(self, count):
+        self.rows = [
+            {"user_id": f"user-{i:05d}", "location": "Lagos", "primary_goal": "moisture",
+             "first_name": "x" * 200, "hair_goals": ["y" * 200]}
+            for i in range(count)
+        ]
+        self.reads = 0
+        self.largest_read = 0
+        self.selects = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def _db(supabase):
+    db = DatabaseService.__new__(DatabaseService)
+    db.supabase = supabase
+    return db
+
+
+async def _collect_pages(**kwargs):
+    return [(users, cursor) async for users, cursor in iter_user_pages(**kwargs)]
+
+
+async def _first_users(n):
+    taken = []
+    async for user in iter_users(page_size=10):
+        taken.append(user["user_id"])
+        if len(taken) == n:
+            break
+    await asyncio.sleep(0.05)  # let the cancelled prefetch settle
+    return taken
+
+
+def test_user_pages():
+    print("--- Paged User Iterator Test ---")
+    supabase = FakeSupabase(1234)
+    original_get_db = user_pages.get_db
+    user_pages.get_db = lambda: _db(supabase)
+    try:
+        pages = asyncio.run(_collect_pages(page_size=100))
+        resumed = asyncio.run(_collect_pages(page_size=100, start_after=pages[4][1]))
+        reads_before = supabase.reads
+        taken = asyncio.run(_first_users(15))
+        early_stop_reads = supabase.reads - reads_before
+    finally:
+        user_pages.get_db = original_get_db
+
+    all_ids = [u["user_id"] for users, _ in pages for u in users]
+    expected = [r["user_id"] for r in supabase.rows]
+    resumed_ids = [u["user_id"] for users, _ in resumed for u in users]
+
+    checks = [
+        ("every user is yielded once, in user_id order", all_ids == expected),
+        ("pages are page_size long", len(pages) == 13 and all(len(u) == 100 for u, _ in pages[:-1])),
+        ("each read holds at most page_size + 1 rows", supabase.largest_read == 101),
+        ("users are projected to the cron columns", set(supabase.selects) == {CRON_USER_COLUMNS}),
+        ("only the projected columns come back", set(pages[0][0][0]) == {"user_id", "location", "primary_goal"}),
+        ("a page's cursor is its last user_id", pages[4][1] == pages[4][0][-1]["user_id"]),
+        ("resuming from a cursor continues after it", resumed_ids == expected[500:]),
+        ("stopping early reads at most one page ahead", taken == expected[:15] and early_stop_reads <= 3),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_user_pages()
@@ -0,0 +1,188 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.services.vitals_rollup as vitals_rollup
+from app.services.db_service import DatabaseService
+from app.services.librarian_service import LibrarianService
+from app.services.vitals_rollup import check_vitals_rollup, diff_rollup, rollup_from_events
+
+
+class FakeRollupTable:
+    """user_vitals_latest as PostgREST would return it for one user."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+
+    def table(self, name):
+        assert name == "user_vitals_latest", name
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self._user = value
+        return self
+
+    def in_(self, column, values):
+        self._categories = values
+        return self
+
+    def execute(self):
+        self.reads += 1
+        return SimpleNamespace(data=[
+            r for r in self.rows if r["user_id"] == self._user and r["category"] in self._categories
+        ])
+
+
+class FailingSupabase:
+    """Every read fails with `error` — a timeout, an RLS denial, a missing table."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def table(self, name):
+        return self
+
+    def rpc(self, name, params):
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise RuntimeError(self.error)
+
+
+class FakeEventsDB:
+    """DatabaseService.get_events_page over an in-memory list, newest first."""
+
+    def __init__(self, rows, page_size=4):
+        self.rows = sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        self.page_size = page_size
+
+    def get_events_page(self, user_id, limit=None, cursor=None, **kwargs):
+        start = int(cursor or 0)
+        end = start + self.page_size
+        return self.rows[start:end], (str(end) if end < len(self.rows) else None)
+
+
+def _with_events_db(db, fn):
+    saved = vitals_rollup.get_db
+    vitals_rollup.get_db = lambda: db
+    try:
+        return fn()
+    finally:
+        vitals_rollup.get_db = saved
+
+
+def _rollup_after_error(error: str) -> bool:
+    librarian = LibrarianService.__new__(LibrarianService)
+    librarian.supabase = FailingSupabase(error)
+    librarian._per_category_rpc = True
+    librarian._vitals_rollup = True
+    db = DatabaseService.__new__(DatabaseService)
+    db.supabase = FailingSupabase(error)
+    _with_events_db(db, lambda: librarian.get_vitals_summary("u1"))
+    return librarian._vitals_rollup
+
+
+def _summary_from_events(events):
+    librarian = LibrarianService.__new__(LibrarianService)
+    librarian._vitals_rollup = False
+    return _with_events_db(FakeEventsDB(events), lambda: librarian.get_vitals_summary("u1"))
+
+
+def _check_with_failing_reads():
+    db = DatabaseService.__new__(DatabaseService)
+    db.supabase = FailingSupabase("canceling statement due to statement timeout")
+    saved = vitals_rollup.get_db, vitals_rollup.get_supabase
+    vitals_rollup.get_db = lambda: db
+    vitals_rollup.get_supabase = lambda: FakeRollupTable([])
+    try:
+        check_vitals_rollup(["u1"])
+        return "no error"
+    except RuntimeError as e:
+        return str(e)
+    finally:
+        vitals_rollup.get_db, vitals_rollup.get_supabase = saved
+
+
+def _events():
+    # (id, label, score, created_at) — out of order on purpose, plus unscored/unlabelled rows
+    raw = [
+        ("e1", "MOISTURE", 3, "2024-01-01T00:00:00+00:00"),
+        ("e4", "MOISTURE", 7, "2024-01-04T00:00:00+00:00"),
+        ("e2", "MOISTURE", 5, "2024-01-02T00:00:00+00:00"),
+        ("e3", "SCALP", 2, "2024-01-03T00:00:00+00:00"),
+        ("e5", "MOISTURE", None, "2024-01-05T00:00:00+00:00"),
+        ("e6", None, 9, "2024-01-06T00:00:00+00:00"),
+    ]
+    raw += [(f"m{i}", "MOISTURE", i % 10 + 1, f"2023-06-{i + 1:02d}T00:00:00+00:00") for i in range(10)]
+    return [{"id": i, "primary_label": l, "vital_score": s, "created_at": t} for i, l, s, t in raw]
+
+
+def test_vitals_rollup():
+    print("--- Vitals Rollup Test ---")
+    events = _events()
+    expected = rollup_from_events(events)
+    moisture_scores = [e["vital_score"] for e in events if e["primary_label"] == "MOISTURE" and e["vital_score"] is not None]
+
+    stored = [
+        {"user_id": "u1", "category": c, **v} for c, v in expected.items()
+    ]
+    in_sync = diff_rollup(expected, stored)
+
+    drifted_rows = [dict(r) for r in stored]
+    drifted_rows[0] = {**drifted_rows[0], "score_count": drifted_rows[0]["score_count"] - 1}
+    drift = diff_rollup(expected, drifted_rows[:1])
+
+    table = FakeRollupTable(stored + [{"user_id": "u2", "category": "SCALP", "latest_score": 9,
+                                       "history": [9], "score_sum": 9, "score_count": 1}])
+    librarian = LibrarianService.__new__(LibrarianService)
+    librarian.supabase = table
+    librarian._vitals_rollup = True
+    summary = librarian.get_vitals_summary("u1")
+    fallback_summary = _summary_from_events(events)
+
+    kept_after_timeout = _rollup_after_error('canceling statement due to statement timeout on "user_vitals_latest"')
+    kept_after_rls = _rollup_after_error('new row violates row-level security policy for table "user_vitals_latest"')
+    dropped_after_missing = _rollup_after_error("PGRST205: Could not find the table 'public.user_vitals_latest' in the schema cache")
+    dropped_after_42p01 = _rollup_after_error('42P01: relation "user_vitals_latest" does not exist')
+    failed_check = _check_with_failing_reads()
+
+    checks = [
+        ("latest is the newest scored event", expected["MOISTURE"]["latest_score"] == 7),
+        ("history is the 5 newest scores, newest first", expected["MOISTURE"]["history"] == [7, 5, 3, 10, 9]),
+        ("totals cover the whole history", expected["MOISTURE"]["score_sum"] == sum(moisture_scores)
+                                           and expected["MOISTURE"]["score_count"] == len(moisture_scores)),
+        ("unscored and unlabelled events are skipped", set(expected) == {"MOISTURE", "SCALP"}),
+        ("a matching rollup reports no drift", in_sync == []),
+        ("drift and missing rows are reported", len(drift) == 2 and any("missing rollup row" in p for p in drift)),
+        ("vitals summary is one rollup read", table.reads == 1),
+        ("summary average is the lifetime average", summary["moisture"]["average"] == round(sum(moisture_scores) / len(moisture_scores), 1)),
+        ("the raw-events fallback reports the same figures", fallback_summary == summary),
+        ("summary keeps the endpoint's shape", summary["scalp"] == {"latest": 2, "average": 2.0, "history": [2]}
+                                                and summary["breakage"] == {"latest": None, "average": None, "history": []}),
+        ("a timeout or RLS error naming the table keeps the rollup on", kept_after_timeout and kept_after_rls),
+        ("a missing rollup table turns it off", not dropped_after_missing and not dropped_after_42p01),
+        ("the consistency check fails on a read error, not reports drift", "statement timeout" in failed_check),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_vitals_rollup()
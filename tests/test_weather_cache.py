@@ -0,0 +1,173 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+
+import app.services.environmental_factors.weather_service as weather_service
+from app.agents.llm_call.response_cache import ResponseCache, SQLiteBackend, build_cache
+from app.services.environmental_factors.weather_service import get_city_environmental_data
+
+INTERVAL = weather_service.WEATHER_FORECAST_INTERVAL_SECS
+
+
+class FakeOpenWeather:
+    """MockTransport handler: counts calls, can be slowed down or failed."""
+
+    def __init__(self):
+        self.geocode_calls = 0
+        self.forecast_calls = 0
+        self.delay = 0.02
+        self.failing = False
+        self.temp = 31.0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            return httpx.Response(503, json={"message": "upstream unavailable"})
+        if request.url.path.endswith("/geo/1.0/direct"):
+            self.geocode_calls += 1
+            city = request.url.params["q"].strip().lower()
+            return httpx.Response(200, json=[{"lat": 6.45, "lon": 3.39}] if city == "lagos" else [])
+        self.forecast_calls += 1
+        steps = [{"main": {"temp": self.temp - i, "humidity": 60 + i}} for i in range(10)]
+        return httpx.Response(200, json={"list": steps})
+
+
+class RecordingSQLite(SQLiteBackend):
+    """The on-disk geocode tier, noting which thread each read and write runs on."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.current_thread())
+        super().set(key, value, ttl)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _scenario(upstream, clock):
+    results = {}
+
+    # Cold: a burst for one city coalesces into one geocode + one forecast
+    burst = await asyncio.gather(*(
+        get_city_environmental_data("Lagos" if i % 2 else "  lagos ", attribute="all") for i in range(50)
+    ))
+    results["burst"] = burst
+    results["burst_calls"] = (upstream.geocode_calls, upstream.forecast_calls)
+    results["loop_thread"] = threading.current_thread()
+
+    # Warm: no upstream calls; in_ac still changes the sweat level
+    warm = await get_city_environmental_data("Lagos", attribute="all")
+    in_ac = await get_city_environmental_data("Lagos", attribute="sweat", in_ac=True)
+    results["warm"], results["in_ac"] = warm, in_ac
+    results["warm_calls"] = (upstream.geocode_calls, upstream.forecast_calls)
+    results["expires_at"] = weather_service._forecasts["6.45,3.39"]["expires_at"]
+
+    # Next forecast step with a slow upstream: stale now, refreshed in the background
+    clock.now = results["expires_at"] + 1
+    upstream.delay, upstream.temp = 0.5, 35.0
+    started = time.perf_counter()
+    results["stale"] = await get_city_environmental_data("Lagos", attribute="heat")
+    results["stale_ms"] = (time.perf_counter() - started) * 1000
+    await asyncio.sleep(0.6)
+    upstream.delay = 0.02
+    results["after_refresh"] = await get_city_environmental_data("Lagos", attribute="heat")
+    results["refresh_calls"] = upstream.forecast_calls
+
+    # Upstream down after the next step: still served stale
+    clock.now += INTERVAL
+    upstream.failing = True
+    results["down"] = await get_city_environmental_data("Lagos", attribute="heat")
+    await asyncio.sleep(0.05)
+
+    # Too old to serve stale and upstream still down
+    clock.now += weather_service.WEATHER_STALE_MAX_SECS + INTERVAL
+    results["too_old"] = await get_city_environmental_data("Lagos", attribute="heat")
+    upstream.failing = False
+
+    # Unknown cities are remembered too
+    results["unknown"] = await get_city_environmental_data("Atlantis", attribute="all")
+    before = upstream.geocode_calls
+    await get_city_environmental_data("Atlantis", attribute="all")
+    results["unknown_repeat_calls"] = upstream.geocode_calls - before
+    return results
+
+
+def test_weather_cache():
+    print("--- Weather Cache Test ---")
+    upstream, clock = FakeOpenWeather(), Clock()
+    saved = (
+        weather_service.WEATHER_API_KEY, weather_service._geocode_cache, weather_service._geocode_front,
+        weather_service._http_client, weather_service._now, weather_service.WEATHER_STALE_WAIT_SECS,
+    )
+    tmp = tempfile.TemporaryDirectory()
+    disk = RecordingSQLite(os.path.join(tmp.name, "geocode.sqlite3"), max_entries=100, table="geocode_cache")
+    weather_service.WEATHER_API_KEY = "test-key"
+    weather_service._geocode_cache = ResponseCache(disk, ttl_secs=3600)
+    weather_service._geocode_front = build_cache(backend="memory", ttl_secs=3600, max_entries=100)
+    weather_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    weather_service._now = clock
+    weather_service.WEATHER_STALE_WAIT_SECS = 0.05
+    weather_service._forecasts.clear()
+    try:
+        results = asyncio.run(_scenario(upstream, clock))
+        stats = weather_service.weather_cache_stats()
+    finally:
+        (
+            weather_service.WEATHER_API_KEY, weather_service._geocode_cache, weather_service._geocode_front,
+            weather_service._http_client, weather_service._now, weather_service.WEATHER_STALE_WAIT_SECS,
+        ) = saved
+        weather_service._forecasts.clear()
+        disk._conn.close()
+        tmp.cleanup()
+
+    burst = results["burst"]
+    checks = [
+        ("a burst for one city makes one geocode and one forecast call", results["burst_calls"] == (1, 1)),
+        ("every caller in the burst gets the same peaks", all(r["peak_heat"] == 31.0 and r["peak_humidity"] == 67 for r in burst)),
+        ("warm lookups make no upstream calls", results["warm_calls"] == (1, 1) and results["warm"]["peak_heat"] == 31.0),
+        ("in_ac is applied per call, not cached", results["in_ac"] != results["warm"]["predicted_sweat_level"]),
+        ("the forecast expires on a forecast-step boundary", results["expires_at"] % INTERVAL == 0),
+        ("a slow refresh serves the stale snapshot quickly", results["stale"] == 31.0 and results["stale_ms"] < 300),
+        ("the background refresh still lands", results["after_refresh"] == 35.0 and results["refresh_calls"] == 2),
+        ("an upstream outage serves the stale snapshot", results["down"] == 35.0),
+        ("snapshots past the stale limit are not served", results["too_old"] is None),
+        ("unknown cities return None and are cached", results["unknown"] is None and results["unknown_repeat_calls"] == 0),
+        ("warm geocodes are served from memory, not the sqlite file",
+            len(disk.threads) == 4 and stats["geocode_front"]["hits"] > 0),
+        ("sqlite geocode reads and writes run off the event loop", results["loop_thread"] not in disk.threads),
+        ("stats count stale serves and upstream errors", stats["forecast"]["stale_served"] == 2 and stats["forecast"]["upstream_errors"] >= 2),
+    ]
+
+    all_pass = True
+    for desc, ok in checks:
+        status = "PASS" if ok else "FAIL"
+        if not ok:
+            all_pass = False
+        print(f"  {status} | {desc}")
+    print(f"         stats: {stats['forecast']}")
+
+    print(f"\n{'All tests passed.' if all_pass else 'Some tests FAILED.'}")
+    assert all_pass
+
+
+if __name__ == "__main__":
+    test_weather_cache()